@@ -0,0 +1,193 @@
+# ann_index.py
+import math
+import time
+import logging
+import argparse
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from typing import Any, Dict, List, Optional
+from config import IndexConfig
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ["flat", "ivf", "hnsw", "ivfpq"]
+
+def choose_index_type(num_vectors: int, allow_hnsw: bool = True,
+                      params: Optional[Dict[str, Any]] = None) -> str:
+    """Pick the FAISS index type for a store of num_vectors vectors
+
+    Small stores stay exact (flat). HNSW is preferred for mid-sized stores, but
+    it cannot delete vectors, so callers that remove documents pass
+    allow_hnsw=False and get IVF instead. Very large stores add PQ compression.
+    """
+    params = {**IndexConfig.DEFAULT_PARAMS, **(params or {})}
+    if num_vectors <= params["flat_max_vectors"]:
+        return "flat"
+    if num_vectors >= params["pq_min_vectors"]:
+        return "ivfpq"
+    if allow_hnsw and num_vectors <= params["hnsw_max_vectors"]:
+        return "hnsw"
+    return "ivf"
+
+def _nlist(num_vectors: int) -> int:
+    # ~4 * sqrt(n) lists, with enough training points per list
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+def build_index(vectors: np.ndarray, index_type: str, params: Optional[Dict[str, Any]] = None) -> Any:
+    """Build, train and fill a FAISS index of the given type over vectors (L2 metric)"""
+    params = {**IndexConfig.DEFAULT_PARAMS, **(params or {})}
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dim = vectors.shape
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"])
+        index.hnsw.efConstruction = params["hnsw_ef_construction"]
+        index.hnsw.efSearch = params["hnsw_ef_search"]
+    elif index_type in ("ivf", "ivfpq"):
+        quantizer = faiss.IndexFlatL2(dim)
+        nlist = _nlist(num_vectors)
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+        else:
+            pq_m = params["pq_m"] if dim % params["pq_m"] == 0 else next(
+                m for m in range(min(params["pq_m"], dim), 0, -1) if dim % m == 0
+            )
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, params["pq_bits"])
+        index.train(vectors)
+        index.nprobe = min(params["ivf_nprobe"], nlist)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    index.add(vectors)
+    return index
+
+def index_type_of(index: Any) -> str:
+    """Name the type of an existing FAISS index"""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+def index_vectors(index: Any) -> np.ndarray:
+    """Return the vectors stored in an index (approximate for PQ)"""
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def optimize_vector_store(vector_store: FAISS, allow_hnsw: bool = True,
+                          params: Optional[Dict[str, Any]] = None) -> FAISS:
+    """Swap the store's exact index for the type choose_index_type picks
+
+    Vectors keep their positions, so the docstore mapping is unchanged. Stores
+    already using the chosen type are left alone.
+    """
+    index = vector_store.index
+    index_type = choose_index_type(index.ntotal, allow_hnsw, params)
+    if index_type == index_type_of(index):
+        return vector_store
+
+    start = time.perf_counter()
+    vector_store.index = build_index(index_vectors(index), index_type, params)
+    logger.info(
+        f"Rebuilt {index.ntotal}-vector index as {index_type} in {time.perf_counter() - start:.2f}s"
+    )
+    return vector_store
+
+def delete_from_vector_store(vector_store: FAISS, ids: List[str], allow_hnsw: bool = False,
+                             params: Optional[Dict[str, Any]] = None) -> FAISS:
+    """Delete chunks by docstore ID, keeping index positions and the docstore mapping in step
+
+    FAISS.delete renumbers index_to_docstore_id to 0..n-1, which only matches a
+    flat index: IVF remove_ids keeps the old ids of the remaining vectors, so
+    later searches and adds hit stale positions. Other index types are rebuilt
+    from the remaining vectors (approximate for PQ) with the type
+    choose_index_type picks for the smaller store.
+    """
+    if index_type_of(vector_store.index) == "flat":
+        vector_store.delete(ids)
+        return vector_store
+
+    doomed = set(ids)
+    missing = doomed.difference(vector_store.index_to_docstore_id.values())
+    if missing:
+        raise ValueError(f"Some specified ids do not exist in the current store. Ids not found: {missing}")
+
+    start = time.perf_counter()
+    mapping = vector_store.index_to_docstore_id
+    keep = [i for i, chunk_id in sorted(mapping.items()) if chunk_id not in doomed]
+    vectors = index_vectors(vector_store.index)[keep]
+    vector_store.docstore.delete(list(doomed))
+    vector_store.index_to_docstore_id = {position: mapping[i] for position, i in enumerate(keep)}
+    index_type = choose_index_type(len(keep), allow_hnsw, params)
+    vector_store.index = build_index(vectors, index_type, params)
+    logger.info(
+        f"Rebuilt {len(keep)}-vector index as {index_type} after deleting {len(doomed)} vectors "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return vector_store
+
+def benchmark_indexes(vectors: np.ndarray, queries: np.ndarray, k: int = 10,
+                      index_types: Optional[List[str]] = None,
+                      params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Compare index types on recall@k against exact search, query latency and memory"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    exact = build_index(vectors, "flat")
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for index_type in index_types or INDEX_TYPES:
+        start = time.perf_counter()
+        index = build_index(vectors, index_type, params)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for query in queries:
+            index.search(query.reshape(1, -1), k)
+        query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        _, found = index.search(queries, k)
+        hits = sum(len(set(row_found) & set(row_truth)) for row_found, row_truth in zip(found, truth))
+        results.append({
+            "index_type": index_type,
+            "vectors": len(vectors),
+            "build_seconds": build_seconds,
+            "recall_at_k": hits / (len(queries) * k),
+            "query_ms": query_ms,
+            "memory_mb": len(faiss.serialize_index(index)) / (1024 * 1024),
+        })
+    return results
+
+def _synthetic_vectors(num_vectors: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors shaped roughly like sentence embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, num_vectors // 200), dim))
+    vectors = centers[rng.integers(0, len(centers), num_vectors)] + 0.3 * rng.normal(size=(num_vectors, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types (recall@k vs latency vs memory)")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=INDEX_TYPES, choices=INDEX_TYPES)
+    args = parser.parse_args()
+
+    data = _synthetic_vectors(args.vectors + args.queries, args.dim)
+    vectors, queries = data[:args.vectors], data[args.vectors:]
+    print(f"auto choice for {args.vectors} vectors: {choose_index_type(args.vectors)}")
+    print(f"{'type':<8}{'build s':>10}{'recall@' + str(args.k):>12}{'query ms':>11}{'memory MB':>11}")
+    for row in benchmark_indexes(vectors, queries, args.k, args.types):
+        print(f"{row['index_type']:<8}{row['build_seconds']:>10.2f}{row['recall_at_k']:>12.3f}"
+              f"{row['query_ms']:>11.3f}{row['memory_mb']:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# batch_cli.py
+"""Headless batch runner: every document in a directory × a list of marketing tasks
+
+    python batch_cli.py ./clients --tasks "Marketing Strategy" "SEO Optimization Strategy" \\
+        --provider Groq --model llama-3.3-70b-versatile --output-dir batch_output
+
+Documents are ingested in a process pool (reusing the persisted index cache),
+insights are extracted once per document, and task outputs are generated with
+at most --llm-concurrency LLM calls in flight, each written as a DOCX file.
+Every finished step is recorded in <output-dir>/progress.json, so rerunning the
+same command after a crash or restart only does the remaining work.
+"""
+import os
+
+# Documents are parsed in parallel across the ingestion pool, so each one is parsed serially
+os.environ.setdefault("PARSER_WORKERS", "1")
+
+import re
+import sys
+import json
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, List
+from config import Config, DEFAULT_ENDPOINTS, LLM_FALLBACKS, SUPPORTED_FILE_TYPES, get_api_key
+from document_processor import ingest_document
+from embedding_service import get_embeddings
+from index_store import IndexStore, index_key
+from llm_handler import FIELD_PROMPTS, create_llm, generate_all_insights, parse_fallbacks
+from content_generator import run_task
+from file_utils import convert_to_docx
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FILE = "progress.json"
+
+class BatchProgress:
+    """Thread-safe record of finished steps, rewritten atomically after every change"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.documents = json.load(f).get("documents", {})
+
+    def document(self, name: str, doc_id: str) -> Dict[str, Any]:
+        """Return the entry for a document, starting over if its contents changed"""
+        with self._lock:
+            entry = self.documents.get(name)
+            if entry is None or entry.get("doc_id") != doc_id:
+                entry = self.documents[name] = {"doc_id": doc_id, "insights": None, "tasks": {}}
+            return entry
+
+    def update(self, name: str, **fields: Any) -> None:
+        with self._lock:
+            self.documents[name].update(fields)
+            self._save()
+
+    def set_task(self, name: str, task: str, **info: Any) -> None:
+        with self._lock:
+            self.documents[name]["tasks"][task] = info
+            self._save()
+
+    def task_done(self, name: str, task: str) -> bool:
+        with self._lock:
+            info = self.documents[name]["tasks"].get(task, {})
+            return info.get("status") == "done" and os.path.exists(info.get("output", ""))
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"documents": self.documents}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")
+
+def find_documents(input_dir: str) -> List[str]:
+    """Return the supported documents under input_dir as sorted relative paths"""
+    found = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.rsplit(".", 1)[-1].lower() in SUPPORTED_FILE_TYPES:
+                found.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return sorted(found)
+
+def _ingest_worker(path: str, file_name: str) -> str:
+    """Build or reuse the persisted index for one document (runs in a worker process)"""
+    with open(path, "rb") as f:
+        file_bytes = f.read()
+    ingest_document(file_bytes, file_name)
+    return index_key(file_bytes, file_name)
+
+def build_form_data(insights: Dict[str, str], tone: str, post_type: str) -> Dict[str, str]:
+    """Fill the marketing form from extracted insights, as the UI does before a user edits it"""
+    form_data = {name: insights.get(name, "") for name in FIELD_PROMPTS}
+    topics = [topic.strip() for topic in re.split(r"\d+\.\s*", form_data["suggested_topics"]) if topic.strip()]
+    form_data["suggested_topics"] = topics[0] if topics else ""
+    form_data.update({"tone": tone, "post_type": post_type})
+    return form_data
+
+def run_batch(input_dir: str, tasks: List[str], output_dir: str, llm: Any,
+              ingest_workers: int = os.cpu_count() or 1, llm_concurrency: int = 4,
+              tone: str = "Professional", post_type: str = "LinkedIn", use_cache: bool = True) -> BatchProgress:
+    """Run every task for every document under input_dir, resuming from output_dir's progress file"""
+    os.makedirs(output_dir, exist_ok=True)
+    progress = BatchProgress(os.path.join(output_dir, PROGRESS_FILE))
+
+    todo: Dict[str, List[str]] = {}
+    for name in find_documents(input_dir):
+        with open(os.path.join(input_dir, name), "rb") as f:
+            doc_id = hashlib.sha256(f.read()).hexdigest()
+        progress.document(name, doc_id)
+        remaining = [task for task in tasks if not progress.task_done(name, task)]
+        if remaining:
+            todo[name] = remaining
+    logger.info(f"{len(todo)} document(s) with pending tasks")
+
+    def generate(name: str, task: str, form_data: Dict[str, str]) -> None:
+        try:
+            text = run_task(llm, task, form_data, use_cache)
+            path = os.path.join(output_dir, _slug(name), f"{_slug(task)}.docx")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(convert_to_docx(text))
+            os.replace(f"{path}.tmp", path)
+            progress.set_task(name, task, status="done", output=path)
+            logger.info(f"{name}: {task} done")
+        except Exception as e:
+            logger.error(f"{name}: {task} failed: {str(e)}")
+            progress.set_task(name, task, status="failed", error=str(e))
+
+    def extract(name: str, key: str) -> None:
+        cached = IndexStore().load(key, get_embeddings())
+        if cached is None:
+            raise RuntimeError("Index missing from the index store after ingestion")
+        insights = generate_all_insights(llm, cached[0], list(FIELD_PROMPTS), use_cache=use_cache)
+        if not any(value.strip() for value in insights.values()):
+            raise RuntimeError("No insights could be extracted")
+        progress.update(name, insights=insights, error=None)
+
+    with ProcessPoolExecutor(max_workers=max(1, ingest_workers)) as ingest_pool, \
+            ThreadPoolExecutor(max_workers=max(1, llm_concurrency)) as llm_pool:
+        running: Dict[Future, Any] = {}
+
+        def submit_tasks(name: str) -> None:
+            form_data = build_form_data(progress.documents[name]["insights"], tone, post_type)
+            for task in todo[name]:
+                running[llm_pool.submit(generate, name, task, form_data)] = ("task", name)
+
+        # Submit every ingestion before loading the embedding model in this process
+        for name in todo:
+            if progress.documents[name]["insights"]:
+                continue
+            future = ingest_pool.submit(_ingest_worker, os.path.join(input_dir, name), os.path.basename(name))
+            running[future] = ("ingest", name)
+        for name in todo:
+            if progress.documents[name]["insights"]:
+                submit_tasks(name)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, name = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"{name}: {stage} failed: {str(e)}")
+                    progress.update(name, error=f"{stage}: {str(e)}")
+                    continue
+                if stage == "ingest":
+                    running[llm_pool.submit(extract, name, result)] = ("insights", name)
+                elif stage == "insights":
+                    logger.info(f"{name}: insights extracted")
+                    submit_tasks(name)
+
+    return progress
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate marketing outputs for a directory of documents")
+    parser.add_argument("input_dir")
+    parser.add_argument("--tasks", nargs="+", default=Config.MARKETING_TASKS, choices=Config.MARKETING_TASKS)
+    parser.add_argument("--output-dir", default="batch_output")
+    parser.add_argument("--provider", default="Groq", choices=list(DEFAULT_ENDPOINTS))
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--api-key", help="defaults to the provider's key from the environment")
+    parser.add_argument("--api-endpoint", help="defaults to the provider's public endpoint")
+    parser.add_argument("--fallbacks", default=LLM_FALLBACKS,
+                        help='comma-separated "provider:model[@endpoint]" to fail over to (default: $LLM_FALLBACKS)')
+    parser.add_argument("--hedge", action="store_true", help="send a second request when the first is slow")
+    parser.add_argument("--temperature", type=float, default=0.3)
+    parser.add_argument("--max-tokens", type=int, default=4096)
+    parser.add_argument("--ingest-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--tone", default="Professional")
+    parser.add_argument("--post-type", default="LinkedIn")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the LLM response cache")
+    args = parser.parse_args()
+
+    try:
+        fallbacks = parse_fallbacks(args.fallbacks)
+        llm = create_llm({
+            "provider": args.provider,
+            "model": args.model,
+            "api_key": args.api_key or get_api_key(args.provider),
+            "api_endpoint": args.api_endpoint or DEFAULT_ENDPOINTS[args.provider],
+            "temperature": args.temperature,
+            "max_tokens": args.max_tokens,
+            "fallbacks": fallbacks,
+            "hedge": args.hedge,
+        })
+    except ValueError as e:
+        parser.error(str(e))
+    progress = run_batch(
+        args.input_dir, args.tasks, args.output_dir, llm,
+        args.ingest_workers, args.llm_concurrency, args.tone, args.post_type, not args.no_cache
+    )
+
+    failed = [
+        f"{name}: {task}" for name, entry in progress.documents.items()
+        for task, info in entry["tasks"].items() if task in args.tasks and info.get("status") == "failed"
+    ] + [f"{name}: {entry['error']}" for name, entry in progress.documents.items() if entry.get("error")]
+    done = sum(
+        1 for entry in progress.documents.values()
+        for task, info in entry["tasks"].items() if task in args.tasks and info.get("status") == "done"
+    )
+    print(f"{done} output(s) written to {args.output_dir}; {len(failed)} failure(s)")
+    for line in failed:
+        print(f"  {line}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
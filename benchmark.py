@@ -0,0 +1,411 @@
+# benchmark.py
+"""Offline benchmarks for the ingestion, RAG and generation hot paths
+
+Everything runs without network access: documents are synthetic PDF/DOCX/TXT
+files, the chat model and embeddings are deterministic fakes, scraping targets
+a local HTTP server and provider routing runs against stub Ollama servers.
+Caches are pointed at a throwaway directory and bypassed, so every run
+measures real work.
+
+    python benchmark.py                      # run and compare against the baseline
+    python benchmark.py --save-baseline      # record the current numbers as the baseline
+    python benchmark.py --only ingest insights --sizes small medium
+
+Exits with status 1 when a benchmark is slower or uses more peak memory than
+its baseline by more than --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import importlib.util
+import threading
+import statistics
+import tracemalloc
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+# Keep the app's on-disk caches out of the working tree before config is imported
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="crawl-bench-")
+
+from docx import Document as DocxDocument
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from document_processor import build_vector_store
+from llm_handler import FIELD_PROMPTS, generate_insights, parse_insights
+from content_generator import generate_output
+from file_utils import convert_to_docx
+
+logger = logging.getLogger(__name__)
+
+BASELINE_PATH = "benchmark_baseline.json"
+EMBEDDING_DIM = 384
+DOCUMENT_PAGES = {"small": 5, "medium": 50, "large": 250}
+LINES_PER_PAGE = 40
+LISTINGS_PER_PAGE = {"small": 10, "medium": 50, "large": 200}
+BENCHMARK_TASKS = ["Marketing Strategy", "Social Media Content Strategy"]
+
+WORDS = (
+    "villa apartment penthouse townhouse garden pool terrace ocean view downtown "
+    "renovated spacious bedroom bathroom kitchen parking balcony marina golf "
+    "investment rental yield luxury family modern quiet school metro sale"
+).split()
+
+# Synthetic inputs
+
+def _sentences(rng: random.Random, count: int) -> List[str]:
+    lines = []
+    for _ in range(count):
+        words = rng.choices(WORDS, k=rng.randint(8, 14))
+        lines.append(f"{' '.join(words).capitalize()} SKU-{rng.randint(1000, 9999)} ${rng.randint(200, 3000)},000.")
+    return lines
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """Write a minimal multi-page PDF with one line of Helvetica text per entry"""
+    objects = []
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    font_id = 3 + 2 * len(pages)
+    objects.append("<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    for i, lines in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        )
+        body = " T* ".join(f"({_pdf_escape(line)}) Tj" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 40 760 Td {body} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+def make_document(extension: str, size: str, seed: int = 0) -> bytes:
+    """Build a synthetic document of the given type and size"""
+    rng = random.Random(seed)
+    pages = [_sentences(rng, LINES_PER_PAGE) for _ in range(DOCUMENT_PAGES[size])]
+    if extension == "pdf":
+        return make_pdf(pages)
+    if extension == "docx":
+        document = DocxDocument()
+        for lines in pages:
+            for line in lines:
+                document.add_paragraph(line)
+        buffer = BytesIO()
+        document.save(buffer)
+        return buffer.getvalue()
+    return "\n\n".join("\n".join(lines) for lines in pages).encode("utf-8")
+
+def make_listing_page(listings: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    cards = "".join(
+        f"<article><h2>{' '.join(rng.choices(WORDS, k=3)).title()} #{i}</h2>"
+        f"<p>{' '.join(_sentences(rng, 2))}</p><img src='/img/{i}.jpg'></article>"
+        for i in range(listings)
+    )
+    return f"<html><head><title>Listings</title></head><body>{cards}</body></html>"
+
+def make_marketing_markdown(sections: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = ["# Marketing Plan"]
+    for i in range(sections):
+        parts.append(f"## Section {i + 1}")
+        parts.append(" ".join(_sentences(rng, 4)))
+        parts.append("- " + "\n- ".join(_sentences(rng, 3)))
+    return "\n\n".join(parts)
+
+# Fakes
+
+class BenchmarkChatModel(BaseChatModel):
+    """Deterministic chat model returning canned responses shaped like the real ones"""
+
+    model_name: str = "benchmark-fake"
+    listing_json: str = json.dumps([{
+        "title": "Garden villa", "price": 1250000, "location": "Marina",
+        "type": "Sale", "description": "Four bedrooms with pool", "image_url": "/img/0.jpg"
+    }])
+    insight_text: str = "\n".join(f"- {word}" for word in WORDS[:8])
+    content_text: str = make_marketing_markdown(6)
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt = str(messages[-1].content)
+        if "JSON array" in prompt:
+            text = self.listing_json
+        elif "Context:" in prompt:
+            text = self.insight_text
+        else:
+            text = self.content_text
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+class _ListingHandler(BaseHTTPRequestHandler):
+    page = ""
+
+    def do_GET(self) -> None:
+        body = self.page.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+class LocalSite:
+    """A local HTTP server standing in for a scraped listings site"""
+
+    def __init__(self, page: str):
+        handler = type("Handler", (_ListingHandler,), {"page": page})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/listings"
+
+    def __enter__(self) -> "LocalSite":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+class _StubOllamaHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    status = 200
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        if self.status != 200:
+            self.send_error(self.status)
+            return
+        body = json.dumps({
+            "model": "stub", "created_at": "2024-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": "stub answer"},
+            "done": True, "done_reason": "stop", "prompt_eval_count": 10, "eval_count": 2,
+        }).encode("utf-8") + b"\n"
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except ConnectionError:
+            pass  # the losing side of a hedge was cancelled and hung up
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+class StubProvider:
+    """A local Ollama-compatible /api/chat server with a fixed latency, or failing with status"""
+
+    def __init__(self, latency: float = 0.0, status: int = 200):
+        handler = type("Handler", (_StubOllamaHandler,), {"latency": latency, "status": status})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self) -> "StubProvider":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def config(self, model: str = "stub") -> Dict[str, Any]:
+        return {"provider": "Ollama", "model": model, "api_key": None, "api_endpoint": self.url,
+                "temperature": 0.0, "max_tokens": 64}
+
+# Measurement
+
+def measure(name: str, fn: Callable[[], Any], repeat: int, units: float = 1.0,
+            unit_name: str = "ops") -> Dict[str, Any]:
+    """Time fn over repeat runs after one warmup, then measure its peak memory in one more run"""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    seconds = statistics.median(timings)
+    return {
+        "name": name,
+        "seconds": seconds,
+        "throughput": units / seconds if seconds else float("inf"),
+        "unit": f"{unit_name}/s",
+        "peak_mb": peak / (1024 * 1024),
+    }
+
+def run_benchmarks(only: Optional[List[str]], sizes: List[str], repeat: int) -> List[Dict[str, Any]]:
+    groups = set(only or ["ingest", "insights", "output", "parse", "docx", "scrape", "router"])
+    llm = BenchmarkChatModel()
+    embeddings = DeterministicFakeEmbedding(size=EMBEDDING_DIM)
+    results = []
+
+    if "ingest" in groups:
+        for size in sizes:
+            for extension in ("pdf", "docx", "txt"):
+                data = make_document(extension, size)
+                results.append(measure(
+                    f"ingest.{extension}.{size}",
+                    lambda: build_vector_store(data, f"bench.{extension}", embeddings),
+                    repeat, len(data) / (1024 * 1024), "MB"
+                ))
+
+    if "insights" in groups:
+        vector_store, _ = build_vector_store(make_document("txt", "medium"), "bench.txt", embeddings)
+        results.append(measure(
+            "insights.generate",
+            lambda: [generate_insights(llm, vector_store, field, use_cache=False) for field in FIELD_PROMPTS],
+            repeat, len(FIELD_PROMPTS), "fields"
+        ))
+
+    if "output" in groups:
+        form_data = {field: llm.insight_text for field in FIELD_PROMPTS}
+        form_data.update({"tone": "Friendly", "post_type": "Instagram post", "existing_content": llm.content_text})
+        for task in BENCHMARK_TASKS:
+            results.append(measure(
+                f"output.{task.lower().replace(' ', '_')}",
+                lambda: generate_output(llm, task, form_data, use_cache=False),
+                repeat
+            ))
+
+    if "parse" in groups:
+        responses = [(field, llm.insight_text * 20) for field in FIELD_PROMPTS] * 50
+        results.append(measure(
+            "parse.insights",
+            lambda: [parse_insights(field, text) for field, text in responses],
+            repeat, len(responses), "responses"
+        ))
+
+    if "docx" in groups:
+        for size, sections in (("small", 5), ("medium", 50), ("large", 250)):
+            if size in sizes:
+                markdown = make_marketing_markdown(sections)
+                results.append(measure(
+                    f"docx.{size}", lambda: convert_to_docx(markdown), repeat,
+                    len(markdown) / 1024, "KB"
+                ))
+
+    if "scrape" in groups:
+        # web_scraper imports crawl4ai on first crawl, so importing it proves nothing
+        if importlib.util.find_spec("crawl4ai") is None:
+            logger.warning("Skipping scrape benchmarks: crawl4ai is not installed")
+        else:
+            from web_scraper import scrape_website
+
+            for size in sizes:
+                with LocalSite(make_listing_page(LISTINGS_PER_PAGE[size])) as site:
+                    results.append(measure(
+                        f"scrape.{size}",
+                        lambda: asyncio.run(scrape_website(site.url, llm, use_cache=False)),
+                        repeat
+                    ))
+
+    if "router" in groups:
+        from llm_handler import create_llm
+
+        # A failing primary (every call fails over) and a slow primary (every call is hedged)
+        with StubProvider(status=500) as failing, StubProvider(latency=0.2) as slow, StubProvider() as fast:
+            router = create_llm({**failing.config("failing"), "fallbacks": [
+                {"provider": "Ollama", "model": "fast", "api_endpoint": fast.url}
+            ]})
+            results.append(measure("router.failover", lambda: router.invoke("ping"), repeat))
+            router = create_llm({**slow.config("slow"), "hedge": True, "fallbacks": [
+                {"provider": "Ollama", "model": "fast", "api_endpoint": fast.url}
+            ]})
+            router.params["prior_latency_seconds"] = 0.02
+            results.append(measure("router.hedge", lambda: router.invoke("ping"), repeat))
+
+    return results
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return a message for every result slower or hungrier than its baseline beyond tolerance"""
+    regressions = []
+    for row in results:
+        base = baseline.get(row["name"])
+        if not base:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            if base[metric] > 0 and row[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{row['name']}: {metric} {row[metric]:.4f} vs baseline {base[metric]:.4f} "
+                    f"(+{(row[metric] / base[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for ingestion, RAG and generation")
+    parser.add_argument("--only", nargs="+", choices=["ingest", "insights", "output", "parse", "docx", "scrape", "router"])
+    parser.add_argument("--sizes", nargs="+", default=list(DOCUMENT_PAGES), choices=list(DOCUMENT_PAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed fractional slowdown / memory growth before failing")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run_benchmarks(args.only, args.sizes, args.repeat)
+
+    print(f"{'benchmark':<40}{'median s':>10}{'throughput':>22}{'peak MB':>10}")
+    for row in results:
+        throughput = f"{row['throughput']:.2f} {row['unit']}"
+        print(f"{row['name']:<40}{row['seconds']:>10.4f}{throughput:>22}{row['peak_mb']:>10.1f}")
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update({row["name"]: {"seconds": row["seconds"], "peak_mb": row["peak_mb"]} for row in results})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print("Regressions:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+    print("No regressions")
+
+if __name__ == "__main__":
+    main()
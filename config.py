@@ -10,6 +10,70 @@ EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 DEFAULT_CHUNK_SIZE = 1000
 DEFAULT_CHUNK_OVERLAP = 100
 
+# Embedding service: backend is "torch", "onnx" or "onnx-int8"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))  # chunks embedded and indexed at a time
+
+# Parallel PDF parsing: files with fewer pages than PARALLEL_PARSE_MIN_PAGES are parsed serially
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_PARSE_MIN_PAGES = int(os.getenv("PARALLEL_PARSE_MIN_PAGES", "64"))
+PARSE_PAGES_PER_TASK = 16
+
+# Heavy libraries are imported on first use; preload them in the background once the UI is up
+PRELOAD_IMPORTS = os.getenv("PRELOAD_IMPORTS", "1") == "1"
+
+# Insight extraction
+INSIGHT_MAX_CONCURRENCY = int(os.getenv("INSIGHT_MAX_CONCURRENCY", "4"))
+INSIGHT_TIMEOUT_SECONDS = float(os.getenv("INSIGHT_TIMEOUT_SECONDS", "60"))
+
+# Fan-out generation: LLM calls in flight per batch submission (the rate limiter still applies)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# Composed prompt | llm | parser chains kept for reuse (per prompt and LLM instance)
+PROMPT_CHAIN_CACHE_SIZE = int(os.getenv("PROMPT_CHAIN_CACHE_SIZE", "64"))
+
+# Background jobs (insight extraction and generation run off the Streamlit script thread)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "200"))  # finished jobs kept for result pickup
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+
+# On-disk caches
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+INDEX_CACHE_DIR = os.path.join(CACHE_DIR, "indexes")
+INDEX_CACHE_MAX_MB = int(os.getenv("INDEX_CACHE_MAX_MB", "1024"))
+PAGE_CACHE_DIR = os.path.join(CACHE_DIR, "pages")
+PAGE_CACHE_TTL_SECONDS = float(os.getenv("PAGE_CACHE_TTL_SECONDS", "3600"))
+PAGE_CACHE_MAX_MB = int(os.getenv("PAGE_CACHE_MAX_MB", "256"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_responses.sqlite3")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# Telemetry: per-stage spans and histograms, exported on a Prometheus endpoint (port 0 disables it)
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "1") == "1"
+TELEMETRY_LOG_PATH = os.getenv("TELEMETRY_LOG_PATH", os.path.join(CACHE_DIR, "spans.jsonl"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# Provider HTTP: pooled keep-alive connections shared by metadata calls and the LLM clients
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "15"))  # metadata calls
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "120"))  # completions
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))  # keep-alive connections per host
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+MODEL_LIST_TTL_SECONDS = float(os.getenv("MODEL_LIST_TTL_SECONDS", "600"))
+MODEL_LIST_ERROR_TTL_SECONDS = float(os.getenv("MODEL_LIST_ERROR_TTL_SECONDS", "30"))  # negative caching
+MODEL_LIST_MAX_STALE_SECONDS = float(os.getenv("MODEL_LIST_MAX_STALE_SECONDS", str(24 * 3600)))
+
+# Client-side LLM rate limiting (see rate_limiter.py and RateLimitConfig)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+
+# Provider routing: comma-separated "provider:model[@endpoint]" tried after the selected model
+LLM_FALLBACKS = os.getenv("LLM_FALLBACKS", "")
+DEFAULT_ENDPOINTS = {"Groq": "https://api.groq.com/openai/v1", "Ollama": "http://localhost:11434"}
+
 class Config:
     MARKETING_TASKS = [
         "Marketing Strategy",
@@ -25,6 +89,79 @@ class Config:
         "PANDASAI": os.getenv("PANDAS_API_KEY", "")
     }
 
+class IndexConfig:
+    # Vector index selection for FAISS stores, see ann_index.choose_index_type
+    DEFAULT_PARAMS = {
+        "flat_max_vectors": 20000,  # exact search below this size
+        "hnsw_max_vectors": 1000000,  # HNSW up to this size when deletes are not needed
+        "pq_min_vectors": 2000000,  # add product quantization from this size
+        "ivf_nprobe": 16,
+        "hnsw_m": 32,
+        "hnsw_ef_construction": 200,
+        "hnsw_ef_search": 64,
+        "pq_m": 48,  # sub-quantizers; must divide the embedding dimension
+        "pq_bits": 8
+    }
+
+class RetrievalConfig:
+    # Hybrid retrieval: dense and BM25 rankings fused with weighted reciprocal rank fusion
+    DEFAULT_PARAMS = {
+        "k": 3,  # chunks returned per query
+        "fetch_k": 20,  # candidates taken from each ranking before fusion
+        "dense_weight": 1.0,
+        "keyword_weight": 1.0,
+        "rrf_k": 60
+    }
+
+class RouterConfig:
+    # Latency-aware routing across providers, with failover and optional hedged requests
+    DEFAULT_PARAMS = {
+        "window": 50,  # latency and outcome samples kept per endpoint
+        "min_samples": 5,  # samples before an endpoint is ranked by its measured latency
+        "failure_threshold": 3,  # consecutive failures that open the circuit breaker
+        "max_error_rate": 0.5,
+        "cooldown_seconds": 30.0,
+        "hedge": os.getenv("LLM_HEDGE", "0") == "1",
+        "hedge_percentile": 0.95,  # hedge once the first request is slower than this
+        "prior_latency_seconds": 5.0  # assumed latency (and hedge delay) of endpoints not yet measured
+    }
+
+class ContextConfig:
+    # RAG context packing: MMR selection of retrieved chunks up to a token budget
+    DEFAULT_PARAMS = {
+        "max_context_tokens": int(os.getenv("CONTEXT_MAX_TOKENS", "600")),  # per single-field prompt
+        "batch_max_context_tokens": int(os.getenv("BATCH_CONTEXT_MAX_TOKENS", "3000")),  # batched insight prompt
+        "candidates": 12,  # chunks retrieved per query before packing
+        "mmr_lambda": 0.7,  # 1.0 ranks by relevance only, lower values favour diversity
+        "duplicate_threshold": 0.9,  # term-vector cosine at which a chunk counts as a duplicate
+        "baseline_k": 3,  # chunks stuffed per query before packing, for the tokens-saved report
+        "chars_per_token": 4,  # estimate when no tokenizer is available
+        "default_max_tokens": 1024,  # completion size assumed when the client sets none
+        "ollama_num_ctx": 2048,  # Ollama's default context when the client sets no num_ctx
+        "default_context_window": 8192,
+        "context_windows": {
+            "llama-3.3-70b": 131072, "llama-3.1-8b": 131072, "llama3-": 8192, "gemma2-9b": 8192,
+            "mixtral-8x7b": 32768, "openai/gpt-oss": 131072, "qwen": 131072, "deepseek-r1": 131072,
+            "meta-llama/llama-4": 131072
+        }
+    }
+
+class RateLimitConfig:
+    # Quotas per provider or "provider:model" (the more specific wins); 0 means unlimited
+    DEFAULT_PARAMS = {
+        "limits": {
+            "Groq": {"rpm": int(os.getenv("GROQ_RPM", "30")), "tpm": int(os.getenv("GROQ_TPM", "6000"))},
+            "Ollama": {"rpm": 0, "tpm": 0}
+        },
+        "initial_concurrency": 4,  # AIMD: +1 per window of successes, halved on a 429
+        "max_concurrency": 16,
+        "decrease_interval_seconds": 1.0,  # a burst of 429s halves the limit once
+        "max_attempts": 5,  # per call, across 429s and transient errors
+        "backoff_seconds": 2.0,  # without Retry-After; doubled per transient retry
+        "chars_per_token": 4,  # prompt size estimate used to reserve tokens/min
+        "async_poll_seconds": 0.05
+    }
+
 def get_api_key(provider: str) -> str:
     config = Config()
     return config.API_KEYS.get(provider.upper(), "")
@@ -32,8 +169,13 @@ def get_api_key(provider: str) -> str:
 class CrawlConfig:
     DEFAULT_PARAMS = {
         "timeout": 30000,
-        "max_retries": 3,
-        "rate_limit": 5,  # requests per second
+        "max_retries": int(os.getenv("CRAWL_MAX_RETRIES", "3")),
+        "rate_limit": float(os.getenv("CRAWL_RATE_LIMIT", "5")),  # requests per second per host
+        "max_concurrency": 8,  # pages crawled at once across all hosts
+        "backoff_base": 1.0,  # seconds; doubled on every retry
+        "backoff_max": 30.0,
+        "extract_chunk_chars": 6000,  # max markdown characters per extraction prompt
+        "extract_concurrency": 4,  # extraction prompts in flight per page
         "user_agents": [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.1 Safari/605.1.15"
@@ -1,245 +1,256 @@
 # content_generator.py
+import time
 import logging
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from typing import Dict, Any, Optional, Tuple, Union
+import threading
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
+from config import BATCH_MAX_CONCURRENCY
+from llm_handler import describe_llm
+from llm_cache import cached_call, get_llm_cache
+from prompt_registry import registry
+from telemetry import span, llm_run_config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def generate_output(llm: Any, task: str, form_data: Dict[str, str]) -> str:
+# Streaming stats per (provider, model), updated by record_stream_metrics
+_stream_metrics: Dict[Tuple[str, str], Dict[str, float]] = {}
+_stream_metrics_lock = threading.Lock()
+
+def run_task(llm: Any, task: str, form_data: Dict[str, str], use_cache: bool = True) -> str:
+    """Generate task-specific marketing content, raising on failure"""
+    chain = registry.chain(task, llm)
+    inputs = registry.inputs(task, form_data)
+
+    # Execute the chain, reusing the response to an identical earlier prompt
+    with span("llm.generate", task=task):
+        return cached_call(
+            llm, registry.format(task, inputs), lambda: chain.invoke(inputs, config=llm_run_config(llm)), use_cache
+        )
+
+def generate_output(llm: Any, task: str, form_data: Dict[str, str], use_cache: bool = True) -> str:
     """Generate task-specific marketing content"""
-    task_prompts = {
-    "Marketing Strategy": """
-        You are a senior marketing strategist tasked with creating a comprehensive marketing plan.
-        
-        ## Business Context
-        Brand Description: {brand_description}
-        Target Audience: {target_audience}
-        Products/Services: {products_services}
-        Marketing Goals: {marketing_goals}
-        Existing Content: {existing_content}
-        Keywords: {keywords}
-        
-        ## Instructions
-        Develop a detailed, actionable marketing strategy that aligns with the business goals.
-        Focus on creating a strategy that is specific, measurable, achievable, relevant, and time-bound.
-        
-        ## Required Output Structure
-        1. Executive Summary (brief overview of the entire strategy)
-        2. Market Analysis (industry trends, competitive landscape)
-        3. Target Audience Segmentation (detailed profiles of key segments)
-        4. Value Proposition & Positioning (unique selling points, brand positioning)
-        5. Marketing Channels & Tactics (prioritized by ROI potential)
-        6. Content Strategy (topics, formats, distribution, calendar)
-        7. Budget Allocation (recommended spending by channel)
-        8. Implementation Timeline (30-60-90 day plan)
-        9. KPIs & Success Metrics (specific measurements for each goal)
-        10. Risk Assessment & Contingency Plans
-    """,
-    
-    "Campaign Strategy": """
-        You are a creative campaign director tasked with developing innovative marketing campaigns.
-        
-        ## Business Context
-        Brand Description: {brand_description}
-        Target Audience: {target_audience}
-        Products/Services: {products_services}
-        Marketing Goals: {marketing_goals}
-        Keywords: {keywords}
-        Selected Topics: {suggested_topics}
-        Tone: {tone}
-        
-        ## Instructions
-        Generate 5 distinct, creative campaign concepts that align with the brand identity and will resonate with the target audience.
-        Each campaign should be achievable with realistic resources and have clear business impact.
-        
-        ## Required Output Structure
-        For each of the 5 campaigns, provide:
-        
-        ### Campaign [Number]: [Creative Name]
-        * Concept: Brief explanation of the campaign idea and creative angle
-        * Target Segment: Specific audience segment this will appeal to most
-        * Core Message: The primary takeaway for the audience
-        * Campaign Elements: List of deliverables (videos, posts, emails, etc.)
-        * Channels: Primary platforms for distribution
-        * Timeline: Suggested duration and key milestones
-        * Success Metrics: How to measure campaign effectiveness
-        * Estimated Impact: Expected outcomes tied to marketing goals
-    """,
-    
-    "Social Media Content Strategy": """
-        You are an expert social media manager creating platform-specific content.
-        
-        ## Business Context
-        Brand Description: {brand_description}
-        Target Audience: {target_audience}
-        Products/Services: {products_services}
-        Marketing Goals: {marketing_goals}
-        Keywords: {keywords}
-        Selected Topics: {suggested_topics}
-        Tone: {tone}
-        Post Type: {post_type}
-        
-        ## Instructions
-        Create a comprehensive social media content plan optimized for {post_type}.
-        Focus on engaging the target audience with content that drives specific marketing goals.
-        Ensure all content maintains the brand's {tone} tone of voice.
-        
-        ## Required Output Structure
-        1. Platform Strategy
-           * Why {post_type} is effective for this audience
-           * Best practices specific to this platform
-           * Posting frequency recommendations
-        
-        2. Content Pillars (3-4 key themes aligned with business goals)
-        
-        3. Content Calendar (2-week sample)
-           * Week 1:
-             * Day 1: [Content type] - [Example post with exact copy]
-             * Day 2: [Content type] - [Example post with exact copy]
-             [Continue for all week]
-           * Week 2: [Same format]
-        
-        4. Engagement Strategy
-           * Response templates for common interactions
-           * Community-building tactics
-           * User-generated content opportunities
-        
-        5. Growth Tactics
-           * Hashtag strategy (10-15 targeted hashtags grouped by purpose)
-           * Collaboration opportunities
-           * Cross-promotion ideas
-        
-        6. Analytics Focus
-           * Key metrics to track for this specific platform
-           * Benchmarks for success
-    """,
-    
-    "SEO Optimization Strategy": """
-        You are an SEO specialist developing a comprehensive search optimization strategy.
-        
-        ## Business Context
-        Brand Description: {brand_description}
-        Target Audience: {target_audience}
-        Products/Services: {products_services}
-        Marketing Goals: {marketing_goals}
-        Keywords: {keywords}
-        Existing Content: {existing_content}
-        
-        ## Instructions
-        Create a detailed SEO strategy that will improve organic visibility and drive qualified traffic.
-        Focus on both quick wins and long-term sustainable growth.
-        Provide specific, actionable recommendations rather than general advice.
-        
-        ## Required Output Structure
-        1. Keyword Strategy
-           * Primary Keywords (5-7 high-priority terms with search volume estimates)
-           * Secondary Keywords (10-15 supporting terms)
-           * Long-tail Opportunities (7-10 specific phrases)
-           * Semantic/Topic Clusters (group related terms by topic)
-        
-        2. On-Page Optimization
-           * Title Tag Templates
-           * Meta Description Frameworks
-           * Heading Structure Recommendations
-           * Content Length and Formatting Guidelines
-           * Internal Linking Strategy
-        
-        3. Technical SEO Checklist
-           * Site Speed Optimization
-           * Mobile Usability
-           * Schema Markup Recommendations
-           * Indexation Controls
-           * URL Structure Guidelines
-        
-        4. Content Strategy
-           * Content Gaps Analysis
-           * Content Update Priorities
-           * New Content Recommendations (5-7 specific pieces)
-           * Content Calendar Framework
-        
-        5. Off-Page Strategy
-           * Link Building Tactics (specific to industry)
-           * Digital PR Opportunities
-           * Local Citation Opportunities (if applicable)
-        
-        6. Measurement Plan
-           * Key Performance Indicators
-           * Tracking Setup Recommendations
-           * Reporting Schedule and Format
-        """,
-
-    "Post Composer": """
-        You are a professional real estate copywriter creating compelling property listings and promotional content.
-        
-        ## Business Context
-        Brand Description: {brand_description}
-        Target Audience: {target_audience}
-        Properties: {properties_data}
-        Marketing Goals: {marketing_goals}
-        Keywords: {keywords}
-        Selected Topics: {suggested_topics}
-        
-        ## Instructions
-        Create engaging property posts that highlight key features and attract potential buyers/renters.
-        Include property details from {properties_data} and incorporate {keywords} naturally.
-        Maintain a {tone} tone while emphasizing unique selling points.
-        
-        ## Property Post Structure
-        1. Property Image: {property_image_url}
-        2. Headline: Attention-grabbing title with location and key feature
-        3. Description:
-           - Opening hook highlighting unique feature
-           - Key details (bedrooms, bathrooms, sqft, amenities)
-           - Neighborhood highlights
-           - Unique selling points
-        4. Call-to-Action: Clear next steps (schedule viewing, contact agent)
-        5. Hashtags: 5-10 relevant real estate hashtags
-        
-        ## Platform-Specific Guidelines
-        ### Instagram:
-        - Use high-quality property images
-        - Caption under 150 words highlighting key features
-        - Include price and location in first line
-        - Use emojis sparingly for emphasis
-        - Hashtags: #realestate #property #location #homesforsale
-        
-        ### Facebook:
-        - Longer description (200-300 words)
-        - Include virtual tour link if available
-        - Highlight community amenities
-        - Use bullet points for key features
-        
-        ### LinkedIn:
-        - Professional tone focusing on investment potential
-        - Include market trends and comparisons
-        - Target investors and professionals
-        - Use statistics and data points
-        
-        ## Required Output
-        {
-            "image_url": "{property_image_url}",
-            "headline": "Attention-grabbing property title",
-            "description": "Detailed property description...",
-            "cta": "Schedule a viewing today!",
-            "hashtags": ["#realestate", "#property", ...]
-        }
-        """
-    }
-    
     try:
-        # Create the prompt
-        prompt = ChatPromptTemplate.from_template(task_prompts[task])
-        
-        # Create the chain
-        chain = prompt | llm | StrOutputParser()
-        
-        # Execute the chain
-        response = chain.invoke(form_data)
-        
-        return response
+        return run_task(llm, task, form_data, use_cache)
     except Exception as e:
         logger.error(f"Content generation failed: {str(e)}")
         return f"Error generating content: {str(e)}"
+
+
+# Property fields shown to the model for each scraped listing, in order
+PROPERTY_FIELDS = ["title", "type", "price", "location", "description", "source_url"]
+
+def format_property(item: Dict[str, Any]) -> str:
+    """Render one scraped property as the properties_data for a Post Composer prompt"""
+    lines = [f"{name.replace('_', ' ').title()}: {item[name]}" for name in PROPERTY_FIELDS if item.get(name)]
+    lines += [f"{name.replace('_', ' ').title()}: {value}" for name, value in item.items()
+              if name not in PROPERTY_FIELDS and name != "image_url" and value]
+    return "\n".join(lines)
+
+def fan_out(form_data: Dict[str, str], tasks: List[str], tones: Optional[List[str]] = None,
+            properties: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Expand one form submission into batch items: every task in every tone
+
+    Tasks whose template has no {tone} run once whatever the tones, since their
+    prompts would be identical. With properties, Post Composer gets one item
+    per property (per tone) instead of a single post; the other tasks do not use
+    property data. Each item is {"label", "task", "form_data"}.
+    """
+    tones = tones or [form_data.get("tone", "")]
+    items = []
+    for task in tasks:
+        task_tones = tones if "tone" in registry.variables[task] else [form_data.get("tone", "")]
+        for tone in task_tones:
+            variant = {**form_data, "tone": tone}
+            label = f"{task} ({tone})" if len(task_tones) > 1 else task
+            if task != "Post Composer" or not properties:
+                items.append({"label": label, "task": task, "form_data": variant})
+                continue
+            for number, item in enumerate(properties, 1):
+                items.append({
+                    "label": f"{label}: {item.get('title') or f'Property {number}'}",
+                    "task": task,
+                    "form_data": {
+                        **variant,
+                        "properties_data": format_property(item),
+                        "property_image_url": item.get("image_url", ""),
+                    },
+                })
+    return items
+
+def _prepare_batch(llm: Any, items: List[Dict[str, Any]], use_cache: bool
+                   ) -> Tuple[List[Tuple[int, str]], List[Any], List[Tuple[int, Optional[str]]]]:
+    """Split batch items into ready answers (cache hits and invalid items) and prompts still to send"""
+    cache = get_llm_cache() if use_cache else None
+    ready, prompts, pending = [], [], []
+    for i, item in enumerate(items):
+        try:
+            inputs = registry.inputs(item["task"], item["form_data"])
+            prompt = registry.prompt(item["task"]).format_prompt(**inputs)
+        except Exception as e:
+            logger.error(f"Batch item {item['label']} is invalid: {str(e)}")
+            ready.append((i, f"Error generating content: {str(e)}"))
+            continue
+        key = cache.key(prompt.to_string(), llm) if cache else None
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            ready.append((i, cached))
+            continue
+        prompts.append(prompt)
+        pending.append((i, key))
+    return ready, prompts, pending
+
+def _finish_batch_item(llm: Any, item: Dict[str, Any], key: Optional[str], output: Any) -> str:
+    if isinstance(output, Exception):
+        logger.error(f"Content generation for {item['label']} failed: {str(output)}")
+        return f"Error generating content: {str(output)}"
+    text = output.content if isinstance(output.content, str) else str(output.content)
+    cache = get_llm_cache() if key else None
+    if cache:
+        cache.put(key, text, llm)
+    return text
+
+def generate_batch(llm: Any, items: List[Dict[str, Any]], max_concurrency: int = BATCH_MAX_CONCURRENCY,
+                   use_cache: bool = True) -> Iterator[Tuple[int, str]]:
+    """Generate many items in one llm.batch_as_completed call, yielding (index, text) as each finishes
+
+    Cached answers are yielded first. At most max_concurrency requests are in
+    flight, and a failed item yields an error message like generate_output
+    instead of stopping the batch. Closing the iterator early cancels the
+    requests not yet started.
+    """
+    ready, prompts, pending = _prepare_batch(llm, items, use_cache)
+    yield from ready
+    if not prompts:
+        return
+
+    start = time.perf_counter()
+    config = llm_run_config(llm, max_concurrency=max(1, max_concurrency))
+    for j, output in llm.batch_as_completed(prompts, config=config, return_exceptions=True):
+        i, key = pending[j]
+        yield i, _finish_batch_item(llm, items[i], key, output)
+    logger.info(f"Generated {len(prompts)} batch items in {time.perf_counter() - start:.2f}s "
+                f"({len(items) - len(prompts)} cached or invalid)")
+
+async def agenerate_batch(llm: Any, items: List[Dict[str, Any]], max_concurrency: int = BATCH_MAX_CONCURRENCY,
+                          use_cache: bool = True) -> AsyncIterator[Tuple[int, str]]:
+    """Async variant of generate_batch built on llm.abatch_as_completed"""
+    ready, prompts, pending = _prepare_batch(llm, items, use_cache)
+    for result in ready:
+        yield result
+    if not prompts:
+        return
+
+    start = time.perf_counter()
+    config = llm_run_config(llm, max_concurrency=max(1, max_concurrency))
+    async for j, output in llm.abatch_as_completed(prompts, config=config, return_exceptions=True):
+        i, key = pending[j]
+        yield i, _finish_batch_item(llm, items[i], key, output)
+    logger.info(f"Generated {len(prompts)} batch items in {time.perf_counter() - start:.2f}s "
+                f"({len(items) - len(prompts)} cached or invalid)")
+
+
+def record_stream_metrics(llm: Any, time_to_first_token: float, tokens: int, duration: float) -> None:
+    """Record time-to-first-token and throughput of one streamed generation"""
+    key = describe_llm(llm)
+    generation_time = duration - time_to_first_token
+    tokens_per_second = tokens / generation_time if generation_time > 0 else 0.0
+    with _stream_metrics_lock:
+        stats = _stream_metrics.setdefault(key, {
+            "runs": 0, "ttft_total": 0.0, "tokens_total": 0, "generation_seconds_total": 0.0
+        })
+        stats["runs"] += 1
+        stats["ttft_total"] += time_to_first_token
+        stats["tokens_total"] += tokens
+        stats["generation_seconds_total"] += max(generation_time, 0.0)
+        stats["last_ttft"] = time_to_first_token
+        stats["last_tokens_per_second"] = tokens_per_second
+    logger.info(
+        f"Streamed {tokens} tokens from {key[0]}/{key[1]}: "
+        f"ttft={time_to_first_token:.2f}s, {tokens_per_second:.1f} tokens/s"
+    )
+
+def get_stream_metrics() -> Dict[str, Dict[str, float]]:
+    """Return average and last streaming stats keyed by "provider/model" """
+    with _stream_metrics_lock:
+        summary = {}
+        for (provider, model), stats in _stream_metrics.items():
+            seconds = stats["generation_seconds_total"]
+            summary[f"{provider}/{model}"] = {
+                "runs": stats["runs"],
+                "avg_ttft": stats["ttft_total"] / stats["runs"],
+                "avg_tokens_per_second": stats["tokens_total"] / seconds if seconds > 0 else 0.0,
+                "last_ttft": stats["last_ttft"],
+                "last_tokens_per_second": stats["last_tokens_per_second"],
+            }
+        return summary
+
+def stream_output(llm: Any, task: str, form_data: Dict[str, str], use_cache: bool = True) -> Iterator[str]:
+    """Stream task-specific marketing content as it is generated
+
+    Yields text chunks (roughly one token each) as they arrive; the concatenated
+    chunks are the same text generate_output returns. A cached response is
+    yielded as a single chunk.
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    parts = []
+    try:
+        chain = registry.chain(task, llm)
+        inputs = registry.inputs(task, form_data)
+        cache = get_llm_cache() if use_cache else None
+        key = cache.key(registry.format(task, inputs), llm) if cache else None
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            yield cached
+            return
+
+        for chunk in chain.stream(inputs, config=llm_run_config(llm)):
+            if not chunk:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter() - start
+            parts.append(chunk)
+            yield chunk
+    except Exception as e:
+        logger.error(f"Content generation failed: {str(e)}")
+        yield f"Error generating content: {str(e)}"
+        return
+
+    if cache:
+        cache.put(key, "".join(parts), llm)
+    if first_token_at is not None:
+        record_stream_metrics(llm, first_token_at, len(parts), time.perf_counter() - start)
+
+async def astream_output(llm: Any, task: str, form_data: Dict[str, str],
+                         use_cache: bool = True) -> AsyncIterator[str]:
+    """Async variant of stream_output built on chain.astream"""
+    start = time.perf_counter()
+    first_token_at = None
+    parts = []
+    try:
+        chain = registry.chain(task, llm)
+        inputs = registry.inputs(task, form_data)
+        cache = get_llm_cache() if use_cache else None
+        key = cache.key(registry.format(task, inputs), llm) if cache else None
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            yield cached
+            return
+
+        async for chunk in chain.astream(inputs, config=llm_run_config(llm)):
+            if not chunk:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter() - start
+            parts.append(chunk)
+            yield chunk
+    except Exception as e:
+        logger.error(f"Content generation failed: {str(e)}")
+        yield f"Error generating content: {str(e)}"
+        return
+
+    if cache:
+        cache.put(key, "".join(parts), llm)
+    if first_token_at is not None:
+        record_stream_metrics(llm, first_token_at, len(parts), time.perf_counter() - start)
@@ -0,0 +1,178 @@
+# context_packer.py
+import math
+import logging
+import functools
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import ContextConfig
+from hybrid_retriever import tokenize
+from telemetry import CONTEXT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+TokenCounter = Callable[[str], int]
+
+# tiktoken encodings closest to each model family's tokenizer, matched by substring of the model name
+TIKTOKEN_ENCODINGS = [
+    ("gpt-oss", "o200k_base"),
+    ("gpt-4o", "o200k_base"),
+    ("llama-3", "cl100k_base"),  # Llama 3 uses a tiktoken-style BPE with a superset of cl100k
+    ("llama3", "cl100k_base"),
+    ("", "cl100k_base"),
+]
+
+def _estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / ContextConfig.DEFAULT_PARAMS["chars_per_token"])
+
+@functools.lru_cache(maxsize=8)
+def _tiktoken_counter(encoding_name: str) -> Optional[TokenCounter]:
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:  # not installed, or the encoding cannot be downloaded
+        logger.info(f"tiktoken encoding {encoding_name} unavailable, estimating token counts: {str(e)}")
+        return None
+    return functools.lru_cache(maxsize=4096)(lambda text: len(encoding.encode(text, disallowed_special=())))
+
+def token_counter(llm: Any) -> TokenCounter:
+    """Count tokens as the target model would
+
+    Uses the client's own tokenizer when its integration provides one, then the
+    closest tiktoken encoding for the model family, then a characters-per-token
+    estimate.
+    """
+    from langchain_core.language_models import BaseLanguageModel
+    from llm_handler import describe_llm, unwrap_llm
+
+    client = unwrap_llm(llm)
+    if isinstance(client, BaseLanguageModel) and (
+        client.custom_get_token_ids is not None
+        or type(client).get_token_ids is not BaseLanguageModel.get_token_ids
+        or type(client).get_num_tokens is not BaseLanguageModel.get_num_tokens
+    ):
+        return client.get_num_tokens
+
+    model = describe_llm(llm)[1].lower()
+    encoding_name = next(name for pattern, name in TIKTOKEN_ENCODINGS if pattern in model)
+    return _tiktoken_counter(encoding_name) or _estimate_tokens
+
+def context_window(llm: Any) -> int:
+    """Context window of the target model, by longest matching model name prefix
+
+    Ollama truncates prompts to its num_ctx whatever the model supports, so an
+    Ollama client without num_ctx set gets the server default. A provider
+    router may send the prompt to any of its endpoints, so it gets the
+    smallest of their windows.
+    """
+    from llm_handler import describe_llm, unwrap_llm
+
+    provider, model = describe_llm(llm)
+    if provider == "Router":
+        return min(context_window(endpoint) for endpoint in unwrap_llm(llm).models)
+    if provider == "Ollama":
+        return getattr(unwrap_llm(llm), "num_ctx", None) or ContextConfig.DEFAULT_PARAMS["ollama_num_ctx"]
+    model = model.lower()
+    windows = ContextConfig.DEFAULT_PARAMS["context_windows"]
+    matches = [name for name in windows if model.startswith(name)]
+    return windows[max(matches, key=len)] if matches else ContextConfig.DEFAULT_PARAMS["default_context_window"]
+
+def context_budget(llm: Any, prompt_text: str, max_context_tokens: int,
+                   count_tokens: Optional[TokenCounter] = None) -> int:
+    """Tokens available for context: the configured cap, or what the model's window leaves after
+    the rest of the prompt and the completion"""
+    from llm_cache import llm_settings
+
+    from llm_handler import unwrap_llm
+
+    count_tokens = count_tokens or token_counter(llm)
+    endpoints = getattr(unwrap_llm(llm), "models", None) or [llm]
+    completion = max(
+        llm_settings(endpoint)["max_tokens"] or ContextConfig.DEFAULT_PARAMS["default_max_tokens"]
+        for endpoint in endpoints
+    )
+    available = context_window(llm) - completion - count_tokens(prompt_text)
+    return max(0, min(max_context_tokens, available))
+
+def _term_vector(text: str) -> Tuple[Counter, float]:
+    terms = Counter(tokenize(text))
+    return terms, math.sqrt(sum(count * count for count in terms.values()))
+
+def _cosine(a: Tuple[Counter, float], b: Tuple[Counter, float]) -> float:
+    (terms_a, norm_a), (terms_b, norm_b) = a, b
+    if not norm_a or not norm_b:
+        return 0.0
+    if len(terms_a) > len(terms_b):
+        terms_a, terms_b = terms_b, terms_a
+    return sum(count * terms_b.get(term, 0) for term, count in terms_a.items()) / (norm_a * norm_b)
+
+def _truncate(text: str, tokens: int, count_tokens: TokenCounter) -> str:
+    """Cut text to roughly tokens tokens, at a word boundary"""
+    total = count_tokens(text)
+    if total <= tokens:
+        return text
+    cut = text[:max(0, len(text) * tokens // max(total, 1))]
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+def pack_context(chunks: List[str], budget_tokens: int, count_tokens: TokenCounter,
+                 params: Optional[Dict[str, Any]] = None,
+                 baseline_chunks: Optional[List[str]] = None) -> Tuple[str, Dict[str, Any]]:
+    """Select retrieved chunks (best first) into a context of at most budget_tokens
+
+    Chunks are picked by maximal marginal relevance: relevance falls with
+    retrieval rank, and similarity to chunks already picked (cosine over term
+    counts) is penalised, so near-duplicates lose out to new information.
+    Chunks at or above duplicate_threshold similarity are dropped outright and
+    chunks that no longer fit are skipped in favour of smaller ones. Returns the
+    context and a report of the tokens used and saved against the unpacked
+    baseline_chunks (by default the top baseline_k chunks, as stuffed before).
+    """
+    params = {**ContextConfig.DEFAULT_PARAMS, **(params or {})}
+    unique = list(dict.fromkeys(chunk for chunk in chunks if chunk.strip()))
+    tokens = [count_tokens(chunk) for chunk in unique]
+    vectors = [_term_vector(chunk) for chunk in unique]
+    relevance = [1.0 - i / max(len(unique), 1) for i in range(len(unique))]
+
+    selected: List[int] = []
+    duplicates = 0
+    used = 0
+    remaining = set(range(len(unique)))
+    while remaining and used < budget_tokens:
+        best, best_score = None, -math.inf
+        for i in sorted(remaining):
+            similarity = max((_cosine(vectors[i], vectors[j]) for j in selected), default=0.0)
+            if similarity >= params["duplicate_threshold"]:
+                remaining.discard(i)
+                duplicates += 1
+                continue
+            score = params["mmr_lambda"] * relevance[i] - (1 - params["mmr_lambda"]) * similarity
+            if score > best_score and used + tokens[i] <= budget_tokens:
+                best, best_score = i, score
+        if best is None:
+            break
+        selected.append(best)
+        remaining.discard(best)
+        used += tokens[best]
+
+    parts = [unique[i] for i in selected]
+    if not parts and unique and budget_tokens > 0:
+        # Even the best chunk is over budget: keep as much of it as fits
+        parts = [_truncate(unique[0], budget_tokens, count_tokens)]
+        used = count_tokens(parts[0])
+
+    if baseline_chunks is None:
+        baseline_chunks = chunks[:params["baseline_k"]]
+    baseline = sum(count_tokens(chunk) for chunk in baseline_chunks)
+    report = {
+        "candidates": len(chunks),
+        "selected": len(parts),
+        "duplicates_dropped": duplicates + len(chunks) - len(unique),
+        "budget_tokens": budget_tokens,
+        "tokens_used": used,
+        "baseline_tokens": baseline,
+        "tokens_saved": baseline - used,
+    }
+    CONTEXT_TOKENS.inc(used, type="packed")
+    if baseline > used:
+        CONTEXT_TOKENS.inc(baseline - used, type="saved")
+    return "\n\n".join(parts), report
@@ -0,0 +1,151 @@
+# corpus.py
+import os
+import copy
+import json
+import hashlib
+import logging
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from typing import Any, Dict, List, Optional, Tuple
+from document_processor import build_vector_store
+from embedding_service import get_embeddings
+from index_store import IndexStore, index_key
+from ann_index import delete_from_vector_store, index_vectors, optimize_vector_store
+from hybrid_retriever import BM25Index, register_bm25_index
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+class DocumentCorpus:
+    """A FAISS index over many documents that grows and shrinks incrementally
+
+    Each document is identified by the hash of its bytes. Adding a document
+    that is already in the manifest is a no-op, and a document seen in an
+    earlier session is loaded from the IndexStore instead of being re-embedded.
+    Its chunks are merged into the shared index and can later be deleted by ID.
+    """
+
+    def __init__(self, embeddings: Optional[Any] = None, index_store: Optional[IndexStore] = None):
+        self.embeddings = embeddings or get_embeddings()
+        self.index_store = index_store or IndexStore()
+        self.vector_store: Optional[FAISS] = None
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+        self._content: Dict[str, str] = {}
+        self.bm25 = BM25Index()
+
+    @staticmethod
+    def document_id(file_bytes: bytes) -> str:
+        return hashlib.sha256(file_bytes).hexdigest()
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.manifest
+
+    def add_document(self, file_bytes: bytes, file_name: str) -> Tuple[str, bool]:
+        """Add a document to the corpus
+
+        Returns (doc_id, added); added is False when the document was already present.
+        """
+        doc_id = self.document_id(file_bytes)
+        if doc_id in self.manifest:
+            return doc_id, False
+
+        key = index_key(file_bytes, file_name)
+        cached = self.index_store.load(key, self.embeddings)
+        if cached is not None:
+            doc_store, content = cached
+        else:
+            doc_store, content = build_vector_store(file_bytes, file_name, self.embeddings)
+            self.index_store.save(key, doc_store, content)
+
+        # Copy vectors rather than merge_from, which needs both indexes to be the same type
+        chunk_ids = [doc_store.index_to_docstore_id[i] for i in range(doc_store.index.ntotal)]
+        docs = [doc_store.docstore.search(chunk_id) for chunk_id in chunk_ids]
+        text_embeddings = list(zip([doc.page_content for doc in docs], index_vectors(doc_store.index)))
+        metadatas = [{**doc.metadata, "doc_id": doc_id, "file_name": file_name} for doc in docs]
+
+        if self.vector_store is None:
+            self.vector_store = FAISS.from_embeddings(
+                text_embeddings, self.embeddings, metadatas=metadatas, ids=chunk_ids
+            )
+        else:
+            self.vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=chunk_ids)
+        # HNSW cannot delete vectors, so the corpus only grows into IVF
+        self.vector_store = optimize_vector_store(self.vector_store, allow_hnsw=False)
+        for chunk_id, (text, _) in zip(chunk_ids, text_embeddings):
+            self.bm25.add(chunk_id, text)
+        register_bm25_index(self.vector_store, self.bm25)
+
+        self.manifest[doc_id] = {"file_name": file_name, "chunk_ids": chunk_ids}
+        self._content[doc_id] = content
+        logger.info(f"Added {file_name} to corpus ({len(chunk_ids)} chunks)")
+        return doc_id, True
+
+    def remove_document(self, doc_id: str) -> bool:
+        """Delete a document's chunks from the index; returns False if it was not present"""
+        entry = self.manifest.pop(doc_id, None)
+        if entry is None:
+            return False
+
+        self._content.pop(doc_id, None)
+        for chunk_id in entry["chunk_ids"]:
+            self.bm25.remove(chunk_id)
+        if not self.manifest:
+            self.vector_store = None
+        elif entry["chunk_ids"]:
+            self.vector_store = delete_from_vector_store(self.vector_store, entry["chunk_ids"], allow_hnsw=False)
+            register_bm25_index(self.vector_store, self.bm25)
+        logger.info(f"Removed {entry['file_name']} from corpus")
+        return True
+
+    def snapshot(self) -> Optional[FAISS]:
+        """A copy of the vector store (and its BM25 index) that later adds and removes do not touch
+
+        Background jobs search the snapshot while the script thread keeps
+        updating the corpus in place.
+        """
+        if self.vector_store is None:
+            return None
+        store = copy.copy(self.vector_store)
+        store.index = faiss.clone_index(self.vector_store.index)
+        store.docstore = InMemoryDocstore(dict(self.vector_store.docstore._dict))
+        store.index_to_docstore_id = dict(self.vector_store.index_to_docstore_id)
+        register_bm25_index(store, self.bm25.copy())
+        return store
+
+    def documents(self) -> List[Dict[str, Any]]:
+        return [
+            {"doc_id": doc_id, "file_name": entry["file_name"], "chunks": len(entry["chunk_ids"])}
+            for doc_id, entry in self.manifest.items()
+        ]
+
+    @property
+    def content(self) -> str:
+        """Text of every document in the corpus, in insertion order"""
+        return " ".join(self._content[doc_id] for doc_id in self.manifest)
+
+    def save(self, path: str) -> None:
+        """Persist the index and manifest to a directory"""
+        os.makedirs(path, exist_ok=True)
+        if self.vector_store is not None:
+            self.vector_store.save_local(path)
+        with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump({"manifest": self.manifest, "content": self._content}, f)
+
+    @classmethod
+    def load(cls, path: str, embeddings: Optional[Any] = None,
+             index_store: Optional[IndexStore] = None) -> "DocumentCorpus":
+        """Load a corpus saved with save()"""
+        corpus = cls(embeddings, index_store)
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            data = json.load(f)
+        corpus.manifest = data["manifest"]
+        corpus._content = data["content"]
+        if corpus.manifest:
+            corpus.vector_store = FAISS.load_local(
+                path, corpus.embeddings, allow_dangerous_deserialization=True
+            )
+            corpus.bm25 = BM25Index.from_vector_store(corpus.vector_store)
+            register_bm25_index(corpus.vector_store, corpus.bm25)
+        return corpus
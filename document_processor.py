@@ -1,13 +1,22 @@
 # document_processor.py
 import streamlit as st
+import os
+import time
 import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import logging
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from typing import Dict, Any, Optional, Tuple, Union
-from config import MAX_FILE_SIZE_MB, SUPPORTED_FILE_TYPES, EMBEDDING_MODEL, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
+from typing import TYPE_CHECKING, Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
+from config import MAX_FILE_SIZE_MB, SUPPORTED_FILE_TYPES, EMBEDDING_MODEL, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, INGEST_BATCH_SIZE
+from config import PARSER_WORKERS, PARALLEL_PARSE_MIN_PAGES, PARSE_PAGES_PER_TASK
+from index_store import IndexStore, index_key
+from embedding_service import get_embeddings
+from telemetry import span, timed_iter, record_duration
+
+if TYPE_CHECKING:
+    # Loaders, the splitter, pypdf, FAISS and langchain_core are imported where they are used to keep startup fast
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -26,41 +35,181 @@ def validate_uploaded_file(file: st.runtime.uploaded_file_manager.UploadedFile)
     
     return True
 
-@st.cache_data(show_spinner="Processing document...")
-def process_document(_file: bytes, file_name: str) -> Tuple[Optional[FAISS], str]:
-    """Process uploaded document and create vector store"""
-    try:
-        # Read the file content directly from the bytes
-        file_extension = file_name.split('.')[-1].lower()
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}") as temp_file:
-            temp_file.write(_file)
-            temp_path = temp_file.name  # Get the file path
-        
-        if file_extension == 'pdf':
-            loader = PyPDFLoader(temp_path)
-        elif file_extension in ['docx', 'doc']:
-            loader = Docx2txtLoader(temp_path)
-        elif file_extension in ['txt', 'md']:
-            loader = TextLoader(temp_path)
-        else:
-            raise ValueError(f"Unsupported file type: {file_extension}")
-            
-        documents = loader.load()
-        doc_content = " ".join([doc.page_content for doc in documents])
-
-        # Text splitting
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=DEFAULT_CHUNK_SIZE,
-            chunk_overlap=DEFAULT_CHUNK_OVERLAP
+def _create_loader(path: str, file_extension: str) -> Any:
+    """Return the LangChain loader for a file type"""
+    from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+
+    if file_extension == 'pdf':
+        return PyPDFLoader(path)
+    elif file_extension in ['docx', 'doc']:
+        return Docx2txtLoader(path)
+    elif file_extension in ['txt', 'md']:
+        return TextLoader(path)
+    else:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
+def _extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) of a PDF (runs in a worker process)"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() for i in range(start, end)]
+
+def lazy_load_pdf(path: str, workers: int = PARSER_WORKERS) -> Iterator["Document"]:
+    """Yield a PDF's pages in order, extracting page ranges in a process pool
+
+    Small files (fewer than PARALLEL_PARSE_MIN_PAGES pages) or workers <= 1 use
+    the serial PyPDFLoader path. At most 2 * workers page ranges are in flight,
+    so memory stays bounded for very large files.
+    """
+    from pypdf import PdfReader
+    from langchain_community.document_loaders import PyPDFLoader
+
+    total_pages = len(PdfReader(path).pages)
+    if workers <= 1 or total_pages < PARALLEL_PARSE_MIN_PAGES:
+        yield from PyPDFLoader(path).lazy_load()
+        return
+
+    ranges = [
+        (start, min(start + PARSE_PAGES_PER_TASK, total_pages))
+        for start in range(0, total_pages, PARSE_PAGES_PER_TASK)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for start, end in ranges:
+            pending.append((start, pool.submit(_extract_pdf_pages, path, start, end)))
+            if len(pending) < 2 * workers:
+                continue
+            first_page, future = pending.popleft()
+            yield from _pdf_page_documents(path, first_page, future.result(), total_pages)
+        while pending:
+            first_page, future = pending.popleft()
+            yield from _pdf_page_documents(path, first_page, future.result(), total_pages)
+
+def _pdf_page_documents(path: str, first_page: int, texts: List[str], total_pages: int) -> Iterator["Document"]:
+    from langchain_core.documents import Document
+
+    for offset, text in enumerate(texts):
+        page = first_page + offset
+        yield Document(
+            page_content=text,
+            metadata={"source": path, "page": page, "page_label": str(page + 1), "total_pages": total_pages}
         )
-        splits = text_splitter.split_documents(documents)
 
-        # Create embeddings
-        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-        vector_store = FAISS.from_documents(splits, embeddings)
+def iter_chunks(path: str, file_extension: str, page_text: Optional[List[str]] = None) -> Iterator["Document"]:
+    """Load a file page by page and yield its split chunks incrementally
+
+    When page_text is given, each page's text is appended to it as it is read.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        chunk_overlap=DEFAULT_CHUNK_OVERLAP
+    )
+    if file_extension == 'pdf':
+        pages = lazy_load_pdf(path)
+    else:
+        pages = _create_loader(path, file_extension).lazy_load()
+
+    split_seconds = 0.0
+    for page in timed_iter("document.load", pages, file_type=file_extension):
+        if page_text is not None:
+            page_text.append(page.page_content)
+        start = time.perf_counter()
+        chunks = text_splitter.split_documents([page])
+        split_seconds += time.perf_counter() - start
+        yield from chunks
+    record_duration("document.split", split_seconds, file_type=file_extension)
+
+def index_chunks(chunks: Iterable["Document"], embeddings: Any,
+                 vector_store: Optional["FAISS"] = None, batch_size: int = INGEST_BATCH_SIZE) -> Optional["FAISS"]:
+    """Embed chunks in fixed-size batches and append each batch to the index
 
-        return vector_store, doc_content
+    Only one batch of chunks and vectors is held in memory at a time. Returns
+    the (possibly newly created) vector store, or None if there were no chunks.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    batch: List["Document"] = []
+
+    def flush(store: Optional["FAISS"]) -> Optional["FAISS"]:
+        texts = [doc.page_content for doc in batch]
+        metadatas = [doc.metadata for doc in batch]
+        with span("document.embed", chunks=len(texts)):
+            vectors = embeddings.embed_documents(texts)
+        with span("document.index", chunks=len(texts)):
+            if store is None:
+                store = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=metadatas)
+            else:
+                store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+        batch.clear()
+        return store
+
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            vector_store = flush(vector_store)
+    if batch:
+        vector_store = flush(vector_store)
+    return vector_store
+
+def build_vector_store(file_bytes: bytes, file_name: str, embeddings: Any) -> Tuple["FAISS", str]:
+    """Stream a document through loading, splitting, embedding and indexing
+
+    Raises on failure; the temp copy of the upload is always removed.
+    """
+    from ann_index import optimize_vector_store
+    from hybrid_retriever import BM25Index, register_bm25_index
+
+    file_extension = file_name.split('.')[-1].lower()
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}") as temp_file:
+        temp_file.write(file_bytes)
+        temp_path = temp_file.name  # Get the file path
+
+    try:
+        with span("document.ingest", file_type=file_extension, bytes=len(file_bytes)) as attributes:
+            page_text: List[str] = []
+            vector_store = index_chunks(iter_chunks(temp_path, file_extension, page_text), embeddings)
+            if vector_store is None:
+                raise ValueError("No text could be extracted from the document")
+            with span("document.optimize_index"):
+                vector_store = optimize_vector_store(vector_store)
+            with span("document.keyword_index"):
+                register_bm25_index(vector_store, BM25Index.from_vector_store(vector_store))
+            attributes["chunks"] = vector_store.index.ntotal
+            return vector_store, " ".join(page_text)
+    finally:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            logger.warning(f"Could not remove temp file {temp_path}")
+
+def ingest_document(file_bytes: bytes, file_name: str, embeddings: Optional[Any] = None,
+                    index_store: Optional[IndexStore] = None) -> Tuple["FAISS", str]:
+    """Return the vector store and text for a document, reusing a persisted index when possible
+
+    Raises on failure; usable outside Streamlit.
+    """
+    # Reuse a persisted index when this exact document was processed before
+    index_store = index_store or IndexStore()
+    key = index_key(file_bytes, file_name)
+    embeddings = embeddings or get_embeddings()
+    cached = index_store.load(key, embeddings)
+    if cached is not None:
+        logger.info(f"Loaded cached index for {file_name}")
+        return cached
+
+    vector_store, doc_content = build_vector_store(file_bytes, file_name, embeddings)
+    index_store.save(key, vector_store, doc_content)
+    return vector_store, doc_content
+
+@st.cache_data(show_spinner="Processing document...")
+def process_document(_file: bytes, file_name: str) -> Tuple[Optional["FAISS"], str]:
+    """Process uploaded document and create vector store"""
+    try:
+        return ingest_document(_file, file_name)
 
     except Exception as e:
         logger.error(f"Document processing failed: {str(e)}")
@@ -0,0 +1,66 @@
+# embedding_service.py
+import logging
+import threading
+from typing import Any, Dict, Optional
+from config import EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE, EMBEDDING_DEVICE
+
+logger = logging.getLogger(__name__)
+
+# sentence-transformers backend options for each EMBEDDING_BACKEND value
+BACKEND_MODEL_KWARGS = {
+    "torch": {},
+    "onnx": {"backend": "onnx"},
+    # all-MiniLM-L6-v2 ships int8-quantized ONNX exports for CPU inference
+    "onnx-int8": {"backend": "onnx", "model_kwargs": {"file_name": "onnx/model_qint8_avx2.onnx"}},
+}
+
+_lock = threading.Lock()
+_embeddings: Optional[Any] = None
+
+def _build_embeddings(backend: str, batch_size: int) -> Any:
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if backend not in BACKEND_MODEL_KWARGS:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+
+    model_kwargs: Dict[str, Any] = {"device": EMBEDDING_DEVICE, **BACKEND_MODEL_KWARGS[backend]}
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": batch_size}
+    )
+
+def get_embeddings() -> Any:
+    """Return the process-wide embedding model, loading it on first use
+
+    Falls back to the plain torch backend when the configured ONNX backend
+    cannot be loaded (e.g. optimum/onnxruntime are not installed).
+    """
+    global _embeddings
+    if _embeddings is not None:
+        return _embeddings
+
+    with _lock:
+        if _embeddings is None:
+            try:
+                _embeddings = _build_embeddings(EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE)
+            except Exception as e:
+                if EMBEDDING_BACKEND == "torch":
+                    raise
+                logger.warning(f"Embedding backend {EMBEDDING_BACKEND} unavailable, using torch: {str(e)}")
+                _embeddings = _build_embeddings("torch", EMBEDDING_BATCH_SIZE)
+            logger.info(f"Loaded embedding model {EMBEDDING_MODEL}")
+    return _embeddings
+
+def warmup_embeddings() -> None:
+    """Load the model and run one encode so the first real request is fast"""
+    try:
+        get_embeddings().embed_query("warmup")
+    except Exception as e:
+        logger.error(f"Embedding warmup failed: {str(e)}")
+
+def start_background_warmup() -> threading.Thread:
+    """Warm the embedding model in a daemon thread"""
+    thread = threading.Thread(target=warmup_embeddings, name="embedding-warmup", daemon=True)
+    thread.start()
+    return thread
@@ -1,35 +1,88 @@
 # file_utils.py
-from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+import os
+import shutil
 from io import BytesIO
+from typing import List
+from telemetry import span
 
 def convert_to_docx(content: str) -> bytes:
     """Convert markdown content to DOCX format"""
-    document = Document()
-    content = content.strip()
+    from docx import Document
+    from docx.shared import Pt
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    with span("docx.convert", chars=len(content)):
+        document = Document()
+        content = content.strip()
     
-    # Split content into paragraphs
-    paragraphs = content.split('\n\n')
+        # Split content into paragraphs
+        paragraphs = content.split('\n\n')
     
-    for paragraph in paragraphs:
-        if paragraph.startswith('# '):
-            # Heading
-            heading = document.add_heading(paragraph[2:], level=1)
-            heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        elif paragraph.startswith('## '):
-            # Subheading
-            heading = document.add_heading(paragraph[3:], level=2)
-            heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        elif paragraph.startswith('- '):
-            # Bullet point
-            document.add_paragraph().add_run(paragraph).font.size = Pt(10)
-        else:
-            # Regular paragraph
-            document.add_paragraph(paragraph)
+        for paragraph in paragraphs:
+            if paragraph.startswith('# '):
+                # Heading
+                heading = document.add_heading(paragraph[2:], level=1)
+                heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
+            elif paragraph.startswith('## '):
+                # Subheading
+                heading = document.add_heading(paragraph[3:], level=2)
+                heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
+            elif paragraph.startswith('- '):
+                # Bullet point
+                document.add_paragraph().add_run(paragraph).font.size = Pt(10)
+            else:
+                # Regular paragraph
+                document.add_paragraph(paragraph)
             
-    # Save to bytes
-    file_bytes = BytesIO()
-    document.save(file_bytes)
-    file_bytes.seek(0)
-    return file_bytes.read()
\ No newline at end of file
+        # Save to bytes
+        file_bytes = BytesIO()
+        document.save(file_bytes)
+        file_bytes.seek(0)
+        return file_bytes.read()
+
+def path_size(path: str) -> int:
+    """Return the size in bytes of a file or directory tree"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def prune_cache_dir(cache_dir: str, max_bytes: int) -> List[str]:
+    """Evict least recently used entries until the cache fits in max_bytes
+
+    Each direct child of cache_dir is one cache entry; its mtime is the last use.
+    Returns the names of the evicted entries.
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            entries.append((os.path.getmtime(path), path_size(path), path))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _ in entries)
+    evicted = []
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+        total -= size
+        evicted.append(os.path.basename(path))
+    return evicted
@@ -0,0 +1,241 @@
+# http_client.py
+import time
+import hashlib
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from config import (
+    HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS, LLM_REQUEST_TIMEOUT_SECONDS,
+    HTTP_POOL_SIZE, HTTP_MAX_RETRIES,
+    MODEL_LIST_TTL_SECONDS, MODEL_LIST_ERROR_TTL_SECONDS, MODEL_LIST_MAX_STALE_SECONDS,
+)
+from telemetry import span
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class TimeoutSession(requests.Session):
+    """requests.Session that applies a default timeout to every request"""
+
+    def __init__(self, timeout: Tuple[float, float]):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+def create_session(pool_size: int = HTTP_POOL_SIZE, max_retries: int = HTTP_MAX_RETRIES,
+                   timeout: Tuple[float, float] = (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS)
+                   ) -> TimeoutSession:
+    """Session with keep-alive pooling, a default timeout and backoff on idempotent requests"""
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = TimeoutSession(timeout)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+_session: Optional[TimeoutSession] = None
+_transport: Optional["httpx.HTTPTransport"] = None
+_httpx_client: Optional["httpx.Client"] = None
+_client_lock = threading.Lock()
+
+def get_session() -> TimeoutSession:
+    """Process-wide session for provider metadata calls"""
+    global _session
+    with _client_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+def get_httpx_transport() -> "httpx.HTTPTransport":
+    """Process-wide httpx connection pool, shared by every synchronous LLM client"""
+    global _transport
+    import httpx
+
+    with _client_lock:
+        if _transport is None:
+            _transport = httpx.HTTPTransport(
+                limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+                retries=HTTP_MAX_RETRIES,  # connection failures only; the SDKs retry 429/5xx themselves
+            )
+        return _transport
+
+def get_httpx_client() -> "httpx.Client":
+    """Process-wide httpx client on the shared pool, for SDKs that accept a client instance"""
+    global _httpx_client
+    import httpx
+
+    transport = get_httpx_transport()
+    with _client_lock:
+        if _httpx_client is None:
+            _httpx_client = httpx.Client(
+                transport=transport,
+                timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            )
+        return _httpx_client
+
+def llm_client_kwargs(provider: str) -> Dict[str, Any]:
+    """Constructor arguments that put a LangChain chat model on the shared connection pool
+
+    Only the synchronous clients are shared: async calls run under a fresh event
+    loop per asyncio.run(), and an httpx.AsyncClient cannot outlive its loop, so
+    they only get the timeout.
+    """
+    if provider == "Groq":
+        return {"http_client": get_httpx_client(), "request_timeout": LLM_REQUEST_TIMEOUT_SECONDS}
+    if provider == "Ollama":
+        return {
+            "client_kwargs": {"timeout": LLM_REQUEST_TIMEOUT_SECONDS},
+            "sync_client_kwargs": {"transport": get_httpx_transport()},
+        }
+    return {}
+
+# Model lists
+
+class ModelListError(Exception):
+    """Raised when a provider's model list cannot be fetched (possibly a cached failure)"""
+
+def fetch_model_list(provider: str, endpoint: str, api_key: Optional[str] = None,
+                     session: Optional[requests.Session] = None) -> List[str]:
+    """Fetch the model IDs a provider endpoint serves; raises on HTTP or network errors"""
+    session = session or get_session()
+    base = (endpoint or "").rstrip("/")
+    with span("fetch_models", provider=provider):
+        if provider in ("Groq", "OpenAI"):
+            response = session.get(f"{base}/models", headers={"Authorization": f"Bearer {api_key}"})
+            response.raise_for_status()
+            return [model["id"] for model in response.json()["data"]]
+        if provider == "Ollama":
+            response = session.get(f"{base}/api/tags")  # Ollama endpoint to list models
+            response.raise_for_status()
+            return [model["name"] for model in response.json()["models"]]
+    raise ModelListError(f"Unsupported provider: {provider}")
+
+class ModelListCache:
+    """TTL cache of provider model lists
+
+    Lists younger than ttl_seconds are served directly. Older ones are still
+    served for up to max_stale_seconds while a background thread refreshes
+    them; if that refresh fails the stale list keeps being served and the
+    refresh is retried after error_ttl_seconds. A failed fetch with nothing to
+    fall back on is cached for error_ttl_seconds too, so a down or misconfigured
+    endpoint is not hit on every rerun.
+    """
+
+    def __init__(self, ttl_seconds: float = MODEL_LIST_TTL_SECONDS,
+                 error_ttl_seconds: float = MODEL_LIST_ERROR_TTL_SECONDS,
+                 max_stale_seconds: float = MODEL_LIST_MAX_STALE_SECONDS,
+                 fetcher: Callable[..., List[str]] = fetch_model_list):
+        self.ttl_seconds = ttl_seconds
+        self.error_ttl_seconds = error_ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self._fetcher = fetcher
+        self._entries: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._key_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(provider: str, endpoint: str, api_key: Optional[str]) -> Tuple[str, str, str]:
+        # Keys are hashed so the cache never holds them in plain text
+        digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+        return provider, (endpoint or "").rstrip("/"), digest
+
+    def get(self, provider: str, endpoint: str, api_key: Optional[str] = None) -> List[str]:
+        """Return the model list, fetching it only when there is nothing usable cached"""
+        key = self._key(provider, endpoint, api_key)
+        entry = self._usable(key, provider, endpoint, api_key)
+        if entry is None:
+            with self._lock:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+            with key_lock:
+                # Another caller may have fetched it while this one waited
+                entry = self._usable(key, provider, endpoint, api_key) or self._refresh(key, provider, endpoint, api_key)
+        if entry["error"] is not None:
+            raise ModelListError(entry["error"])
+        return list(entry["models"])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _usable(self, key: Tuple[str, str, str], provider: str, endpoint: str,
+                api_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if now < entry["fresh_until"]:
+                return entry
+            if entry["models"] is None or now >= entry["stale_until"]:
+                return None
+            if key not in self._refreshing:
+                self._refreshing.add(key)
+                threading.Thread(
+                    target=self._background_refresh, args=(key, provider, endpoint, api_key),
+                    name="model-list-refresh", daemon=True
+                ).start()
+            return entry
+
+    def _background_refresh(self, key: Tuple[str, str, str], provider: str, endpoint: str,
+                            api_key: Optional[str]) -> None:
+        try:
+            self._refresh(key, provider, endpoint, api_key)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh(self, key: Tuple[str, str, str], provider: str, endpoint: str,
+                 api_key: Optional[str]) -> Dict[str, Any]:
+        try:
+            models = self._fetcher(provider, endpoint, api_key)
+        except Exception as e:
+            now = time.monotonic()
+            with self._lock:
+                previous = self._entries.get(key)
+                if previous is not None and previous["models"] is not None and now < previous["stale_until"]:
+                    logger.warning(f"Refreshing {provider} models failed, serving the cached list: {str(e)}")
+                    entry = {**previous, "fresh_until": now + self.error_ttl_seconds}
+                else:
+                    logger.error(f"Fetching {provider} models failed: {str(e)}")
+                    entry = {
+                        "models": None, "error": str(e),
+                        "fresh_until": now + self.error_ttl_seconds, "stale_until": now + self.error_ttl_seconds,
+                    }
+                self._entries[key] = entry
+            return entry
+
+        now = time.monotonic()
+        entry = {
+            "models": models, "error": None,
+            "fresh_until": now + self.ttl_seconds, "stale_until": now + self.ttl_seconds + self.max_stale_seconds,
+        }
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+_model_list_cache: Optional[ModelListCache] = None
+
+def get_model_list_cache() -> ModelListCache:
+    global _model_list_cache
+    with _client_lock:
+        if _model_list_cache is None:
+            _model_list_cache = ModelListCache()
+        return _model_list_cache
@@ -0,0 +1,157 @@
+# hybrid_retriever.py
+import re
+import math
+import weakref
+import logging
+import threading
+from collections import Counter
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+from config import RetrievalConfig
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+# Keeps SKUs, prices and model numbers ("sku-104", "1,299.00", "x5/pro") as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./,][a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """Inverted index scoring documents with Okapi BM25"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        # Distinct terms of each document, so remove only touches its own postings
+        self.doc_terms: Dict[str, Set[str]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        terms = tokenize(text)
+        counts = Counter(terms)
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        self.doc_lengths[doc_id] = len(terms)
+        self.doc_terms[doc_id] = set(counts)
+        self.total_length += len(terms)
+
+    def remove(self, doc_id: str) -> None:
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in self.doc_terms.pop(doc_id):
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+
+    def copy(self) -> "BM25Index":
+        index = BM25Index(self.k1, self.b)
+        index.postings = {term: dict(docs) for term, docs in self.postings.items()}
+        index.doc_lengths = dict(self.doc_lengths)
+        index.doc_terms = dict(self.doc_terms)
+        index.total_length = self.total_length
+        return index
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Return up to k (doc_id, score) pairs for the query, best first"""
+        if not self.doc_lengths:
+            return []
+        num_docs = len(self.doc_lengths)
+        avg_length = self.total_length / num_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    @classmethod
+    def from_vector_store(cls, vector_store: "FAISS") -> "BM25Index":
+        index = cls()
+        for doc_id in vector_store.index_to_docstore_id.values():
+            doc = vector_store.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                index.add(doc_id, doc.page_content)
+        return index
+
+# BM25 indexes built alongside each live vector store, with the store size they cover
+_bm25_indexes: "weakref.WeakKeyDictionary[FAISS, Tuple[BM25Index, int]]" = weakref.WeakKeyDictionary()
+_bm25_lock = threading.Lock()
+
+def register_bm25_index(vector_store: "FAISS", index: BM25Index) -> None:
+    """Associate a BM25 index built at ingestion with its vector store"""
+    with _bm25_lock:
+        _bm25_indexes[vector_store] = (index, len(vector_store.index_to_docstore_id))
+
+def get_bm25_index(vector_store: "FAISS") -> BM25Index:
+    """Return the BM25 index for a vector store, rebuilding it if missing or stale"""
+    with _bm25_lock:
+        entry = _bm25_indexes.get(vector_store)
+        if entry is not None and entry[1] == len(vector_store.index_to_docstore_id):
+            return entry[0]
+        index = BM25Index.from_vector_store(vector_store)
+        _bm25_indexes[vector_store] = (index, len(vector_store.index_to_docstore_id))
+        return index
+
+def keyword_search(vector_store: "FAISS", query: str, k: int = 3) -> List[Tuple[Document, float]]:
+    """Pure BM25 lookup over a vector store's chunks, e.g. for SKUs or exact names"""
+    results = []
+    for doc_id, score in get_bm25_index(vector_store).search(query, k):
+        doc = vector_store.docstore.search(doc_id)
+        if isinstance(doc, Document):
+            results.append((doc, score))
+    return results
+
+class HybridRetriever(BaseRetriever):
+    """Fuses dense FAISS results and BM25 keyword results with weighted reciprocal rank fusion"""
+
+    vector_store: Any
+    k: int = RetrievalConfig.DEFAULT_PARAMS["k"]
+    fetch_k: int = RetrievalConfig.DEFAULT_PARAMS["fetch_k"]
+    dense_weight: float = RetrievalConfig.DEFAULT_PARAMS["dense_weight"]
+    keyword_weight: float = RetrievalConfig.DEFAULT_PARAMS["keyword_weight"]
+    rrf_k: int = RetrievalConfig.DEFAULT_PARAMS["rrf_k"]
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        scores: Dict[str, float] = {}
+        docs: Dict[str, Document] = {}
+
+        if self.dense_weight > 0:
+            for rank, doc in enumerate(self.vector_store.similarity_search(query, k=self.fetch_k)):
+                key = doc.id or doc.page_content
+                docs.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + self.dense_weight / (self.rrf_k + rank + 1)
+
+        if self.keyword_weight > 0:
+            for rank, (doc, _) in enumerate(keyword_search(self.vector_store, query, self.fetch_k)):
+                key = doc.id or doc.page_content
+                docs.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + self.keyword_weight / (self.rrf_k + rank + 1)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)[:self.k]
+        return [docs[key] for key in ranked]
+
+def build_hybrid_retriever(vector_store: "FAISS", params: Optional[Dict[str, Any]] = None) -> HybridRetriever:
+    """Create a hybrid retriever from RetrievalConfig.DEFAULT_PARAMS, overridable via params"""
+    params = {**RetrievalConfig.DEFAULT_PARAMS, **(params or {})}
+    return HybridRetriever(vector_store=vector_store, **params)
@@ -0,0 +1,84 @@
+# index_store.py
+import os
+import time
+import shutil
+import hashlib
+import logging
+from typing import TYPE_CHECKING, Any, Optional, Tuple
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_BACKEND, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP,
+    INDEX_CACHE_DIR, INDEX_CACHE_MAX_MB
+)
+from file_utils import prune_cache_dir
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+CONTENT_FILE = "content.txt"
+
+def index_key(file_bytes: bytes, file_name: str) -> str:
+    """Build the cache key for a document and the current index settings"""
+    digest = hashlib.sha256()
+    digest.update(file_bytes)
+    file_extension = file_name.split('.')[-1].lower()
+    settings = f"{file_extension}|{EMBEDDING_MODEL}|{EMBEDDING_BACKEND}|{DEFAULT_CHUNK_SIZE}|{DEFAULT_CHUNK_OVERLAP}"
+    digest.update(settings.encode("utf-8"))
+    return digest.hexdigest()
+
+class IndexStore:
+    """Persistent on-disk store of FAISS indexes with size-based LRU eviction"""
+
+    def __init__(self, cache_dir: str = INDEX_CACHE_DIR, max_size_mb: int = INDEX_CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_size_mb * 1024 * 1024
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key: str, embeddings: Any) -> Optional[Tuple["FAISS", str]]:
+        """Return the cached (vector_store, doc_content) for key, or None on a miss"""
+        path = self._path(key)
+        if not os.path.isdir(path):
+            return None
+
+        from langchain_community.vectorstores import FAISS
+
+        try:
+            vector_store = FAISS.load_local(
+                path, embeddings, allow_dangerous_deserialization=True
+            )
+            with open(os.path.join(path, CONTENT_FILE), encoding="utf-8") as f:
+                doc_content = f.read()
+        except Exception as e:
+            logger.warning(f"Discarding unreadable index cache entry {key}: {str(e)}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+
+        # Touch the entry so eviction treats it as recently used
+        now = time.time()
+        os.utime(path, (now, now))
+        return vector_store, doc_content
+
+    def save(self, key: str, vector_store: "FAISS", doc_content: str) -> None:
+        """Persist an index under key and evict old entries past the size limit"""
+        path = self._path(key)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            vector_store.save_local(tmp_path)
+            with open(os.path.join(tmp_path, CONTENT_FILE), "w", encoding="utf-8") as f:
+                f.write(doc_content)
+
+            # Write to a temp dir first so readers never see a partial entry
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to cache index {key}: {str(e)}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+
+        evicted = prune_cache_dir(self.cache_dir, self.max_bytes)
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} cached indexes")
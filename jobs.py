@@ -0,0 +1,167 @@
+# jobs.py
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from config import JOB_WORKERS, JOB_HISTORY_SIZE
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED}
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its job has been cancelled"""
+
+class Job:
+    """State of one background job, updated by the worker and read by the UI"""
+
+    def __init__(self, name: str, key: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.key = key
+        self.status = PENDING
+        self.progress = 0.0
+        self.message = ""
+        self.output: Any = None  # partial result published while running
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel_event = threading.Event()
+        self._future: Optional[Future] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def report(self, progress: Optional[float] = None, message: Optional[str] = None,
+               output: Any = None) -> None:
+        """Publish progress (0-1), a status message and/or a partial result"""
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+        if output is not None:
+            self.output = output
+
+    def check_cancelled(self) -> None:
+        """Raise JobCancelled if cancellation was requested; call between units of work"""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "name": self.name, "key": self.key, "status": self.status,
+            "progress": self.progress, "message": self.message, "error": self.error,
+            "created_at": self.created_at, "started_at": self.started_at, "finished_at": self.finished_at,
+        }
+
+def job_key(*parts: Any) -> str:
+    """Hash the inputs that identify a unit of work, for deduplicating identical submissions"""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class JobManager:
+    """Runs jobs on a worker pool outside the Streamlit rerun cycle
+
+    Job functions are called as fn(job, *args, **kwargs) and may call
+    job.report() and job.check_cancelled(). Submitting a job whose key matches a
+    pending or running job returns the existing job's ID instead of queueing
+    the work twice. Finished jobs are kept (up to history_size) so their
+    results can be collected by ID.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, history_size: int = JOB_HISTORY_SIZE):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active_keys: Dict[str, str] = {}
+        self._history_size = history_size
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., Any], *args: Any, name: str = "", key: Optional[str] = None,
+               **kwargs: Any) -> str:
+        """Queue fn and return the job ID (an existing one when key matches active work)"""
+        with self._lock:
+            if key is not None and key in self._active_keys:
+                return self._active_keys[key]
+            job = Job(name or getattr(fn, "__name__", "job"), key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active_keys[key] = job.id
+            job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+            return job.id
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [job.snapshot() for job in self._jobs.values()]
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation; queued jobs never start, running ones stop at their next check"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job._cancel_event.set()
+            if job._future is not None and job._future.cancel():
+                self._finish(job, CANCELLED)
+        return True
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            for job in self._jobs.values():
+                job._cancel_event.set()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> None:
+        if job.cancel_requested:
+            with self._lock:
+                self._finish(job, CANCELLED)
+            return
+
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            result = fn(job, *args, **kwargs)
+            job.check_cancelled()
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            logger.error(f"Job {job.name} ({job.id}) failed: {str(e)}")
+            job.error = str(e)
+            status = FAILED
+        else:
+            job.result = result
+            job.progress = 1.0
+            status = SUCCEEDED
+        with self._lock:
+            self._finish(job, status)
+
+    def _finish(self, job: Job, status: str) -> None:
+        # Caller holds self._lock
+        job.status = status
+        job.finished_at = time.time()
+        if job.key is not None and self._active_keys.get(job.key) == job.id:
+            del self._active_keys[job.key]
+
+        finished = [job_id for job_id, item in self._jobs.items() if item.finished]
+        for job_id in finished[:max(0, len(finished) - self._history_size)]:
+            del self._jobs[job_id]
@@ -0,0 +1,173 @@
+# llm_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config import LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+def llm_settings(llm: Any) -> Dict[str, Any]:
+    """Return the provider, model and sampling settings that affect an LLM's output"""
+    from llm_handler import describe_llm, unwrap_llm
+
+    provider, model = describe_llm(llm)
+    llm = unwrap_llm(llm)
+    max_tokens = getattr(llm, "max_tokens", None)
+    if max_tokens is None:
+        max_tokens = getattr(llm, "num_predict", None)
+    return {
+        "provider": provider,
+        "model": model,
+        "temperature": getattr(llm, "temperature", None),
+        "max_tokens": max_tokens,
+    }
+
+class LLMResponseCache:
+    """SQLite-backed cache of LLM responses with TTL expiry and LRU eviction"""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+
+    def key(self, prompt: str, llm: Any) -> str:
+        """Hash the prompt together with the provider, model, temperature and max_tokens"""
+        settings = llm_settings(llm)
+        raw = "\x1f".join([
+            prompt, str(settings["provider"]), str(settings["model"]),
+            str(settings["temperature"]), str(settings["max_tokens"])
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None when missing or expired"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str, llm: Any) -> None:
+        """Store a response and evict the least recently used entries past max_entries"""
+        settings = llm_settings(llm)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, settings["provider"], settings["model"], response, now, now)
+            )
+            self._conn.execute(
+                """DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,)
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Return the process-wide response cache, or None when caching is disabled"""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = LLMResponseCache()
+                except Exception as e:
+                    logger.error(f"LLM response cache unavailable: {str(e)}")
+                    return None
+    return _cache
+
+def _usable(response: Optional[str], validate: Optional[Callable[[str], Any]]) -> bool:
+    if response is None:
+        return False
+    if validate is None:
+        return True
+    try:
+        validate(response)
+        return True
+    except Exception:
+        return False  # stored before validation existed; fetch a fresh answer
+
+def cached_call(llm: Any, prompt_text: str, call: Callable[[], str], use_cache: bool,
+                validate: Optional[Callable[[str], Any]] = None) -> str:
+    """Return the cached response for prompt_text, or run call and cache its result
+
+    With validate, only responses it accepts (returns without raising) are
+    cached; a rejected response is still returned, so the caller's own parsing
+    raises as before.
+    """
+    cache = get_llm_cache() if use_cache else None
+    if cache is None:
+        return call()
+
+    key = cache.key(prompt_text, llm)
+    cached = cache.get(key)
+    if _usable(cached, validate):
+        return cached
+    response = call()
+    if _usable(response, validate):
+        cache.put(key, response, llm)
+    return response
+
+async def acached_call(llm: Any, prompt_text: str, call: Callable[[], Awaitable[str]], use_cache: bool,
+                       validate: Optional[Callable[[str], Any]] = None) -> str:
+    """Async variant of cached_call"""
+    cache = get_llm_cache() if use_cache else None
+    if cache is None:
+        return await call()
+
+    key = cache.key(prompt_text, llm)
+    cached = cache.get(key)
+    if _usable(cached, validate):
+        return cached
+    response = await call()
+    if _usable(response, validate):
+        cache.put(key, response, llm)
+    return response
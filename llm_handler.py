@@ -1,89 +1,365 @@
 # llm_handler.py
 import streamlit as st
+import asyncio
 import logging
-from langchain_groq import ChatGroq
-from langchain_ollama import ChatOllama
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
-from config import get_api_key
-from typing import Dict, Any, Optional, Tuple, Union
-from langchain_community.vectorstores import FAISS
+import json
+import re
+import itertools
+from config import (
+    get_api_key, ContextConfig, DEFAULT_ENDPOINTS, RATE_LIMIT_ENABLED, INSIGHT_MAX_CONCURRENCY, INSIGHT_TIMEOUT_SECONDS
+)
+from typing import TYPE_CHECKING, Callable, Dict, Any, List, Optional, Tuple, Union
+from llm_cache import cached_call, acached_call
+from telemetry import span, llm_run_config
+from http_client import llm_client_kwargs
+from prompt_registry import registry
+
+if TYPE_CHECKING:
+    # Provider clients and FAISS are imported on first use to keep startup fast
+    from langchain_groq import ChatGroq
+    from langchain_ollama import ChatOllama
+    from langchain_community.vectorstores import FAISS
+    from provider_router import ProviderRouter
+    from rate_limiter import RateLimitedModel
 
 logger = logging.getLogger(__name__)
 
+FIELD_PROMPTS = {
+    "brand_description": "Based on the provided context, write a concise brand description. Extract information about the company's mission, values, and unique selling points.",
+    "target_audience": "Based on the provided context, identify and describe the target audience or customer segments for this business. Include demographics, psychographics, and key characteristics.",
+    "products_services": "Based on the provided context, list and briefly describe the main products and/or services offered by the business.",
+    "marketing_goals": "Based on the provided context, identify the key marketing goals or objectives for this business. If not explicitly stated, suggest reasonable goals based on the business type and information provided.",
+    "existing_content": "Based on the provided context, summarize any existing marketing content, campaigns, or channels mentioned in the document.",
+    "keywords": "Based on the provided context, generate a list of 10-15 relevant keywords for this business that could be used for marketing purposes. Format as a comma-separated list.",
+    "suggested_topics": "Based on the provided context, suggest 5-7 content topics that would be relevant for this business's marketing strategy. Present as a numbered list."
+}
+
+
+def create_llm(config: Dict[str, Any]) -> Union["ChatGroq", "ChatOllama", "ProviderRouter"]:
+    """Create the language model described by a sidebar-style config dict
+
+    When config lists "fallbacks" (dicts with provider and model, optionally
+    api_key and api_endpoint), the result is a ProviderRouter over the selected
+    model and the fallbacks; "hedge" turns on hedged requests. Raises ValueError
+    when a required setting is missing; usable outside Streamlit.
+    """
+    fallbacks = config.get("fallbacks") or []
+    if not fallbacks:
+        return _create_provider_llm(config)
+    from provider_router import ProviderRouter
+
+    models = [_create_provider_llm(config, routed=True)]
+    for fallback in fallbacks:
+        settings = {**config, **fallback}
+        if fallback["provider"] != config["provider"]:
+            settings["api_key"] = fallback.get("api_key") or get_api_key(fallback["provider"])
+            settings["api_endpoint"] = fallback.get("api_endpoint") or DEFAULT_ENDPOINTS[fallback["provider"]]
+        models.append(_create_provider_llm(settings, routed=True))
+    params = {"hedge": config["hedge"]} if "hedge" in config else {}
+    return ProviderRouter.from_models(models, **params)
+
+def parse_fallbacks(spec: str) -> List[Dict[str, Any]]:
+    """Parse "provider:model[@endpoint], ..." into fallback settings for create_llm"""
+    fallbacks = []
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        target, _, endpoint = item.partition("@")
+        provider, _, model = target.partition(":")
+        if provider.strip() not in DEFAULT_ENDPOINTS or not model:
+            raise ValueError(f"Invalid fallback '{item}', expected provider:model[@endpoint] "
+                             f"with provider one of {', '.join(DEFAULT_ENDPOINTS)}")
+        fallback = {"provider": provider.strip(), "model": model.strip()}
+        if endpoint:
+            fallback["api_endpoint"] = endpoint.strip()
+        fallbacks.append(fallback)
+    return fallbacks
+
+def _create_provider_llm(config: Dict[str, Any], routed: bool = False
+                         ) -> Union["ChatGroq", "ChatOllama", "RateLimitedModel"]:
+    llm = _create_client(config)
+    if not RATE_LIMIT_ENABLED:
+        return llm
+    from rate_limiter import RateLimitedModel
+
+    # Behind a router, transient errors fail over rather than being retried in place
+    return RateLimitedModel.wrap(llm, retry_transient=not routed)
+
+def _create_client(config: Dict[str, Any]) -> Union["ChatGroq", "ChatOllama"]:
+    if config["provider"] == "Groq":
+        if not config["api_key"]:
+            raise ValueError("Groq API key is required")
+        from langchain_groq import ChatGroq
+
+        return ChatGroq(
+            api_key=config["api_key"],
+            model_name=config["model"],
+            temperature=config["temperature"],
+            max_tokens=config["max_tokens"],
+            max_retries=0 if RATE_LIMIT_ENABLED else 2,  # the rate limiter retries, and must see 429s
+            **llm_client_kwargs("Groq")
+        )
+    else:
+        from langchain_ollama import ChatOllama
+
+        return ChatOllama(
+            model=config["model"],
+            base_url=config["api_endpoint"],
+            temperature=config["temperature"],
+            num_predict=config["max_tokens"],
+            **llm_client_kwargs("Ollama")
+        )
+
 @st.cache_resource(show_spinner=False)
-def initialize_llm(config: Dict[str, Any]) -> Optional[Union[ChatGroq, ChatOllama]]:
+def initialize_llm(config: Dict[str, Any]) -> Optional[Union["ChatGroq", "ChatOllama", "ProviderRouter"]]:
     """Initialize the language model with caching"""
+    if config["provider"] == "Groq" and not config["api_key"]:
+        st.error("Groq API key is required")
+        st.info("[Get Groq API Key](https://console.groq.com/keys)")
+        return None
+
     try:
-        if config["provider"] == "Groq":
-            if not config["api_key"]:
-                st.error("Groq API key is required")
-                st.info("[Get Groq API Key](https://console.groq.com/keys)")
-                return None
-
-            return ChatGroq(
-                api_key=config["api_key"],
-                model_name=config["model"],
-                temperature=config["temperature"],
-                max_tokens=config["max_tokens"]
-            )
-        else:
-            return ChatOllama(
-                model=config["model"],
-                base_url=config["api_endpoint"],
-                temperature=config["temperature"],
-                num_predict=config["max_tokens"]
-            )
+        return create_llm(config)
     except Exception as e:
         logger.error(f"LLM initialization error: {str(e)}")
         st.error(f"Failed to initialize model: {str(e)}")
         return None
 
-def generate_insights(llm: Any, vector_store: FAISS, field_name: str) -> str:
-    """Generate all marketing insights using RAG"""
-    retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-    
-    # Create prompts for different fields
-    field_prompts = {
-        "brand_description": "Based on the provided context, write a concise brand description. Extract information about the company's mission, values, and unique selling points.",
-        "target_audience": "Based on the provided context, identify and describe the target audience or customer segments for this business. Include demographics, psychographics, and key characteristics.",
-        "products_services": "Based on the provided context, list and briefly describe the main products and/or services offered by the business.",
-        "marketing_goals": "Based on the provided context, identify the key marketing goals or objectives for this business. If not explicitly stated, suggest reasonable goals based on the business type and information provided.",
-        "existing_content": "Based on the provided context, summarize any existing marketing content, campaigns, or channels mentioned in the document.",
-        "keywords": "Based on the provided context, generate a list of 10-15 relevant keywords for this business that could be used for marketing purposes. Format as a comma-separated list.",
-        "suggested_topics": "Based on the provided context, suggest 5-7 content topics that would be relevant for this business's marketing strategy. Present as a numbered list."
-    }
-
-    prompt_template = """
-    You are a marketing specialist tasked with analyzing business documents.
-        
-        {input}
-        
-        Context:
-        {context}
-        
-        Provide a clear, concise response focusing only on the information requested.
-    """
-    
-    document_chain = create_stuff_documents_chain(
-        llm,
-        ChatPromptTemplate.from_template(prompt_template),
-        document_variable_name="context"
+def unwrap_llm(llm: Any) -> Any:
+    """Return the provider client inside a wrapper such as RateLimitedModel"""
+    while hasattr(llm, "wrapped"):
+        llm = llm.wrapped
+    return llm
+
+def describe_llm(llm: Any) -> Tuple[str, str]:
+    """Return the (provider, model) pair identifying an LLM client"""
+    llm = unwrap_llm(llm)
+    provider = {"ChatGroq": "Groq", "ChatOllama": "Ollama", "ChatOpenAI": "OpenAI", "ProviderRouter": "Router"}.get(
+        type(llm).__name__, type(llm).__name__
     )
-    
-    retrieval_chain = create_retrieval_chain(retriever, document_chain)
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or "unknown"
+    return provider, str(model)
+
+def _build_insight_chain(llm: Any, vector_store: "FAISS") -> Tuple[Any, Any]:
+    """Build the retriever and get the answer chain shared by the sync and async paths"""
+    from hybrid_retriever import build_hybrid_retriever
+
+    retriever = build_hybrid_retriever(vector_store, {"k": ContextConfig.DEFAULT_PARAMS["candidates"]})
+    return retriever, registry.chain("insight", llm)
+
+def _pack_context(llm: Any, chunks: List[str], prompt_text: str, max_context_tokens: int,
+                  baseline_chunks: Optional[List[str]] = None, **attributes: Any) -> str:
+    """Pack retrieved chunks into the token budget the model and prompt leave, recording the savings"""
+    from context_packer import context_budget, pack_context, token_counter
+
+    count_tokens = token_counter(llm)
+    budget = context_budget(llm, prompt_text, max_context_tokens, count_tokens)
+    with span("rag.pack", **attributes) as record:
+        context, report = pack_context(chunks, budget, count_tokens, baseline_chunks=baseline_chunks)
+        record.update(report)
+    logger.debug(f"Packed {report['selected']}/{report['candidates']} chunks into {report['tokens_used']} "
+                 f"tokens ({report['tokens_saved']} saved)")
+    return context
+
+def generate_insights(llm: Any, vector_store: "FAISS", field_name: str, use_cache: bool = True) -> str:
+    """Generate all marketing insights using RAG"""
+    retriever, chain = _build_insight_chain(llm, vector_store)
     
     try:
         # Execute the chain
-        result = retrieval_chain.invoke({
-            "input": field_prompts[field_name]
-        })
-        return parse_insights(field_name, result["answer"])
+        query = FIELD_PROMPTS[field_name]
+        with span("rag.retrieve", field=field_name):
+            chunks = [doc.page_content for doc in retriever.invoke(query)]
+        context = _pack_context(
+            llm, chunks, registry.format("insight", {"input": query, "context": ""}),
+            ContextConfig.DEFAULT_PARAMS["max_context_tokens"], field=field_name
+        )
+        inputs = {"input": query, "context": context}
+        with span("llm.insight", field=field_name):
+            answer = cached_call(
+                llm, registry.format("insight", inputs), lambda: chain.invoke(inputs, config=llm_run_config(llm)),
+                use_cache
+            )
+        return parse_insights(field_name, answer)
     except Exception as e:
         logger.error(f"Insight generation failed: {str(e)}")
         return ""
 
+async def agenerate_insights_concurrently(llm: Any, vector_store: "FAISS", field_names: List[str],
+                                          max_concurrency: int = INSIGHT_MAX_CONCURRENCY,
+                                          timeout: float = INSIGHT_TIMEOUT_SECONDS,
+                                          use_cache: bool = True,
+                                          check_cancelled: Optional[Callable[[], None]] = None) -> Dict[str, str]:
+    """Run the per-field RAG chains concurrently
+
+    At most max_concurrency chains are in flight at once. Each field has its own
+    timeout, not counting time queued in the rate limiter, and a field that fails
+    or times out yields "" without affecting the rest. check_cancelled, when
+    given, is called before each field starts and after all have finished; it
+    cancels by raising.
+    """
+    from rate_limiter import wait_for_excluding_queue
+
+    retriever, chain = _build_insight_chain(llm, vector_store)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def answer_field(field_name: str) -> str:
+        query = FIELD_PROMPTS[field_name]
+        with span("rag.retrieve", field=field_name):
+            docs = await retriever.ainvoke(query)
+        context = _pack_context(
+            llm, [doc.page_content for doc in docs], registry.format("insight", {"input": query, "context": ""}),
+            ContextConfig.DEFAULT_PARAMS["max_context_tokens"], field=field_name
+        )
+        inputs = {"input": query, "context": context}
+        with span("llm.insight", field=field_name):
+            return await acached_call(
+                llm, registry.format("insight", inputs), lambda: chain.ainvoke(inputs, config=llm_run_config(llm)),
+                use_cache
+            )
+
+    async def run_field(field_name: str) -> str:
+        async with semaphore:
+            try:
+                if check_cancelled:
+                    check_cancelled()
+                answer = await wait_for_excluding_queue(answer_field(field_name), timeout)
+                return parse_insights(field_name, answer)
+            except asyncio.TimeoutError:
+                logger.error(f"Insight generation for {field_name} timed out after {timeout}s")
+                return ""
+            except Exception as e:
+                logger.error(f"Insight generation for {field_name} failed: {str(e)}")
+                return ""
+
+    answers = await asyncio.gather(*(run_field(name) for name in field_names))
+    if check_cancelled:
+        check_cancelled()  # fields skipped after a cancellation came back as ""
+    return dict(zip(field_names, answers))
+
+def generate_insights_concurrently(llm: Any, vector_store: "FAISS", field_names: List[str],
+                                   max_concurrency: int = INSIGHT_MAX_CONCURRENCY,
+                                   timeout: float = INSIGHT_TIMEOUT_SECONDS,
+                                   use_cache: bool = True,
+                                   check_cancelled: Optional[Callable[[], None]] = None) -> Dict[str, str]:
+    """Synchronous wrapper for agenerate_insights_concurrently
+    Note: Do not call this from async contexts - await agenerate_insights_concurrently instead
+    """
+    return asyncio.run(agenerate_insights_concurrently(
+        llm, vector_store, field_names, max_concurrency, timeout, use_cache, check_cancelled
+    ))
+
+def _retrieve_context(llm: Any, vector_store: "FAISS", field_names: List[str]) -> str:
+    """Retrieve candidates for every field in one pass and pack them into one shared context
+
+    Candidates are interleaved by rank across fields, so each field's best
+    chunks are considered before any field's second best.
+    """
+    from hybrid_retriever import build_hybrid_retriever
+
+    params = ContextConfig.DEFAULT_PARAMS
+    retriever = build_hybrid_retriever(vector_store, {"k": params["candidates"]})
+    rankings = [[doc.page_content for doc in retriever.invoke(FIELD_PROMPTS[name])] for name in field_names]
+    chunks = [chunk for row in itertools.zip_longest(*rankings) for chunk in row if chunk is not None]
+    baseline = list(dict.fromkeys(chunk for ranking in rankings for chunk in ranking[:params["baseline_k"]]))
+    tasks = "\n".join(f"- {name}: {FIELD_PROMPTS[name]}" for name in field_names)
+    return _pack_context(
+        llm, chunks, registry.format("insight_batch", {"tasks": tasks, "context": ""}),
+        params["batch_max_context_tokens"], baseline_chunks=baseline, fields=len(field_names)
+    )
+
+def _parse_batch_response(text: str) -> Dict[str, Any]:
+    """Extract the JSON object from a batched insight response"""
+    text = re.sub(r"^```(?:json)?|```$", "", text.strip(), flags=re.MULTILINE).strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("No JSON object in response")
+    data = json.loads(text[start:end + 1])
+    if not isinstance(data, dict):
+        raise ValueError("Response JSON is not an object")
+    return data
+
+def _format_batch_value(field_name: str, value: Any) -> str:
+    """Flatten a JSON value into the plain text a per-field answer would contain"""
+    if isinstance(value, list):
+        items = [str(item).strip() for item in value if str(item).strip()]
+        if field_name == "suggested_topics":
+            return "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
+        return "\n".join(items)
+    if value is None:
+        return ""
+    return str(value)
+
+def generate_all_insights(llm: Any, vector_store: "FAISS", field_names: List[str],
+                          fields_per_call: Optional[int] = None, use_cache: bool = True,
+                          check_cancelled: Optional[Callable[[], None]] = None) -> Dict[str, str]:
+    """Generate several marketing insights from one retrieval and one structured LLM call
+
+    Fields are grouped fields_per_call at a time (all in one call by default).
+    Any field missing from a response, or a whole group whose response cannot be
+    parsed, falls back to the concurrent per-field chains. check_cancelled, when
+    given, is called between LLM calls and cancels by raising.
+    """
+    from rate_limiter import BACKGROUND, request_priority
+
+    # Extraction runs in the background, so interactive generation is queued ahead of it
+    with request_priority(BACKGROUND):
+        return _generate_all_insights(llm, vector_store, field_names, fields_per_call, use_cache, check_cancelled)
+
+def _generate_all_insights(llm: Any, vector_store: "FAISS", field_names: List[str],
+                           fields_per_call: Optional[int], use_cache: bool,
+                           check_cancelled: Optional[Callable[[], None]]) -> Dict[str, str]:
+    check_cancelled = check_cancelled or (lambda: None)
+    results = {}
+    fallback = []
+    group_size = fields_per_call or len(field_names) or 1
+
+    try:
+        with span("rag.retrieve", fields=len(field_names)):
+            context = _retrieve_context(llm, vector_store, field_names)
+    except Exception as e:
+        logger.error(f"Batched insight retrieval failed: {str(e)}")
+        context = None
+
+    chain = registry.chain("insight_batch", llm)
+
+    for i in range(0, len(field_names), group_size):
+        group = field_names[i:i + group_size]
+        check_cancelled()
+        if context is None:
+            fallback.extend(group)
+            continue
+
+        inputs = {
+            "tasks": "\n".join(f"- {name}: {FIELD_PROMPTS[name]}" for name in group),
+            "context": context
+        }
+        try:
+            with span("llm.insight_batch", fields=len(group)):
+                response = cached_call(
+                    llm, registry.format("insight_batch", inputs),
+                    lambda: chain.invoke(inputs, config=llm_run_config(llm)), use_cache,
+                    validate=_parse_batch_response  # a malformed answer is not cached, so the next run retries
+                )
+            data = _parse_batch_response(response)
+        except Exception as e:
+            logger.warning(f"Batched insight extraction failed, falling back per field: {str(e)}")
+            fallback.extend(group)
+            continue
+
+        for name in group:
+            value = _format_batch_value(name, data.get(name)).strip()
+            if value:
+                results[name] = parse_insights(name, value)
+            else:
+                fallback.append(name)
+
+    check_cancelled()
+    if fallback:
+        results.update(generate_insights_concurrently(
+            llm, vector_store, fallback, use_cache=use_cache, check_cancelled=check_cancelled
+        ))
+
+    return {name: results.get(name, "") for name in field_names}
+
 def parse_insights(field_name: str, text: str) -> str:
     """
     Parses the LLM-generated text for a single field.
@@ -1,15 +1,145 @@
 # main.py
 import streamlit as st
+import time
 import logging
-from ui import initialize_session_state, create_sidebar, create_marketing_form
-from document_processor import validate_uploaded_file, process_document
-from llm_handler import initialize_llm, generate_insights
-from content_generator import generate_output
+from ui import initialize_session_state, create_sidebar, create_marketing_form, get_batch_selection
+from document_processor import validate_uploaded_file
+from llm_handler import initialize_llm, generate_all_insights, describe_llm, FIELD_PROMPTS
+from content_generator import stream_output, generate_batch, fan_out
 from file_utils import convert_to_docx
-from config import SUPPORTED_FILE_TYPES
+from embedding_service import start_background_warmup
+from telemetry import start_metrics_server, configure_span_log
+from preload import start_background_preload
+from jobs import JobManager, Job, job_key, SUCCEEDED, FAILED, CANCELLED
+from config import SUPPORTED_FILE_TYPES, JOB_POLL_SECONDS
+from typing import Any, Dict, List
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+@st.cache_resource(show_spinner=False)
+def warm_up():
+    """Start the metrics endpoint, preload heavy imports and load the embedding model once per process"""
+    configure_span_log()
+    start_metrics_server()
+    start_background_preload()
+    return start_background_warmup()
+
+@st.cache_resource(show_spinner=False)
+def get_job_manager() -> JobManager:
+    """One job manager per process, shared by every session"""
+    return JobManager()
+
+def extract_insights_job(job: Job, llm: Any, vector_store: Any) -> Dict[str, str]:
+    job.report(message="Extracting data...")
+    return generate_all_insights(llm, vector_store, list(FIELD_PROMPTS), check_cancelled=job.check_cancelled)
+
+def generation_job(job: Job, llm: Any, task: str, form_data: Dict[str, str]) -> str:
+    job.report(message=f"Generating {task}...")
+    text = ""
+    reported_at = time.monotonic()
+    for chunk in stream_output(llm, task, form_data):
+        job.check_cancelled()
+        text += chunk
+        # The UI reads the output once per poll, so publishing more often only costs time
+        if time.monotonic() - reported_at >= JOB_POLL_SECONDS:
+            job.report(output=text)
+            reported_at = time.monotonic()
+    return text
+
+def batch_generation_job(job: Job, llm: Any, items: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    from rate_limiter import BACKGROUND, request_priority
+
+    results: List[Dict[str, str]] = [{"label": item["label"], "text": ""} for item in items]
+    finished = []
+    job.report(message=f"Generating {len(items)} items...", output=[])
+    # A large batch should not hold up single generations submitted while it runs
+    with request_priority(BACKGROUND):
+        batch = generate_batch(llm, items)
+        try:
+            for i, text in batch:
+                job.check_cancelled()
+                results[i]["text"] = text
+                finished.append(results[i])
+                job.report(progress=len(finished) / len(items), message=f"{len(finished)} of {len(items)} done",
+                           output=list(finished))
+        finally:
+            batch.close()  # cancels requests not yet started when the job is cancelled
+    return results
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_insight_job():
+    """Show extraction progress and copy finished insights into the form"""
+    manager = get_job_manager()
+    job = manager.get(st.session_state.insight_job_id)
+    if job is None:
+        return
+    if not job.finished:
+        st.progress(job.progress, text=job.message or "Extracting data...")
+        if st.button("Cancel extraction"):
+            manager.cancel(job.id)
+        return
+
+    # Record the key whatever the outcome so a failed extraction is not resubmitted on every rerun
+    st.session_state.insight_job_id = None
+    st.session_state.insights_key = job.key
+    if job.status == SUCCEEDED:
+        st.session_state.update(job.result)
+        missing = [name.replace("_", " ") for name, value in job.result.items() if not value.strip()]
+        if missing:
+            st.session_state.error_message = f"Could not extract: {', '.join(missing)}. See the log for details."
+    elif job.status == FAILED:
+        st.session_state.error_message = f"Data extraction failed: {job.error}"
+    st.rerun(scope="app")  # Force a re-run so the form picks up the new values
+
+def show_generated(content: Any) -> None:
+    """Render a generation result: text, or one expander per batch item"""
+    if not isinstance(content, list):
+        st.markdown(content or "")
+        return
+    for entry in content:
+        with st.expander(entry["label"], expanded=len(content) == 1):
+            st.markdown(entry["text"])
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_generation_job():
+    """Render the generation job's text (or finished batch items) as it streams in, then offer the download"""
+    manager = get_job_manager()
+    job = manager.get(st.session_state.generation_job_id)
+    if job is None:
+        return
+
+    st.subheader("Generated Content")
+    if not job.finished:
+        if job.progress:
+            st.progress(job.progress)
+        show_generated(job.output)
+        st.caption(job.message)
+        if st.button("Cancel generation"):
+            manager.cancel(job.id)
+        if isinstance(job.output, list):
+            st.caption("Cancelling a batch stops requests not yet sent; those in flight finish first.")
+        return
+
+    if job.status == FAILED:
+        st.error(f"Content generation failed: {job.error}")
+        return
+    if job.status == CANCELLED:
+        st.info("Generation cancelled")
+        show_generated(job.output)
+        return
+
+    show_generated(job.result)
+    document = job.result
+    if isinstance(document, list):
+        document = "\n\n".join(f"# {entry['label']}\n\n{entry['text']}" for entry in document)
+    # Add download button with format option
+    st.download_button(
+        label="Download Result",
+        data=convert_to_docx(document),
+        file_name=f"{job.name.replace(' ', '_')}.docx",
+        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    )
+
 def main():
     initialize_session_state()
     st.set_page_config(page_title="AI Marketing Assistant", layout="wide")
@@ -19,86 +149,90 @@ def main():
     
     st.title(f"📋 {config['task']} AI Generator")
     
-    uploaded_file = st.file_uploader(
-        "Upload business document (PDF, DOCX, TXT)", 
+    uploaded_files = st.file_uploader(
+        "Upload business documents (PDF, DOCX, TXT)", 
         type=SUPPORTED_FILE_TYPES,
+        accept_multiple_files=True,
         help="add documents to help the AI understand you/your business"
     )
+    valid_files = [file for file in uploaded_files or [] if validate_uploaded_file(file)]
+    
+    if valid_files and st.session_state.corpus is None:
+        from corpus import DocumentCorpus
+
+        st.session_state.corpus = DocumentCorpus()
     
-    if uploaded_file and validate_uploaded_file(uploaded_file):
-        # Reset processing flag if a new file is uploaded
-        if ("last_uploaded_file" not in st.session_state or 
-            st.session_state.last_uploaded_file != uploaded_file.name):
-            st.session_state.processing_done = False
-            st.session_state.last_uploaded_file = uploaded_file.name
+    if st.session_state.corpus is not None:
+        # Sync the corpus with the uploader: embed new files, drop removed ones
+        corpus = st.session_state.corpus
+        uploaded_ids = st.session_state.uploaded_doc_ids
+
+        current_ids = set()
+        for file in valid_files:
+            if file.file_id not in uploaded_ids:
+                try:
+                    with st.spinner(f"Processing {file.name}..."):
+                        doc_id, _ = corpus.add_document(file.getvalue(), file.name)
+                except Exception as e:
+                    logging.error(f"Document processing failed: {str(e)}")
+                    st.error(f"Document processing error ({file.name}): {str(e)}")
+                    continue
+                uploaded_ids[file.file_id] = doc_id
+            current_ids.add(uploaded_ids[file.file_id])
+
+        for doc_id in [doc["doc_id"] for doc in corpus.documents() if doc["doc_id"] not in current_ids]:
+            corpus.remove_document(doc_id)
 
         # Optionally add a manual reset button for re-running extraction
-        if st.button("Extract Data"):
-            st.session_state.processing_done = False
-
-        vector_store, content = process_document(
-            uploaded_file.getvalue(),
-            uploaded_file.name
-        )
-
-        st.session_state.vector_store = vector_store
-        st.session_state.doc_content = content
-
-        if st.session_state.llm and st.session_state.vector_store and not st.session_state.processing_done:
-            # Generate content for the fields
-            with st.spinner("Extracting data..."):
-                # Always update the value (or conditionally, if you prefer)
-                st.session_state.brand_description = generate_insights(
-                    st.session_state.llm, st.session_state.vector_store, "brand_description"
-                )
-                st.session_state.target_audience = generate_insights(
-                    st.session_state.llm, st.session_state.vector_store, "target_audience"
-                )
-                st.session_state.products_services = generate_insights(
-                    st.session_state.llm, st.session_state.vector_store, "products_services"
-                )
-                st.session_state.marketing_goals = generate_insights(
-                    st.session_state.llm, st.session_state.vector_store, "marketing_goals"
-                )
-                st.session_state.existing_content = generate_insights(
-                    st.session_state.llm, st.session_state.vector_store, "existing_content"
-                )
-                st.session_state.keywords = generate_insights(
-                    st.session_state.llm, st.session_state.vector_store, "keywords"
-                )
-                st.session_state.suggested_topics = generate_insights(
-                    st.session_state.llm, st.session_state.vector_store, "suggested_topics"
-                )
+        if corpus.vector_store is not None and st.button("Extract Data"):
+            st.session_state.insights_key = None
+            st.session_state.insight_job_id = None
 
-                # Mark processing as done so we don't re-run it on subsequent reruns
-                st.session_state.processing_done = True
+        st.session_state.vector_store = corpus.vector_store
+        st.session_state.doc_content = corpus.content
 
-            st.rerun()  # Force a re-run so the form picks up the new values
+        if st.session_state.llm and st.session_state.vector_store is not None:
+            # Extract every field in the background; the poller copies results into the form
+            manager = get_job_manager()
+            key = job_key("insights", sorted(corpus.manifest), describe_llm(st.session_state.llm))
+            job = manager.get(st.session_state.insight_job_id)
+            if st.session_state.insights_key != key and (job is None or job.key != key):
+                if job is not None:
+                    manager.cancel(job.id)
+                st.session_state.error_message = ""
+                # The job searches a snapshot: later uploads change the corpus in place while it runs
+                st.session_state.insight_job_id = manager.submit(
+                    extract_insights_job, st.session_state.llm, corpus.snapshot(),
+                    name="Extract Data", key=key
+                )
+            poll_insight_job()
+
+    if st.session_state.error_message:
+        st.error(st.session_state.error_message)
 
-    
     # Main form and generation
     form_data = create_marketing_form()
     
     if form_data and st.session_state.llm:
-        with st.spinner("Generating content..."):
-            result = generate_output(
-                st.session_state.llm,
-                config["task"],
-                form_data
+        tasks, tones, properties = get_batch_selection(config["task"])
+        if tasks:
+            items = fan_out(form_data, tasks, tones, properties)
+            key = job_key("generate_batch", items, describe_llm(st.session_state.llm))
+            st.session_state.generation_job_id = get_job_manager().submit(
+                batch_generation_job, st.session_state.llm, items,
+                name=f"Batch of {len(items)}", key=key
             )
-            
-            st.subheader("Generated Content")
-            st.markdown(result)
-            
-            # Add download button with format option
-            
-            docx_file = convert_to_docx(result)
-            st.download_button(
-                label="Download Result",
-                data=docx_file,
-                file_name=f"{config['task'].replace(' ', '_')}.docx",
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        else:
+            key = job_key("generate", config["task"], form_data, describe_llm(st.session_state.llm))
+            st.session_state.generation_job_id = get_job_manager().submit(
+                generation_job, st.session_state.llm, config["task"], form_data,
+                name=config["task"], key=key
             )
 
+    poll_generation_job()
+
+    # Warm up after the first render so heavy imports never delay the page
+    warm_up()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,168 @@
+# page_cache.py
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import requests
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from typing import Any, Dict, List, Optional, Tuple
+from config import PAGE_CACHE_DIR, PAGE_CACHE_TTL_SECONDS, PAGE_CACHE_MAX_MB
+from file_utils import prune_cache_dir
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+MARKDOWN_FILE = "page.md"
+HTML_FILE = "page.html"
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so trivially different spellings share one cache entry"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+class PageCache:
+    """On-disk cache of rendered pages and their extracted properties
+
+    Entries younger than ttl_seconds are served as-is. Older entries are
+    revalidated with a conditional GET (ETag / Last-Modified) and a hash of the
+    response body, so unchanged pages skip rendering and LLM extraction. With
+    no entry, only a HEAD request is made for the validators, since the
+    crawler fetches the page itself.
+    """
+
+    def __init__(self, cache_dir: str = PAGE_CACHE_DIR, ttl_seconds: float = PAGE_CACHE_TTL_SECONDS,
+                 max_size_mb: int = PAGE_CACHE_MAX_MB, request_timeout: float = 10.0):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self.request_timeout = request_timeout
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for url (metadata plus markdown and html), or None"""
+        path = self._path(url)
+        try:
+            with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+                entry = json.load(f)
+            with open(os.path.join(path, MARKDOWN_FILE), encoding="utf-8") as f:
+                entry["markdown"] = f.read()
+            with open(os.path.join(path, HTML_FILE), encoding="utf-8") as f:
+                entry["html"] = f.read()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable page cache entry for {url}: {str(e)}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        return entry
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get("validated_at", 0) < self.ttl_seconds
+
+    def check(self, url: str, entry: Optional[Dict[str, Any]]) -> Tuple[bool, Dict[str, Any]]:
+        """Revalidate url against the origin
+
+        Returns (unchanged, validators): unchanged is True when the cached entry
+        can be reused, and validators holds the ETag, Last-Modified and body hash
+        to store with a freshly rendered page. Network errors count as changed.
+        """
+        if not entry:
+            try:
+                response = requests.head(url, timeout=self.request_timeout, allow_redirects=True)
+            except requests.RequestException as e:
+                logger.warning(f"Validator request for {url} failed: {str(e)}")
+                return False, {}
+            return False, {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "content_hash": None,
+            }
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = requests.get(url, headers=headers, timeout=self.request_timeout)
+        except requests.RequestException as e:
+            logger.warning(f"Revalidation request for {url} failed: {str(e)}")
+            return False, {}
+
+        if response.status_code == 304:
+            return True, {
+                "etag": response.headers.get("ETag", entry.get("etag")),
+                "last_modified": response.headers.get("Last-Modified", entry.get("last_modified")),
+                "content_hash": entry.get("content_hash"),
+            }
+
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": hashlib.sha256(response.content).hexdigest() if response.ok else None,
+        }
+        unchanged = bool(validators["content_hash"] and validators["content_hash"] == entry.get("content_hash"))
+        return unchanged, validators
+
+    def touch(self, url: str, validators: Optional[Dict[str, Any]] = None) -> None:
+        """Mark an entry as just revalidated, updating its validators"""
+        path = self._path(url)
+        meta_path = os.path.join(path, META_FILE)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            meta.update({k: v for k, v in (validators or {}).items() if v})
+            meta["validated_at"] = time.time()
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            now = time.time()
+            os.utime(path, (now, now))
+        except Exception as e:
+            logger.warning(f"Failed to refresh page cache entry for {url}: {str(e)}")
+
+    def put(self, url: str, markdown: str, html: Optional[str], validators: Dict[str, Any],
+            properties: Optional[List[Dict[str, Any]]]) -> None:
+        """Store a rendered page and its extracted properties"""
+        path = self._path(url)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        now = time.time()
+        meta = {
+            "url": normalize_url(url),
+            "etag": validators.get("etag"),
+            "last_modified": validators.get("last_modified"),
+            "content_hash": validators.get("content_hash"),
+            "fetched_at": now,
+            "validated_at": now,
+            "properties": properties,
+        }
+        try:
+            os.makedirs(tmp_path, exist_ok=True)
+            with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            with open(os.path.join(tmp_path, MARKDOWN_FILE), "w", encoding="utf-8") as f:
+                f.write(markdown or "")
+            with open(os.path.join(tmp_path, HTML_FILE), "w", encoding="utf-8") as f:
+                f.write(html or "")
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to cache page {url}: {str(e)}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+
+        prune_cache_dir(self.cache_dir, self.max_bytes)
@@ -0,0 +1,142 @@
+# preload.py
+"""Deferred heavy imports: background preloading and an import-time report
+
+The app modules import LangChain provider clients, loaders, FAISS, pypdf,
+python-docx and crawl4ai where they are first used, so the first page renders
+without waiting for them. Once the UI is up, start_background_preload() imports
+them on a daemon thread so the first upload or generation does not pay for it.
+
+    python preload.py            # cold-start report, one fresh interpreter per module
+    python preload.py --json     # the same, machine-readable, for tracking per release
+
+The report exits non-zero when importing an app module loads any of the
+deferred packages, so an eager import slipping back onto the startup path
+fails the check.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import importlib
+import threading
+import subprocess
+from typing import Any, Dict, List, Optional
+from config import PRELOAD_IMPORTS
+
+logger = logging.getLogger(__name__)
+
+# Roughly in order of first use: the LLM client, then ingestion, then export and scraping
+HEAVY_MODULES = [
+    "langchain_core.prompts",
+    "langchain_groq",
+    "langchain_ollama",
+    "langchain_core.retrievers",
+    "langchain.text_splitter",
+    "langchain_community.document_loaders",
+    "langchain_community.vectorstores",
+    "faiss",
+    "pypdf",
+    "langchain_huggingface",
+    "docx",
+    "crawl4ai",
+]
+
+# Modules whose startup cost is tracked by the report, in addition to HEAVY_MODULES
+APP_MODULES = ["main"]
+
+# Top-level packages that importing an app module must not load
+DEFERRED_PACKAGES = sorted({name.split(".")[0] for name in HEAVY_MODULES})
+
+_report: Dict[str, Dict[str, Any]] = {}
+_report_lock = threading.Lock()
+_preload_thread: Optional[threading.Thread] = None
+
+def timed_import(name: str) -> Dict[str, Any]:
+    """Import a module, recording how long the import took in this process"""
+    already_loaded = name in sys.modules
+    start = time.perf_counter()
+    try:
+        importlib.import_module(name)
+        entry = {"module": name, "seconds": time.perf_counter() - start, "status": "ok"}
+    except Exception as e:
+        entry = {"module": name, "seconds": time.perf_counter() - start, "status": "error", "error": str(e)}
+    if already_loaded:
+        entry["status"] = "already loaded"
+    with _report_lock:
+        _report.setdefault(name, entry)
+    return entry
+
+def preload(modules: List[str] = HEAVY_MODULES) -> List[Dict[str, Any]]:
+    """Import every module in order; failures (e.g. an optional package) are logged, not raised"""
+    start = time.perf_counter()
+    entries = []
+    for name in modules:
+        entry = timed_import(name)
+        if entry["status"] == "error":
+            logger.warning(f"Preloading {name} failed: {entry['error']}")
+        entries.append(entry)
+    logger.info(f"Preloaded {len(modules)} modules in {time.perf_counter() - start:.2f}s")
+    return entries
+
+def start_background_preload(modules: List[str] = HEAVY_MODULES) -> Optional[threading.Thread]:
+    """Start preloading on a daemon thread (once per process); a no-op when PRELOAD_IMPORTS is off"""
+    global _preload_thread
+    if not PRELOAD_IMPORTS:
+        return None
+    with _report_lock:
+        if _preload_thread is None:
+            _preload_thread = threading.Thread(target=preload, args=(modules,), name="preload", daemon=True)
+            _preload_thread.start()
+    return _preload_thread
+
+def import_report() -> List[Dict[str, Any]]:
+    """Import timings recorded in this process, slowest first"""
+    with _report_lock:
+        return sorted(_report.values(), key=lambda entry: entry["seconds"], reverse=True)
+
+def cold_import_seconds(name: str, python: str = sys.executable) -> Dict[str, Any]:
+    """Time importing a module in a fresh interpreter, so shared dependencies are not already loaded
+
+    The entry also lists the DEFERRED_PACKAGES the import pulled in under "eager".
+    """
+    code = (
+        "import sys, json, time, importlib; start = time.perf_counter(); "
+        f"importlib.import_module({name!r}); seconds = time.perf_counter() - start; "
+        f"print(json.dumps([seconds, sorted(set({DEFERRED_PACKAGES!r}) & {{m.split('.')[0] for m in sys.modules}})]))"
+    )
+    completed = subprocess.run([python, "-c", code], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        error = (completed.stderr.strip().splitlines() or ["import failed"])[-1]
+        return {"module": name, "seconds": None, "status": "error", "error": error}
+    seconds, eager = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {"module": name, "seconds": seconds, "status": "ok", "eager": eager}
+
+def eager_imports(rows: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """App modules in the report whose import loaded deferred packages, with those packages"""
+    return {row["module"]: row["eager"] for row in rows if row["module"] in APP_MODULES and row.get("eager")}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report cold import times of the app and its heavy dependencies")
+    parser.add_argument("modules", nargs="*", default=APP_MODULES + HEAVY_MODULES)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    rows = [cold_import_seconds(name) for name in args.modules]
+    eager = eager_imports(rows)
+    if args.json:
+        print(json.dumps({"python": sys.version.split()[0], "imports": rows, "eager": eager}, indent=2))
+    else:
+        print(f"{'module':<40}{'cold import s':>15}")
+        for row in rows:
+            value = f"{row['seconds']:.3f}" if row["seconds"] is not None else row["error"][:40]
+            print(f"{row['module']:<40}{value:>15}")
+        for module, packages in eager.items():
+            print(f"FAIL: importing {module} loads deferred packages: {', '.join(packages)}")
+    if eager:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+# prompt_registry.py
+"""Prompt templates for every marketing task and insight prompt, validated once at import
+
+Templates are checked with the same f-string rules LangChain applies, so a
+stray brace, or a prompt that drops a variable its callers always pass, fails
+when the module loads instead of when a user first picks the task. The
+ChatPromptTemplate for each is built on first use (langchain_core is
+slow to import and stays off the startup path), and the composed
+prompt | llm | parser runnables are cached per LLM instance, so repeated and
+batched calls reuse them.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from string import Formatter
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from config import Config, PROMPT_CHAIN_CACHE_SIZE
+
+if TYPE_CHECKING:
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.runnables import Runnable
+
+logger = logging.getLogger(__name__)
+
+INSIGHT_PROMPT_TEMPLATE = """
+    You are a marketing specialist tasked with analyzing business documents.
+        
+        {input}
+        
+        Context:
+        {context}
+        
+        Provide a clear, concise response focusing only on the information requested.
+    """
+
+BATCH_INSIGHT_PROMPT_TEMPLATE = """
+    You are a marketing specialist tasked with analyzing business documents.
+        
+        Answer every task below using only the context.
+        
+        Tasks:
+        {tasks}
+        
+        Context:
+        {context}
+        
+        Respond with a single JSON object and nothing else. Use the task names as keys and
+        plain-text answers as string values, for example: {{"task_name": "answer"}}.
+    """
+
+TASK_PROMPTS = {
+    "Marketing Strategy": """
+        You are a senior marketing strategist tasked with creating a comprehensive marketing plan.
+        
+        ## Business Context
+        Brand Description: {brand_description}
+        Target Audience: {target_audience}
+        Products/Services: {products_services}
+        Marketing Goals: {marketing_goals}
+        Existing Content: {existing_content}
+        Keywords: {keywords}
+        
+        ## Instructions
+        Develop a detailed, actionable marketing strategy that aligns with the business goals.
+        Focus on creating a strategy that is specific, measurable, achievable, relevant, and time-bound.
+        
+        ## Required Output Structure
+        1. Executive Summary (brief overview of the entire strategy)
+        2. Market Analysis (industry trends, competitive landscape)
+        3. Target Audience Segmentation (detailed profiles of key segments)
+        4. Value Proposition & Positioning (unique selling points, brand positioning)
+        5. Marketing Channels & Tactics (prioritized by ROI potential)
+        6. Content Strategy (topics, formats, distribution, calendar)
+        7. Budget Allocation (recommended spending by channel)
+        8. Implementation Timeline (30-60-90 day plan)
+        9. KPIs & Success Metrics (specific measurements for each goal)
+        10. Risk Assessment & Contingency Plans
+    """,
+    
+    "Campaign Strategy": """
+        You are a creative campaign director tasked with developing innovative marketing campaigns.
+        
+        ## Business Context
+        Brand Description: {brand_description}
+        Target Audience: {target_audience}
+        Products/Services: {products_services}
+        Marketing Goals: {marketing_goals}
+        Keywords: {keywords}
+        Selected Topics: {suggested_topics}
+        Tone: {tone}
+        
+        ## Instructions
+        Generate 5 distinct, creative campaign concepts that align with the brand identity and will resonate with the target audience.
+        Each campaign should be achievable with realistic resources and have clear business impact.
+        
+        ## Required Output Structure
+        For each of the 5 campaigns, provide:
+        
+        ### Campaign [Number]: [Creative Name]
+        * Concept: Brief explanation of the campaign idea and creative angle
+        * Target Segment: Specific audience segment this will appeal to most
+        * Core Message: The primary takeaway for the audience
+        * Campaign Elements: List of deliverables (videos, posts, emails, etc.)
+        * Channels: Primary platforms for distribution
+        * Timeline: Suggested duration and key milestones
+        * Success Metrics: How to measure campaign effectiveness
+        * Estimated Impact: Expected outcomes tied to marketing goals
+    """,
+    
+    "Social Media Content Strategy": """
+        You are an expert social media manager creating platform-specific content.
+        
+        ## Business Context
+        Brand Description: {brand_description}
+        Target Audience: {target_audience}
+        Products/Services: {products_services}
+        Marketing Goals: {marketing_goals}
+        Keywords: {keywords}
+        Selected Topics: {suggested_topics}
+        Tone: {tone}
+        Post Type: {post_type}
+        
+        ## Instructions
+        Create a comprehensive social media content plan optimized for {post_type}.
+        Focus on engaging the target audience with content that drives specific marketing goals.
+        Ensure all content maintains the brand's {tone} tone of voice.
+        
+        ## Required Output Structure
+        1. Platform Strategy
+           * Why {post_type} is effective for this audience
+           * Best practices specific to this platform
+           * Posting frequency recommendations
+        
+        2. Content Pillars (3-4 key themes aligned with business goals)
+        
+        3. Content Calendar (2-week sample)
+           * Week 1:
+             * Day 1: [Content type] - [Example post with exact copy]
+             * Day 2: [Content type] - [Example post with exact copy]
+             [Continue for all week]
+           * Week 2: [Same format]
+        
+        4. Engagement Strategy
+           * Response templates for common interactions
+           * Community-building tactics
+           * User-generated content opportunities
+        
+        5. Growth Tactics
+           * Hashtag strategy (10-15 targeted hashtags grouped by purpose)
+           * Collaboration opportunities
+           * Cross-promotion ideas
+        
+        6. Analytics Focus
+           * Key metrics to track for this specific platform
+           * Benchmarks for success
+    """,
+    
+    "SEO Optimization Strategy": """
+        You are an SEO specialist developing a comprehensive search optimization strategy.
+        
+        ## Business Context
+        Brand Description: {brand_description}
+        Target Audience: {target_audience}
+        Products/Services: {products_services}
+        Marketing Goals: {marketing_goals}
+        Keywords: {keywords}
+        Existing Content: {existing_content}
+        
+        ## Instructions
+        Create a detailed SEO strategy that will improve organic visibility and drive qualified traffic.
+        Focus on both quick wins and long-term sustainable growth.
+        Provide specific, actionable recommendations rather than general advice.
+        
+        ## Required Output Structure
+        1. Keyword Strategy
+           * Primary Keywords (5-7 high-priority terms with search volume estimates)
+           * Secondary Keywords (10-15 supporting terms)
+           * Long-tail Opportunities (7-10 specific phrases)
+           * Semantic/Topic Clusters (group related terms by topic)
+        
+        2. On-Page Optimization
+           * Title Tag Templates
+           * Meta Description Frameworks
+           * Heading Structure Recommendations
+           * Content Length and Formatting Guidelines
+           * Internal Linking Strategy
+        
+        3. Technical SEO Checklist
+           * Site Speed Optimization
+           * Mobile Usability
+           * Schema Markup Recommendations
+           * Indexation Controls
+           * URL Structure Guidelines
+        
+        4. Content Strategy
+           * Content Gaps Analysis
+           * Content Update Priorities
+           * New Content Recommendations (5-7 specific pieces)
+           * Content Calendar Framework
+        
+        5. Off-Page Strategy
+           * Link Building Tactics (specific to industry)
+           * Digital PR Opportunities
+           * Local Citation Opportunities (if applicable)
+        
+        6. Measurement Plan
+           * Key Performance Indicators
+           * Tracking Setup Recommendations
+           * Reporting Schedule and Format
+        """,
+
+    "Post Composer": """
+        You are a professional real estate copywriter creating compelling property listings and promotional content.
+        
+        ## Business Context
+        Brand Description: {brand_description}
+        Target Audience: {target_audience}
+        Properties: {properties_data}
+        Marketing Goals: {marketing_goals}
+        Keywords: {keywords}
+        Selected Topics: {suggested_topics}
+        
+        ## Instructions
+        Create engaging property posts that highlight key features and attract potential buyers/renters.
+        Include property details from {properties_data} and incorporate {keywords} naturally.
+        Maintain a {tone} tone while emphasizing unique selling points.
+        
+        ## Property Post Structure
+        1. Property Image: {property_image_url}
+        2. Headline: Attention-grabbing title with location and key feature
+        3. Description:
+           - Opening hook highlighting unique feature
+           - Key details (bedrooms, bathrooms, sqft, amenities)
+           - Neighborhood highlights
+           - Unique selling points
+        4. Call-to-Action: Clear next steps (schedule viewing, contact agent)
+        5. Hashtags: 5-10 relevant real estate hashtags
+        
+        ## Platform-Specific Guidelines
+        ### Instagram:
+        - Use high-quality property images
+        - Caption under 150 words highlighting key features
+        - Include price and location in first line
+        - Use emojis sparingly for emphasis
+        - Hashtags: #realestate #property #location #homesforsale
+        
+        ### Facebook:
+        - Longer description (200-300 words)
+        - Include virtual tour link if available
+        - Highlight community amenities
+        - Use bullet points for key features
+        
+        ### LinkedIn:
+        - Professional tone focusing on investment potential
+        - Include market trends and comparisons
+        - Target investors and professionals
+        - Use statistics and data points
+        
+        ## Required Output
+        {{
+            "image_url": "{property_image_url}",
+            "headline": "Attention-grabbing property title",
+            "description": "Detailed property description...",
+            "cta": "Schedule a viewing today!",
+            "hashtags": ["#realestate", "#property", ...]
+        }}
+        """
+}
+
+# Values used when a form does not supply a variable (the UI has no property inputs)
+PROMPT_DEFAULTS = {
+    "Post Composer": {
+        "properties_data": "Not provided; describe the properties using the products and services above",
+        "property_image_url": "",
+    },
+}
+
+# Variables the callers always pass, so a template that drops one would silently ignore its input
+REQUIRED_VARIABLES = {
+    "insight": ["input", "context"],
+    "insight_batch": ["tasks", "context"],
+    "Post Composer": ["properties_data", "property_image_url"],  # filled per property by batch fan-out
+}
+
+class PromptTemplateError(ValueError):
+    """Raised when a template is not a valid f-string template, or is formatted with missing values"""
+
+def template_variables(name: str, template: str) -> List[str]:
+    """Validate a template as LangChain would and return its variables in order of first use"""
+    variables: List[str] = []
+    try:
+        for _, field, format_spec, _ in Formatter().parse(template):
+            if field is None:
+                continue
+            if not field.isidentifier():
+                raise PromptTemplateError(f"Invalid variable {field!r}; escape literal braces as {{{{ and }}}}")
+            if format_spec and "{" in format_spec:
+                raise PromptTemplateError("Nested replacement fields are not allowed")
+            if field not in variables:
+                variables.append(field)
+        template.format(**{variable: "" for variable in variables})
+    except (ValueError, IndexError, KeyError) as e:
+        raise PromptTemplateError(f"Prompt {name!r}: {str(e)}") from None
+    return variables
+
+class PromptRegistry:
+    """Validated templates by name, with their prompts and per-LLM chains built once"""
+
+    def __init__(self, templates: Dict[str, str], defaults: Optional[Dict[str, Dict[str, str]]] = None,
+                 max_chains: int = PROMPT_CHAIN_CACHE_SIZE, required: Optional[Dict[str, List[str]]] = None):
+        defaults = defaults or {}
+        self.templates = dict(templates)
+        self.variables = {name: template_variables(name, template) for name, template in templates.items()}
+        for name, variables in (required or {}).items():
+            if name not in self.variables:
+                raise PromptTemplateError(f"No prompt template for {name!r}")
+            missing = [variable for variable in variables if variable not in self.variables[name]]
+            if missing:
+                raise PromptTemplateError(f"Prompt {name!r} does not use required variables {', '.join(missing)}")
+        for name, values in defaults.items():
+            unknown = set(values) - set(self.variables.get(name, []))
+            if unknown:
+                raise PromptTemplateError(f"Prompt {name!r}: defaults for unknown variables {sorted(unknown)}")
+        self.defaults = defaults
+        self.max_chains = max_chains
+        self._prompts: Dict[str, "ChatPromptTemplate"] = {}
+        # (prompt name, id(llm)) -> (llm, chain); the llm is kept so its id cannot be reused while cached
+        self._chains: "OrderedDict[Tuple[str, int], Tuple[Any, Runnable]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        return list(self.templates)
+
+    def inputs(self, name: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        """The template's variables filled from values, then defaults; raises when any are missing"""
+        merged = {**self.defaults.get(name, {}), **values}
+        missing = [variable for variable in self.variables[name] if variable not in merged]
+        if missing:
+            raise PromptTemplateError(f"Prompt {name!r} is missing values for {', '.join(missing)}")
+        return {variable: merged[variable] for variable in self.variables[name]}
+
+    def prompt(self, name: str) -> "ChatPromptTemplate":
+        with self._lock:
+            prompt = self._prompts.get(name)
+        if prompt is None:
+            from langchain_core.prompts import ChatPromptTemplate
+
+            prompt = ChatPromptTemplate.from_template(self.templates[name])
+            with self._lock:
+                prompt = self._prompts.setdefault(name, prompt)
+        return prompt
+
+    def format(self, name: str, values: Dict[str, Any]) -> str:
+        """The prompt text as sent (and as keyed in the response cache)"""
+        return self.prompt(name).format(**self.inputs(name, values))
+
+    def chain(self, name: str, llm: Any) -> "Runnable":
+        """The prompt | llm | StrOutputParser runnable for a template, reused for the same LLM instance"""
+        key = (name, id(llm))
+        with self._lock:
+            entry = self._chains.get(key)
+            if entry is not None and entry[0] is llm:
+                self._chains.move_to_end(key)
+                return entry[1]
+
+        from langchain_core.output_parsers import StrOutputParser
+
+        chain = self.prompt(name) | llm | StrOutputParser()
+        with self._lock:
+            self._chains[key] = (llm, chain)
+            self._chains.move_to_end(key)
+            while len(self._chains) > self.max_chains:
+                self._chains.popitem(last=False)
+        return chain
+
+    def clear(self) -> None:
+        with self._lock:
+            self._chains.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"templates": len(self.templates), "prompts_built": len(self._prompts), "chains": len(self._chains)}
+
+missing_tasks = [task for task in Config.MARKETING_TASKS if task not in TASK_PROMPTS]
+if missing_tasks:
+    raise PromptTemplateError(f"No prompt template for tasks: {', '.join(missing_tasks)}")
+
+registry = PromptRegistry(
+    {**TASK_PROMPTS, "insight": INSIGHT_PROMPT_TEMPLATE, "insight_batch": BATCH_INSIGHT_PROMPT_TEMPLATE},
+    PROMPT_DEFAULTS,
+    required=REQUIRED_VARIABLES,
+)
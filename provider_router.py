@@ -0,0 +1,319 @@
+# provider_router.py
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from config import RouterConfig
+from telemetry import LLM_ROUTE_ATTEMPTS, llm_run_config
+
+logger = logging.getLogger(__name__)
+
+class AllProvidersFailed(Exception):
+    """Raised when every endpoint behind a router failed for one request"""
+
+class EndpointStats:
+    """Rolling latency and error window for one endpoint, with a circuit breaker
+
+    The breaker opens for cooldown_seconds after failure_threshold consecutive
+    failures, or when the error rate over the window exceeds max_error_rate.
+    Once the cooldown passes the endpoint is tried again, and one more failure
+    reopens it.
+    """
+
+    def __init__(self, name: str, window: int = RouterConfig.DEFAULT_PARAMS["window"]):
+        self.name = name
+        self.latencies: deque = deque(maxlen=window)
+        self.outcomes: deque = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, ok: bool, seconds: float, params: Dict[str, Any]) -> None:
+        with self._lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(seconds)
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            error_rate = self.outcomes.count(False) / len(self.outcomes)
+            if (self.consecutive_failures >= params["failure_threshold"]
+                    or (len(self.outcomes) >= params["min_samples"] and error_rate > params["max_error_rate"])):
+                self.open_until = time.monotonic() + params["cooldown_seconds"]
+                logger.warning(f"Routing around {self.name} for {params['cooldown_seconds']:g}s "
+                               f"({self.consecutive_failures} consecutive failures, error rate {error_rate:.0%})")
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def samples(self) -> int:
+        with self._lock:
+            return len(self.latencies)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "endpoint": self.name, "available": self.available(), "samples": self.samples(),
+            "p50_seconds": self.quantile(0.5), "p95_seconds": self.quantile(0.95),
+            "error_rate": self.error_rate(), "consecutive_failures": self.consecutive_failures,
+        }
+
+# Stats are kept per endpoint for the whole process, so routers rebuilt on a
+# settings change (or shared across sessions) start from what is already known
+_stats: Dict[str, EndpointStats] = {}
+_stats_lock = threading.Lock()
+_attempt_pool: Optional[ThreadPoolExecutor] = None
+
+def get_endpoint_stats(name: str) -> EndpointStats:
+    with _stats_lock:
+        if name not in _stats:
+            _stats[name] = EndpointStats(name)
+        return _stats[name]
+
+def endpoint_report() -> List[Dict[str, Any]]:
+    """Current health and latency of every endpoint a router has used"""
+    with _stats_lock:
+        stats = list(_stats.values())
+    return [item.snapshot() for item in stats]
+
+def _pool() -> ThreadPoolExecutor:
+    global _attempt_pool
+    with _stats_lock:
+        if _attempt_pool is None:
+            _attempt_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-route")
+        return _attempt_pool
+
+def endpoint_name(llm: Any) -> str:
+    """Identify an LLM client by provider, model and base URL"""
+    from llm_handler import describe_llm, unwrap_llm
+
+    provider, model = describe_llm(llm)
+    llm = unwrap_llm(llm)
+    base_url = getattr(llm, "base_url", None) or getattr(llm, "groq_api_base", None) or ""
+    return f"{provider}:{model}@{base_url}" if base_url else f"{provider}:{model}"
+
+class ProviderRouter(BaseChatModel):
+    """Chat model that sends each request to the fastest healthy of several endpoints
+
+    Endpoints are ranked by median latency weighted by error rate, with
+    endpoints in a cooldown last; until min_samples latencies are recorded an
+    endpoint is assumed to take prior_latency_seconds, and ties keep the
+    configured order. An error fails over to the next endpoint. With hedge on,
+    a second request goes to the next endpoint when the first has not answered
+    within the hedge_percentile of its own latency (prior_latency_seconds until
+    it is measured), and whichever answers first wins. A synchronous losing
+    request cannot be interrupted: it runs to completion on its worker thread
+    and still uses its endpoint's rate-limit quota (async losers are cancelled).
+
+    Streaming uses the ranked order without hedging, and fails over only until
+    the first chunk arrives; an error after that is raised to the caller.
+    """
+
+    models: List[BaseChatModel]
+    names: List[str]
+    model_name: str = ""
+    params: Dict[str, Any] = {}
+
+    @classmethod
+    def from_models(cls, models: List[BaseChatModel], **params: Any) -> "ProviderRouter":
+        names = [endpoint_name(model) for model in models]
+        return cls(models=models, names=names, model_name=",".join(names),
+                   params={**RouterConfig.DEFAULT_PARAMS, **params})
+
+    @property
+    def _llm_type(self) -> str:
+        return "provider-router"
+
+    def ranked(self) -> List[int]:
+        """Endpoint indexes in the order they should be tried"""
+        def rank(i: int) -> Tuple[bool, float, int]:
+            stats = get_endpoint_stats(self.names[i])
+            if stats.samples() < self.params["min_samples"]:
+                expected = self.params["prior_latency_seconds"]
+            else:
+                expected = stats.quantile(0.5) * (1 + stats.error_rate())
+            return not stats.available(), expected, i
+        return sorted(range(len(self.models)), key=rank)
+
+    def hedge_delay(self, i: int) -> Optional[float]:
+        if not self.params["hedge"]:
+            return None
+        stats = get_endpoint_stats(self.names[i])
+        if stats.samples() < self.params["min_samples"]:
+            return self.params["prior_latency_seconds"]
+        return stats.quantile(self.params["hedge_percentile"])
+
+    def _record(self, i: int, ok: bool, seconds: float, outcome: str) -> None:
+        get_endpoint_stats(self.names[i]).record(ok, seconds, self.params)
+        LLM_ROUTE_ATTEMPTS.inc(endpoint=self.names[i], outcome=outcome)
+
+    def _attempt(self, i: int, messages: List[BaseMessage], stop: Optional[List[str]],
+                 kwargs: Dict[str, Any]) -> BaseMessage:
+        start = time.perf_counter()
+        try:
+            message = self.models[i].invoke(messages, config=llm_run_config(self.models[i]), stop=stop, **kwargs)
+        except Exception:
+            self._record(i, False, time.perf_counter() - start, "error")
+            raise
+        self._record(i, True, time.perf_counter() - start, "ok")
+        return message
+
+    async def _aattempt(self, i: int, messages: List[BaseMessage], stop: Optional[List[str]],
+                        kwargs: Dict[str, Any]) -> BaseMessage:
+        start = time.perf_counter()
+        try:
+            message = await self.models[i].ainvoke(messages, config=llm_run_config(self.models[i]), stop=stop, **kwargs)
+        except asyncio.CancelledError:
+            LLM_ROUTE_ATTEMPTS.inc(endpoint=self.names[i], outcome="cancelled")
+            raise
+        except Exception:
+            self._record(i, False, time.perf_counter() - start, "error")
+            raise
+        self._record(i, True, time.perf_counter() - start, "ok")
+        return message
+
+    def _result(self, i: int, message: BaseMessage) -> ChatResult:
+        if not isinstance(message, AIMessage):
+            message = AIMessage(content=message.content)
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"endpoint": self.names[i]})
+
+    def _chunk(self, chunk: BaseMessage) -> ChatGenerationChunk:
+        if not isinstance(chunk, AIMessageChunk):
+            chunk = AIMessageChunk(content=chunk.content)
+        return ChatGenerationChunk(message=chunk)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        errors: List[str] = []
+        for i in self.ranked():
+            start = time.perf_counter()
+            started = False
+            try:
+                for chunk in self.models[i].stream(
+                    messages, config=llm_run_config(self.models[i]), stop=stop, **kwargs
+                ):
+                    started = True
+                    yield self._chunk(chunk)
+            except Exception as e:
+                self._record(i, False, time.perf_counter() - start, "error")
+                if started:
+                    raise
+                logger.warning(f"{self.names[i]} failed: {str(e)}")
+                errors.append(f"{self.names[i]}: {str(e)}")
+                continue
+            self._record(i, True, time.perf_counter() - start, "ok")
+            return
+        raise AllProvidersFailed("; ".join(errors))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        errors: List[str] = []
+        for i in self.ranked():
+            start = time.perf_counter()
+            started = False
+            try:
+                async for chunk in self.models[i].astream(
+                    messages, config=llm_run_config(self.models[i]), stop=stop, **kwargs
+                ):
+                    started = True
+                    yield self._chunk(chunk)
+            except asyncio.CancelledError:
+                LLM_ROUTE_ATTEMPTS.inc(endpoint=self.names[i], outcome="cancelled")
+                raise
+            except Exception as e:
+                self._record(i, False, time.perf_counter() - start, "error")
+                if started:
+                    raise
+                logger.warning(f"{self.names[i]} failed: {str(e)}")
+                errors.append(f"{self.names[i]}: {str(e)}")
+                continue
+            self._record(i, True, time.perf_counter() - start, "ok")
+            return
+        raise AllProvidersFailed("; ".join(errors))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        remaining = self.ranked()
+        running: Dict[Future, int] = {}
+        errors: List[str] = []
+        hedged = False
+
+        def launch() -> None:
+            i = remaining.pop(0)
+            # A hedge loser keeps running here after the winner returns (threads cannot be interrupted)
+            # Run in a copy of the caller's context so its request priority carries over
+            context = contextvars.copy_context()
+            running[_pool().submit(context.run, self._attempt, i, messages, stop, kwargs)] = i
+
+        launch()
+        while running:
+            delay = None if hedged or not remaining else self.hedge_delay(next(iter(running.values())))
+            done, _ = wait(running, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.info(f"Hedging {self.names[next(iter(running.values()))]} with {self.names[remaining[0]]}")
+                hedged = True
+                launch()
+                continue
+            for future in done:
+                i = running.pop(future)
+                try:
+                    return self._result(i, future.result())
+                except Exception as e:
+                    logger.warning(f"{self.names[i]} failed: {str(e)}")
+                    errors.append(f"{self.names[i]}: {str(e)}")
+            if not running and remaining:
+                launch()
+        raise AllProvidersFailed("; ".join(errors))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        remaining = self.ranked()
+        running: Dict[asyncio.Task, int] = {}
+        errors: List[str] = []
+        hedged = False
+
+        def launch() -> None:
+            i = remaining.pop(0)
+            running[asyncio.ensure_future(self._aattempt(i, messages, stop, kwargs))] = i
+
+        launch()
+        try:
+            while running:
+                delay = None if hedged or not remaining else self.hedge_delay(next(iter(running.values())))
+                done, _ = await asyncio.wait(running, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Hedging {self.names[next(iter(running.values()))]} with {self.names[remaining[0]]}")
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    i = running.pop(task)
+                    try:
+                        return self._result(i, task.result())
+                    except Exception as e:
+                        logger.warning(f"{self.names[i]} failed: {str(e)}")
+                        errors.append(f"{self.names[i]}: {str(e)}")
+                if not running and remaining:
+                    launch()
+        finally:
+            # The losing side of a hedge is no longer needed
+            for task in running:
+                task.cancel()
+        raise AllProvidersFailed("; ".join(errors))
@@ -0,0 +1,421 @@
+# rate_limiter.py
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+import contextvars
+from email.utils import parsedate_to_datetime
+from contextlib import contextmanager
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from config import RateLimitConfig
+from telemetry import LLM_QUEUE_SECONDS, LLM_RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+RETRYABLE_ERROR_TYPES = {"APIConnectionError", "TransportError", "ConnectionError", "TimeoutError"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+@contextmanager
+def request_priority(priority: int) -> Iterator[None]:
+    """Queue LLM calls made inside the block at the given priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class QueueClock:
+    """Time spent queued in a limiter, including a wait still in progress"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._waiting_since: Optional[float] = None
+
+    def total(self) -> float:
+        since = self._waiting_since
+        return self.seconds + (time.monotonic() - since if since is not None else 0.0)
+
+_queue_clock: contextvars.ContextVar[Optional[QueueClock]] = contextvars.ContextVar("queue_clock", default=None)
+
+async def wait_for_excluding_queue(awaitable: Awaitable[T], timeout: float) -> T:
+    """Like asyncio.wait_for, but time spent queued in a rate limiter does not count
+
+    Raises asyncio.TimeoutError once the call has spent timeout seconds outside
+    the queue, so work that is only waiting for quota is not dropped.
+    """
+    clock = QueueClock()
+    token = _queue_clock.set(clock)
+    try:
+        task = asyncio.ensure_future(awaitable)  # copies the context, so the task shares clock
+    finally:
+        _queue_clock.reset(token)
+    start = time.monotonic()
+    try:
+        while not task.done():
+            remaining = timeout + clock.total() - (time.monotonic() - start)
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            await asyncio.wait({task}, timeout=remaining)
+        return task.result()
+    finally:
+        if not task.done():
+            task.cancel()
+
+class TokenBucket:
+    """Per-minute quota refilled continuously; a limit of 0 means unlimited"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (amount is capped at the capacity)"""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing * 60.0 / self.capacity)
+
+    def take(self, amount: float) -> None:
+        # May go negative when a response used more than was reserved; the debt delays later calls
+        if self.capacity:
+            self.tokens -= amount
+
+class RateLimiter:
+    """Requests/min and tokens/min buckets with AIMD concurrency for one provider and model
+
+    Calls wait in a priority queue (then FIFO) until they reach its head, a
+    concurrency slot is free, any Retry-After block has passed and both buckets
+    have room. The concurrency limit grows by about one per window of
+    successful calls and halves on a 429 (at most once per
+    decrease_interval_seconds), so throughput settles just under the quota.
+    """
+
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0,
+                 params: Dict[str, Any] = RateLimitConfig.DEFAULT_PARAMS):
+        self.name = name
+        self.params = params
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limit = float(params["initial_concurrency"])
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self._queue: List[Tuple[int, int]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def _try_admit(self, ticket: Tuple[int, int], amount: float) -> Optional[float]:
+        """Admit ticket if it can run now (caller holds the lock), else return seconds to wait"""
+        now = time.monotonic()
+        if self._queue[0] != ticket:
+            return 1.0  # woken when the head leaves the queue
+        if self.in_flight >= int(self.limit):
+            return 1.0  # woken on release
+        delay = max(
+            self.blocked_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(amount, now),
+        )
+        if delay > 0:
+            return delay
+        heapq.heappop(self._queue)
+        self.in_flight += 1
+        self.requests.take(1)
+        self.tokens.take(amount)
+        self._cond.notify_all()
+        return None
+
+    def _enqueue(self) -> Tuple[int, int]:
+        ticket = (_priority.get(), next(self._counter))
+        heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _dequeue(self, ticket: Tuple[int, int]) -> None:
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+
+    @contextmanager
+    def _queued(self) -> Iterator[None]:
+        clock = _queue_clock.get()
+        start = time.monotonic()
+        if clock is not None:
+            clock._waiting_since = start
+        try:
+            yield
+        finally:
+            waited = time.monotonic() - start
+            if clock is not None:
+                clock._waiting_since = None
+                clock.seconds += waited
+            LLM_QUEUE_SECONDS.observe(waited, limiter=self.name)
+
+    def acquire(self, amount: float) -> None:
+        """Block until a call estimated at amount tokens may start"""
+        with self._queued(), self._cond:
+            ticket = self._enqueue()
+            try:
+                while True:
+                    delay = self._try_admit(ticket, amount)
+                    if delay is None:
+                        return
+                    self._cond.wait(delay)
+            except BaseException:
+                self._dequeue(ticket)
+                raise
+
+    async def aacquire(self, amount: float) -> None:
+        """Async acquire; the wait polls so the event loop is never blocked"""
+        with self._queued():
+            with self._cond:
+                ticket = self._enqueue()
+            try:
+                while True:
+                    with self._cond:
+                        delay = self._try_admit(ticket, amount)
+                    if delay is None:
+                        return
+                    await asyncio.sleep(min(delay, self.params["async_poll_seconds"]))
+            except BaseException:
+                with self._cond:
+                    self._dequeue(ticket)
+                raise
+
+    def release(self, reserved: float, used: Optional[float] = None, rate_limited: bool = False,
+                retry_after: Optional[float] = None) -> None:
+        """Free the slot, settle the token reservation and adjust the concurrency limit"""
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if used is not None:
+                self.tokens.take(used - reserved)
+            if rate_limited:
+                wait = retry_after if retry_after is not None else self.params["backoff_seconds"]
+                self.blocked_until = max(self.blocked_until, now + wait)
+                if now - self.last_decrease >= self.params["decrease_interval_seconds"]:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.last_decrease = now
+                logger.warning(f"{self.name} rate limited; waiting {wait:.1f}s, concurrency limit {int(self.limit)}")
+            elif used is not None:
+                self.limit = min(float(self.params["max_concurrency"]), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "limiter": self.name, "concurrency_limit": int(self.limit), "in_flight": self.in_flight,
+                "queued": len(self._queue), "blocked_seconds": max(0.0, self.blocked_until - time.monotonic()),
+            }
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider: str, model: str) -> RateLimiter:
+    """Process-wide limiter for a provider and model, using the most specific configured limits"""
+    name = f"{provider}:{model}"
+    with _limiters_lock:
+        if name not in _limiters:
+            limits = RateLimitConfig.DEFAULT_PARAMS["limits"]
+            quota = limits.get(name) or limits.get(provider) or {}
+            _limiters[name] = RateLimiter(name, quota.get("rpm", 0), quota.get("tpm", 0))
+        return _limiters[name]
+
+def limiter_report() -> List[Dict[str, Any]]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.snapshot() for limiter in limiters]
+
+def classify_error(error: Exception) -> Tuple[str, Optional[float]]:
+    """Return ("rate_limited" | "retryable" | "fatal", Retry-After seconds) for a provider error"""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status == 429:
+        return "rate_limited", _retry_after(getattr(response, "headers", None) or {})
+    if status in RETRYABLE_STATUSES or any(cls.__name__ in RETRYABLE_ERROR_TYPES for cls in type(error).__mro__):
+        return "retryable", None
+    return "fatal", None
+
+def _retry_after(headers: Any) -> Optional[float]:
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _usage(message: BaseMessage) -> Optional[int]:
+    usage = getattr(message, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+class RateLimitedModel(BaseChatModel):
+    """Chat model wrapper that runs every call through its provider and model's RateLimiter
+
+    429s and transient errors are retried (after Retry-After, or with
+    exponential backoff) up to max_attempts; only then is the error raised.
+    Behind a ProviderRouter retry_transient is off, so transient errors fail
+    over to another endpoint straight away instead.
+    The token reservation is the prompt size, settled against the reported
+    usage when the response arrives.
+    """
+
+    wrapped: BaseChatModel
+    limiter_name: str = ""
+    retry_transient: bool = True
+
+    @classmethod
+    def wrap(cls, llm: BaseChatModel, retry_transient: bool = True) -> "RateLimitedModel":
+        from llm_handler import describe_llm
+
+        provider, model = describe_llm(llm)
+        return cls(wrapped=llm, limiter_name=f"{provider}:{model}", retry_transient=retry_transient)
+
+    @property
+    def _llm_type(self) -> str:
+        return "rate-limited"
+
+    @property
+    def limiter(self) -> RateLimiter:
+        return get_limiter(*self.limiter_name.split(":", 1))
+
+    def _reserve(self, messages: List[BaseMessage]) -> float:
+        characters = sum(len(str(message.content)) for message in messages)
+        return characters / RateLimitConfig.DEFAULT_PARAMS["chars_per_token"]
+
+    def _should_retry(self, error: Exception, attempt: int, reserved: float) -> bool:
+        kind, retry_after = classify_error(error)
+        self.limiter.release(reserved, rate_limited=kind == "rate_limited", retry_after=retry_after)
+        if kind == "rate_limited":
+            LLM_RATE_LIMITED.inc(limiter=self.limiter_name)
+        if kind == "fatal" or attempt >= RateLimitConfig.DEFAULT_PARAMS["max_attempts"]:
+            return False
+        if kind == "retryable" and not self.retry_transient:
+            return False
+        logger.warning(f"{self.limiter_name} call failed ({kind}), retrying: {str(error)}")
+        return True
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Rate-limited retries wait in the limiter instead, behind the Retry-After block
+        if classify_error(error)[0] == "rate_limited":
+            return 0.0
+        return RateLimitConfig.DEFAULT_PARAMS["backoff_seconds"] * 2 ** (attempt - 1)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        reserved = self._reserve(messages)
+        attempt = 0
+        while True:
+            attempt += 1
+            self.limiter.acquire(reserved)
+            try:
+                message = self.wrapped.invoke(messages, stop=stop, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt, reserved):
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                continue
+            self.limiter.release(reserved, used=_usage(message) or reserved)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        reserved = self._reserve(messages)
+        attempt = 0
+        while True:
+            attempt += 1
+            await self.limiter.aacquire(reserved)
+            try:
+                message = await self.wrapped.ainvoke(messages, stop=stop, **kwargs)
+            except asyncio.CancelledError:
+                self.limiter.release(reserved)
+                raise
+            except Exception as e:
+                if not self._should_retry(e, attempt, reserved):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+            self.limiter.release(reserved, used=_usage(message) or reserved)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        """Stream through the limiter; errors before the first chunk are retried like invoke"""
+        reserved = self._reserve(messages)
+        attempt = 0
+        while True:
+            attempt += 1
+            self.limiter.acquire(reserved)
+            used = None
+            started = False
+            try:
+                for chunk in self.wrapped.stream(messages, stop=stop, **kwargs):
+                    started = True
+                    used = _usage(chunk) or used
+                    yield ChatGenerationChunk(message=chunk if isinstance(chunk, AIMessageChunk)
+                                              else AIMessageChunk(content=chunk.content))
+            except GeneratorExit:
+                self.limiter.release(reserved)
+                raise
+            except Exception as e:
+                if started:
+                    self.limiter.release(reserved)
+                    raise
+                if not self._should_retry(e, attempt, reserved):
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                continue
+            self.limiter.release(reserved, used=used or reserved)
+            return
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        reserved = self._reserve(messages)
+        attempt = 0
+        while True:
+            attempt += 1
+            await self.limiter.aacquire(reserved)
+            used = None
+            started = False
+            try:
+                async for chunk in self.wrapped.astream(messages, stop=stop, **kwargs):
+                    started = True
+                    used = _usage(chunk) or used
+                    yield ChatGenerationChunk(message=chunk if isinstance(chunk, AIMessageChunk)
+                                              else AIMessageChunk(content=chunk.content))
+            except (GeneratorExit, asyncio.CancelledError):
+                self.limiter.release(reserved)
+                raise
+            except Exception as e:
+                if started:
+                    self.limiter.release(reserved)
+                    raise
+                if not self._should_retry(e, attempt, reserved):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+            self.limiter.release(reserved, used=used or reserved)
+            return
@@ -0,0 +1,306 @@
+# telemetry.py
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+from config import TELEMETRY_ENABLED, TELEMETRY_LOG_PATH, METRICS_HOST, METRICS_PORT
+
+if TYPE_CHECKING:
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_core.outputs import LLMResult
+
+logger = logging.getLogger(__name__)
+
+# Span records go to their own logger as one JSON object per line
+span_logger = logging.getLogger("telemetry.spans")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+T = TypeVar("T")
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, in the Prometheus layout"""
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self, **labels: Any) -> Dict[str, Any]:
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return {"count": series["count"], "sum": series["sum"]} if series else {"count": 0, "sum": 0.0}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']:g}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+STAGE_DURATION = Histogram("crawl_stage_duration_seconds", "Time spent in each pipeline stage")
+STAGE_ERRORS = Counter("crawl_stage_errors_total", "Pipeline stage runs that raised")
+LLM_REQUESTS = Counter("crawl_llm_requests_total", "LLM calls per provider and model")
+LLM_TOKENS = Counter("crawl_llm_tokens_total", "LLM prompt and completion tokens per provider and model")
+LLM_ROUTE_ATTEMPTS = Counter("crawl_llm_route_attempts_total", "Routed LLM attempts per endpoint and outcome")
+LLM_RATE_LIMITED = Counter("crawl_llm_rate_limited_total", "LLM calls rejected with HTTP 429 per limiter")
+LLM_QUEUE_SECONDS = Histogram("crawl_llm_queue_seconds", "Time LLM calls waited in the client-side rate limiter")
+CONTEXT_TOKENS = Counter("crawl_context_tokens_total", "RAG context tokens packed into prompts, and saved by packing")
+METRICS = [
+    STAGE_DURATION, STAGE_ERRORS, LLM_REQUESTS, LLM_TOKENS, LLM_ROUTE_ATTEMPTS, LLM_RATE_LIMITED, LLM_QUEUE_SECONDS,
+    CONTEXT_TOKENS,
+]
+
+def render_metrics() -> str:
+    """Render every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Spans
+
+_current_span: contextvars.ContextVar[Optional[Dict[str, str]]] = contextvars.ContextVar("current_span", default=None)
+
+def _emit(record: Dict[str, Any]) -> None:
+    if span_logger.isEnabledFor(logging.INFO):
+        span_logger.info(json.dumps(record, default=str))
+
+def record_duration(stage: str, seconds: float, status: str = "ok", **attributes: Any) -> None:
+    """Record a stage duration measured by the caller, e.g. time accumulated across a generator"""
+    if not TELEMETRY_ENABLED:
+        return
+    STAGE_DURATION.observe(seconds, stage=stage)
+    if status != "ok":
+        STAGE_ERRORS.inc(stage=stage)
+    parent = _current_span.get()
+    _emit({
+        "event": "span", "stage": stage, "status": status,
+        "duration_ms": round(seconds * 1000, 3), "timestamp": time.time(),
+        "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+        "span_id": uuid.uuid4().hex[:16], "parent_id": parent["span_id"] if parent else None,
+        **attributes,
+    })
+
+@contextmanager
+def span(stage: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """Time a pipeline stage, nesting under the enclosing span
+
+    Yields a dict the caller can add attributes to; they are included in the
+    span's JSON log record. Exceptions are recorded and re-raised.
+    """
+    if not TELEMETRY_ENABLED:
+        yield attributes
+        return
+
+    parent = _current_span.get()
+    context = {
+        "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+        "span_id": uuid.uuid4().hex[:16],
+    }
+    token = _current_span.set(context)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except BaseException as e:
+        status = "error"
+        attributes["error"] = str(e) or type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _current_span.reset(token)
+        STAGE_DURATION.observe(seconds, stage=stage)
+        if status != "ok":
+            STAGE_ERRORS.inc(stage=stage)
+        _emit({
+            "event": "span", "stage": stage, "status": status,
+            "duration_ms": round(seconds * 1000, 3), "timestamp": time.time(),
+            "trace_id": context["trace_id"], "span_id": context["span_id"],
+            "parent_id": parent["span_id"] if parent else None,
+            **attributes,
+        })
+
+def timed_iter(stage: str, iterable: Iterable[T], **attributes: Any) -> Iterator[T]:
+    """Yield from iterable, recording the time spent producing items as one stage duration"""
+    iterator = iter(iterable)
+    total = 0.0
+    items = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                total += time.perf_counter() - start
+                break
+            total += time.perf_counter() - start
+            items += 1
+            yield item
+    except Exception:
+        record_duration(stage, total, status="error", items=items, **attributes)
+        raise
+    record_duration(stage, total, items=items, **attributes)
+
+# Token usage
+
+@functools.lru_cache(maxsize=None)
+def _token_usage_handler_class() -> type:
+    """Define the callback class on first use, keeping langchain_core off the import path of this module"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenUsageHandler(BaseCallbackHandler):
+        """Callback that counts LLM calls and prompt/completion tokens for one provider and model"""
+
+        def __init__(self, provider: str, model: str):
+            self.provider = provider
+            self.model = model
+
+        def on_llm_end(self, response: "LLMResult", **kwargs: Any) -> None:
+            prompt_tokens, completion_tokens = _token_usage(response)
+            LLM_REQUESTS.inc(provider=self.provider, model=self.model)
+            if prompt_tokens:
+                LLM_TOKENS.inc(prompt_tokens, provider=self.provider, model=self.model, type="prompt")
+            if completion_tokens:
+                LLM_TOKENS.inc(completion_tokens, provider=self.provider, model=self.model, type="completion")
+
+    return TokenUsageHandler
+
+def token_usage_handler(provider: str, model: str) -> "BaseCallbackHandler":
+    """Callback that counts LLM calls and prompt/completion tokens for one provider and model"""
+    return _token_usage_handler_class()(provider, model)
+
+def _token_usage(response: "LLMResult") -> Tuple[int, int]:
+    """Read token counts from message usage_metadata, falling back to llm_output"""
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+    if not (prompt_tokens or completion_tokens):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+def llm_run_config(llm: Any, **config: Any) -> Dict[str, Any]:
+    """Runnable config that attaches token accounting for llm; extra keys are passed through"""
+    if not TELEMETRY_ENABLED:
+        return config
+    from llm_handler import describe_llm
+
+    provider, model = describe_llm(llm)
+    if provider == "Router":
+        return config  # the router attaches accounting to each endpoint it calls
+    return {**config, "callbacks": [token_usage_handler(provider, model)]}
+
+# Export
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on a daemon thread (once per process); port 0 disables the endpoint"""
+    global _server
+    if not TELEMETRY_ENABLED or not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                logger.warning(f"Metrics endpoint unavailable on {host}:{port}: {str(e)}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return _server
+
+def configure_span_log(path: Optional[str] = TELEMETRY_LOG_PATH) -> None:
+    """Write span records as JSON lines to path instead of the normal log output"""
+    if not path or any(getattr(h, "_telemetry", False) for h in span_logger.handlers):
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler._telemetry = True
+    span_logger.addHandler(handler)
+    span_logger.setLevel(logging.INFO)
+    span_logger.propagate = False
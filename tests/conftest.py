@@ -0,0 +1,11 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+# The app modules live at the repository root and read their settings at import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="crawl-tests-"))
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ.setdefault("TELEMETRY_ENABLED", "0")
+os.environ.setdefault("PRELOAD_IMPORTS", "0")
@@ -0,0 +1,48 @@
+# tests/test_content_generator.py
+import pytest
+import ui
+from content_generator import fan_out
+
+FORM = {"brand_description": "Seaside homes", "tone": "Friendly"}
+PROPERTIES = [{"title": "Sea view flat", "price": "$1,000", "image_url": "/img/1.jpg"}, {"price": "$2,000"}]
+
+def test_fan_out_expands_only_tone_aware_tasks_over_tones():
+    items = fan_out(FORM, ["Campaign Strategy", "Marketing Strategy"], ["Formal", "Playful"])
+    assert [(item["label"], item["form_data"]["tone"]) for item in items] == [
+        ("Campaign Strategy (Formal)", "Formal"),
+        ("Campaign Strategy (Playful)", "Playful"),
+        ("Marketing Strategy", "Friendly"),
+    ]
+
+def test_fan_out_gives_post_composer_one_item_per_property_and_tone():
+    items = fan_out(FORM, ["Post Composer", "SEO Optimization Strategy"], ["Formal", "Playful"], PROPERTIES)
+    assert [item["label"] for item in items] == [
+        "Post Composer (Formal): Sea view flat",
+        "Post Composer (Formal): Property 2",
+        "Post Composer (Playful): Sea view flat",
+        "Post Composer (Playful): Property 2",
+        "SEO Optimization Strategy",
+    ]
+    first = items[0]["form_data"]
+    assert first["property_image_url"] == "/img/1.jpg" and "Price: $1,000" in first["properties_data"]
+    assert "properties_data" not in items[-1]["form_data"]
+
+def test_fan_out_without_tones_keeps_the_form_tone():
+    items = fan_out(FORM, ["Campaign Strategy"])
+    assert [(item["label"], item["form_data"]["tone"]) for item in items] == [("Campaign Strategy", "Friendly")]
+
+class _SessionState(dict):
+    __getattr__ = dict.__getitem__
+
+@pytest.mark.parametrize("selected, tones, expected", [
+    ([], [], []),
+    (["Marketing Strategy"], [], []),
+    (["Campaign Strategy"], [], ["Campaign Strategy"]),
+    ([], ["Formal"], ["Marketing Strategy"]),
+    (["Marketing Strategy", "Campaign Strategy"], [], ["Marketing Strategy", "Campaign Strategy"]),
+])
+def test_batch_selection_keeps_a_single_task_other_than_the_sidebar_task(monkeypatch, selected, tones, expected):
+    state = _SessionState(batch_tasks_input=selected, batch_tones_input=tones)
+    monkeypatch.setattr(ui.st, "session_state", state)
+    tasks, _, _ = ui.get_batch_selection("Marketing Strategy")
+    assert tasks == expected
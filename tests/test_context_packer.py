@@ -0,0 +1,19 @@
+# tests/test_context_packer.py
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from config import ContextConfig
+from context_packer import context_budget, context_window
+from provider_router import ProviderRouter
+
+class _Endpoint(FakeListChatModel):
+    model_name: str
+    max_tokens: int
+
+def test_router_uses_its_tightest_endpoint():
+    router = ProviderRouter.from_models([
+        _Endpoint(responses=["ok"], model_name="llama-3.3-70b-versatile", max_tokens=512),
+        _Endpoint(responses=["ok"], model_name="mixtral-8x7b-32768", max_tokens=1024),
+    ])
+    windows = ContextConfig.DEFAULT_PARAMS["context_windows"]
+    assert context_window(router) == windows["mixtral-8x7b"]
+    budget = context_budget(router, "prompt", 10 ** 6, count_tokens=lambda text: 100)
+    assert budget == windows["mixtral-8x7b"] - 1024 - 100
@@ -0,0 +1,37 @@
+# tests/test_corpus.py
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from ann_index import index_type_of
+from config import IndexConfig
+from corpus import DocumentCorpus
+from index_store import IndexStore
+
+def make_document(name: str, paragraphs: int) -> bytes:
+    text = "\n\n".join(
+        f"{name} paragraph {i}: " + " ".join(f"{name}{i}word{j}" for j in range(120)) for i in range(paragraphs)
+    )
+    return text.encode("utf-8")
+
+def assert_consistent(corpus: DocumentCorpus) -> None:
+    store = corpus.vector_store
+    assert sorted(store.index_to_docstore_id) == list(range(store.index.ntotal))
+    for chunk_id in store.index_to_docstore_id.values():
+        assert store.docstore.search(chunk_id).metadata["doc_id"] in corpus.manifest
+
+def test_add_remove_search_add_on_ivf(tmp_path, monkeypatch):
+    monkeypatch.setitem(IndexConfig.DEFAULT_PARAMS, "flat_max_vectors", 100)
+    corpus = DocumentCorpus(DeterministicFakeEmbedding(size=32), IndexStore(str(tmp_path)))
+
+    first, _ = corpus.add_document(make_document("alpha", 150), "alpha.txt")
+    second, _ = corpus.add_document(make_document("beta", 150), "beta.txt")
+    assert index_type_of(corpus.vector_store.index) == "ivf"
+
+    corpus.remove_document(first)
+    assert_consistent(corpus)
+    results = corpus.vector_store.similarity_search("beta paragraph 3", k=10)
+    assert results and {doc.metadata["doc_id"] for doc in results} == {second}
+
+    third, _ = corpus.add_document(make_document("gamma", 150), "gamma.txt")
+    assert_consistent(corpus)
+    results = corpus.vector_store.similarity_search("gamma paragraph 3", k=50)
+    assert {doc.metadata["doc_id"] for doc in results} <= {second, third}
+    assert corpus.vector_store.index.ntotal == sum(len(entry["chunk_ids"]) for entry in corpus.manifest.values())
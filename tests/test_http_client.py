@@ -0,0 +1,100 @@
+# tests/test_http_client.py
+import time
+from types import SimpleNamespace
+from typing import List, Optional
+import pytest
+import http_client
+from http_client import ModelListCache, ModelListError
+
+class _Fetcher:
+    """Stub fetch function recording its calls; raises while error is set"""
+
+    def __init__(self):
+        self.calls: List[tuple] = []
+        self.error: Optional[Exception] = None
+        self.version = 1
+
+    def __call__(self, provider: str, endpoint: str, api_key: Optional[str] = None) -> List[str]:
+        self.calls.append((provider, endpoint, api_key))
+        if self.error is not None:
+            raise self.error
+        return [f"{provider}-model-v{self.version}"]
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(http_client, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+@pytest.fixture
+def fetcher():
+    return _Fetcher()
+
+def make_cache(fetcher: _Fetcher) -> ModelListCache:
+    return ModelListCache(ttl_seconds=60, error_ttl_seconds=10, max_stale_seconds=120, fetcher=fetcher)
+
+def wait_for_calls(fetcher: _Fetcher, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while len(fetcher.calls) < count:
+        assert time.monotonic() < deadline, "background refresh did not run"
+        time.sleep(0.01)
+
+def test_fresh_lists_are_served_from_the_cache_until_the_ttl(clock, fetcher):
+    cache = make_cache(fetcher)
+    assert cache.get("Groq", "https://api.groq.com", "key") == ["Groq-model-v1"]
+    clock[0] += 59
+    assert cache.get("Groq", "https://api.groq.com", "key") == ["Groq-model-v1"]
+    assert len(fetcher.calls) == 1
+
+    fetcher.version = 2
+    clock[0] += 121 + 60  # past the stale window too, so the fetch happens in the caller
+    assert cache.get("Groq", "https://api.groq.com", "key") == ["Groq-model-v2"]
+    assert len(fetcher.calls) == 2
+
+def test_stale_list_is_served_while_refreshing_in_the_background(clock, fetcher):
+    cache = make_cache(fetcher)
+    cache.get("Ollama", "http://localhost:11434")
+    fetcher.version = 2
+    clock[0] += 61
+    assert cache.get("Ollama", "http://localhost:11434") == ["Ollama-model-v1"]
+    wait_for_calls(fetcher, 2)
+    deadline = time.monotonic() + 5
+    while cache.get("Ollama", "http://localhost:11434") != ["Ollama-model-v2"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_failed_fetch_is_cached_for_the_error_ttl(clock, fetcher):
+    cache = make_cache(fetcher)
+    fetcher.error = ConnectionError("connection refused")
+    for _ in range(2):
+        with pytest.raises(ModelListError, match="connection refused"):
+            cache.get("Ollama", "http://localhost:11434")
+    assert len(fetcher.calls) == 1
+
+    fetcher.error = None
+    clock[0] += 9
+    with pytest.raises(ModelListError):
+        cache.get("Ollama", "http://localhost:11434")
+    clock[0] += 1
+    assert cache.get("Ollama", "http://localhost:11434") == ["Ollama-model-v1"]
+    assert len(fetcher.calls) == 2
+
+def test_entries_are_kept_per_provider_base_url_and_api_key(clock, fetcher):
+    cache = make_cache(fetcher)
+    cache.get("Ollama", "http://localhost:11434")
+    cache.get("Ollama", "http://localhost:11434/")  # same endpoint
+    cache.get("Ollama", "http://gpu-box:11434")
+    cache.get("Groq", "http://localhost:11434")
+    cache.get("Groq", "http://localhost:11434", "other-key")
+    assert [call[:2] for call in fetcher.calls] == [
+        ("Ollama", "http://localhost:11434"),
+        ("Ollama", "http://gpu-box:11434"),
+        ("Groq", "http://localhost:11434"),
+        ("Groq", "http://localhost:11434"),
+    ]
+
+    fetcher.error = ConnectionError("down")
+    with pytest.raises(ModelListError):
+        cache.get("Ollama", "http://other:11434")
+    assert cache.get("Ollama", "http://localhost:11434") == ["Ollama-model-v1"]
+    assert not any("other-key" in part for key in cache._entries for part in key)
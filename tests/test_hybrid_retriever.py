@@ -0,0 +1,22 @@
+# tests/test_hybrid_retriever.py
+from hybrid_retriever import BM25Index
+
+def test_remove_only_drops_the_documents_postings():
+    index = BM25Index()
+    index.add("a", "sea view flat with balcony")
+    index.add("b", "garden flat near the sea")
+    index.remove("a")
+    assert "balcony" not in index.postings
+    assert index.postings["sea"] == {"b": 1}
+    assert [doc_id for doc_id, _ in index.search("sea flat", 5)] == ["b"]
+    assert index.total_length == index.doc_lengths["b"]
+
+def test_readding_a_document_replaces_its_terms():
+    index = BM25Index()
+    index.add("a", "sea view")
+    copy = index.copy()
+    index.add("a", "garden view")
+    assert "sea" not in index.postings and index.search("garden", 5)[0][0] == "a"
+    copy.remove("a")
+    assert not copy.postings
+    assert index.doc_terms["a"] == {"garden", "view"}
@@ -0,0 +1,59 @@
+# tests/test_index_store.py
+import os
+import time
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import index_store
+from file_utils import path_size
+from index_store import IndexStore, index_key
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=16)
+
+def make_store(*texts: str) -> FAISS:
+    return FAISS.from_texts(list(texts), EMBEDDINGS)
+
+def test_save_load_round_trip(tmp_path):
+    store = IndexStore(str(tmp_path))
+    store.save("doc", make_store("sea view flat", "garden villa"), "sea view flat\n\ngarden villa")
+
+    vector_store, content = store.load("doc", EMBEDDINGS)
+    assert content == "sea view flat\n\ngarden villa"
+    assert vector_store.index.ntotal == 2
+    assert vector_store.similarity_search("garden villa", k=1)[0].page_content == "garden villa"
+    assert store.load("missing", EMBEDDINGS) is None
+
+def test_unreadable_entry_is_discarded(tmp_path):
+    store = IndexStore(str(tmp_path))
+    os.makedirs(tmp_path / "broken")
+    assert store.load("broken", EMBEDDINGS) is None
+    assert not (tmp_path / "broken").exists()
+
+@pytest.mark.parametrize("setting, value", [
+    ("EMBEDDING_MODEL", "another-model"),
+    ("EMBEDDING_BACKEND", "another-backend"),
+    ("DEFAULT_CHUNK_SIZE", 123),
+    ("DEFAULT_CHUNK_OVERLAP", 7),
+])
+def test_key_changes_with_index_settings(monkeypatch, setting, value):
+    before = index_key(b"document", "brochure.pdf")
+    assert index_key(b"document", "brochure.pdf") == before
+    assert index_key(b"other document", "brochure.pdf") != before
+    assert index_key(b"document", "brochure.txt") != before
+    monkeypatch.setattr(index_store, setting, value)
+    assert index_key(b"document", "brochure.pdf") != before
+
+def test_least_recently_used_entries_are_evicted_past_the_size_limit(tmp_path):
+    store = IndexStore(str(tmp_path))
+    store.save("a", make_store("alpha"), "alpha")
+    store.save("b", make_store("bravo"), "bravo")
+    entry_size = path_size(str(tmp_path / "a"))
+    store.max_bytes = int(entry_size * 2.5)
+
+    old = time.time() - 3600
+    for name in ("a", "b"):
+        os.utime(tmp_path / name, (old, old))
+    assert store.load("a", EMBEDDINGS) is not None  # a becomes the most recently used
+
+    store.save("c", make_store("charlie"), "charlie")
+    assert sorted(os.listdir(tmp_path)) == ["a", "c"]
@@ -0,0 +1,76 @@
+# tests/test_jobs.py
+import time
+import threading
+import pytest
+import main
+from jobs import CANCELLED, FAILED, RUNNING, SUCCEEDED, Job, JobManager, job_key
+
+def wait_finished(manager: JobManager, job_id: str, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not manager.get(job_id).finished:
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.01)
+    return manager.get(job_id)
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1)
+    yield manager
+    manager.shutdown()
+
+def test_identical_active_submissions_share_a_job(manager):
+    release = threading.Event()
+    key = job_key("insights", "doc-1")
+    first = manager.submit(lambda job: release.wait(5), key=key)
+    assert manager.submit(lambda job: release.wait(5), key=key) == first
+    assert manager.submit(lambda job: release.wait(5), key=job_key("insights", "doc-2")) != first
+
+    release.set()
+    wait_finished(manager, first)
+    assert manager.submit(lambda job: "again", key=key) != first
+
+def test_succeeded_and_failed_jobs(manager):
+    def fail(job):
+        raise ValueError("bad input")
+
+    done = wait_finished(manager, manager.submit(lambda job, x: x * 2, 21))
+    assert (done.status, done.result, done.progress) == (SUCCEEDED, 42, 1.0)
+    failed = wait_finished(manager, manager.submit(fail))
+    assert (failed.status, failed.error) == (FAILED, "bad input")
+
+def test_running_job_stops_at_its_next_cancellation_check(manager):
+    started = threading.Event()
+
+    def work(job):
+        started.set()
+        while True:
+            job.check_cancelled()
+            time.sleep(0.01)
+
+    job_id = manager.submit(work)
+    assert started.wait(5) and manager.get(job_id).status == RUNNING
+    assert manager.cancel(job_id)
+    assert wait_finished(manager, job_id).status == CANCELLED
+    assert not manager.cancel(job_id)
+
+def test_queued_job_is_cancelled_without_running(manager):
+    release = threading.Event()
+    ran = []
+    blocker = manager.submit(lambda job: release.wait(5))
+    queued = manager.submit(lambda job: ran.append(True), key="queued")
+    assert manager.cancel(queued)
+    assert manager.get(queued).status == CANCELLED
+    release.set()
+    wait_finished(manager, blocker)
+    assert not ran
+    assert manager.submit(lambda job: None, key="queued") != queued
+
+def test_generation_job_publishes_output_at_most_once_per_poll(monkeypatch, manager):
+    monkeypatch.setattr(main, "stream_output", lambda llm, task, form_data: iter(["word "] * 5000))
+    outputs = []
+    report = Job.report
+    monkeypatch.setattr(Job, "report", lambda self, **kwargs: (outputs.append(kwargs.get("output")),
+                                                                report(self, **kwargs))[1])
+    finished = wait_finished(manager, manager.submit(main.generation_job, None, "Blog Post", {}))
+    assert finished.status == SUCCEEDED and finished.result == "word " * 5000
+    assert len(outputs) <= 3
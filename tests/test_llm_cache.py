@@ -0,0 +1,81 @@
+# tests/test_llm_cache.py
+import json
+import asyncio
+from types import SimpleNamespace
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import llm_cache
+from llm_cache import LLMResponseCache, acached_call, cached_call
+
+LLM = FakeListChatModel(responses=["unused"])
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(llm_cache, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch, clock):
+    cache = LLMResponseCache(str(tmp_path / "responses.sqlite3"), ttl_seconds=100, max_entries=2)
+    monkeypatch.setattr(llm_cache, "_cache", cache)
+    return cache
+
+def test_entries_expire_after_the_ttl(cache, clock):
+    cache.put("a", "answer", LLM)
+    clock[0] += 100
+    assert cache.get("a") == "answer"
+    clock[0] += 1
+    assert cache.get("a") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 0}
+
+def test_least_recently_used_entries_are_evicted(cache, clock):
+    for key in ("a", "b"):
+        cache.put(key, key.upper(), LLM)
+        clock[0] += 1
+    assert cache.get("a") == "A"  # a is now more recent than b
+    clock[0] += 1
+    cache.put("c", "C", LLM)
+    assert [cache.get(key) for key in ("a", "b", "c")] == ["A", None, "C"]
+    assert cache.stats()["entries"] == 2
+
+def test_key_depends_on_the_model_settings(cache):
+    assert cache.key("prompt", LLM) == cache.key("prompt", LLM)
+    assert cache.key("prompt", LLM) != cache.key("other prompt", LLM)
+    assert cache.key("prompt", LLM) != cache.key("prompt", SimpleNamespace(model_name="other", temperature=0.2))
+
+def test_validate_rejects_responses_and_cached_entries(cache):
+    calls = []
+
+    def call() -> str:
+        calls.append(True)
+        return "not json" if len(calls) == 1 else '{"ok": true}'
+
+    assert cached_call(LLM, "prompt", call, use_cache=True, validate=json.loads) == "not json"
+    assert cache.stats()["entries"] == 0
+    assert cached_call(LLM, "prompt", call, use_cache=True, validate=json.loads) == '{"ok": true}'
+    assert cached_call(LLM, "prompt", call, use_cache=True, validate=json.loads) == '{"ok": true}'
+    assert len(calls) == 2
+
+    # An entry stored before validation existed is refetched, not served
+    cache.put(cache.key("old prompt", LLM), "garbage", LLM)
+    assert cached_call(LLM, "old prompt", lambda: "[]", use_cache=True, validate=json.loads) == "[]"
+
+def test_use_cache_false_bypasses_the_cache(cache):
+    calls = []
+
+    async def acall() -> str:
+        calls.append(True)
+        return "fresh"
+
+    for _ in range(2):
+        assert cached_call(LLM, "prompt", lambda: calls.append(True) or "fresh", use_cache=False) == "fresh"
+        assert asyncio.run(acached_call(LLM, "prompt", acall, use_cache=False)) == "fresh"
+    assert len(calls) == 4
+    assert cache.stats() == {"hits": 0, "misses": 0, "entries": 0}
+
+def test_stats_count_hits_and_misses(cache):
+    assert cached_call(LLM, "prompt", lambda: "answer", use_cache=True) == "answer"
+    assert cached_call(LLM, "prompt", lambda: "other", use_cache=True) == "answer"
+    assert asyncio.run(acached_call(LLM, "prompt", lambda: asyncio.sleep(0, "other"), use_cache=True)) == "answer"
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 1}
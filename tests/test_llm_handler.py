@@ -0,0 +1,81 @@
+# tests/test_llm_handler.py
+import json
+from typing import Any, List, Optional
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+import pytest
+from llm_handler import FIELD_PROMPTS, generate_all_insights
+
+FIELDS = ["brand_description", "target_audience", "keywords"]
+
+class _InsightModel(BaseChatModel):
+    """Answers batched prompts from a script and per-field prompts with the field's name"""
+
+    batch_responses: List[str]
+    batch_calls: int = 0
+    field_calls: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-insights"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt = str(messages[-1].content)
+        if "single JSON object" in prompt:
+            text = self.batch_responses[self.batch_calls]
+            self.batch_calls += 1
+        else:
+            name = next(name for name, query in FIELD_PROMPTS.items() if query in prompt)
+            self.field_calls.append(name)
+            text = f"{name} answered per field"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+@pytest.fixture(scope="module")
+def vector_store():
+    texts = ["Seaside Homes sells sea view flats to retirees.", "Our goal is more viewing bookings in spring."]
+    return FAISS.from_texts(texts, DeterministicFakeEmbedding(size=16))
+
+def test_fields_missing_from_the_batched_answer_fall_back_per_field(vector_store):
+    llm = _InsightModel(batch_responses=[
+        "```json\n" + json.dumps({"brand_description": "Sea view flats for retirees", "keywords": ""}) + "\n```"
+    ])
+    results = generate_all_insights(llm, vector_store, FIELDS, use_cache=False)
+    assert results == {
+        "brand_description": "Sea view flats for retirees",
+        "target_audience": "target_audience answered per field",
+        "keywords": "keywords answered per field",
+    }
+    assert llm.batch_calls == 1 and sorted(llm.field_calls) == ["keywords", "target_audience"]
+
+def test_unparseable_group_falls_back_per_field(vector_store):
+    llm = _InsightModel(batch_responses=[
+        json.dumps({"brand_description": "Sea view flats for retirees"}),
+        "Sorry, here are the answers: target audience is retirees",
+        json.dumps(["not", "an", "object"]),
+    ])
+    results = generate_all_insights(llm, vector_store, FIELDS, fields_per_call=1, use_cache=False)
+    assert results["brand_description"] == "Sea view flats for retirees"
+    assert results["target_audience"] == "target_audience answered per field"
+    assert results["keywords"] == "keywords answered per field"
+    assert llm.batch_calls == 3 and sorted(llm.field_calls) == ["keywords", "target_audience"]
+
+def test_cancellation_stops_before_the_next_group(vector_store):
+    class Cancelled(Exception):
+        pass
+
+    llm = _InsightModel(batch_responses=["not json"] * 3)
+    checks = []
+
+    def check_cancelled() -> None:
+        checks.append(True)
+        if len(checks) > 1:
+            raise Cancelled()
+
+    with pytest.raises(Cancelled):
+        generate_all_insights(llm, vector_store, FIELDS, fields_per_call=1, use_cache=False,
+                              check_cancelled=check_cancelled)
+    assert llm.batch_calls == 1 and llm.field_calls == []
@@ -0,0 +1,84 @@
+# tests/test_page_cache.py
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from page_cache import PageCache
+from web_scraper import _extract_properties, _lookup_cached
+
+PAGE = b"<html><body><h1>Sea view flat</h1><p>$1,000</p></body></html>"
+
+class _Handler(BaseHTTPRequestHandler):
+    etag = '"v1"'
+    requests = []
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _headers(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", "0" if status == 304 else str(len(PAGE)))
+        self.end_headers()
+
+    def do_HEAD(self) -> None:
+        self.requests.append(("HEAD", None))
+        self._headers(200)
+
+    def do_GET(self) -> None:
+        condition = self.headers.get("If-None-Match")
+        self.requests.append(("GET", condition))
+        if condition == self.etag:
+            self._headers(304)
+            return
+        self._headers(200)
+        self.wfile.write(PAGE)
+
+@pytest.fixture
+def site():
+    handler = type("Handler", (_Handler,), {"requests": []})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield handler, f"http://127.0.0.1:{server.server_address[1]}/listings"
+    server.shutdown()
+    server.server_close()
+
+def test_cold_miss_only_sends_head(site, tmp_path):
+    handler, url = site
+    cache = PageCache(str(tmp_path), ttl_seconds=0)
+    cached, validators = asyncio.run(_lookup_cached(cache, url))
+    assert cached is None
+    assert validators["etag"] == '"v1"'
+    assert handler.requests == [("HEAD", None)]
+
+def test_stale_entry_revalidates_with_conditional_get(site, tmp_path):
+    handler, url = site
+    cache = PageCache(str(tmp_path), ttl_seconds=0)
+    cache.put(url, "# Sea view flat", PAGE.decode(), {"etag": '"v1"'}, [{"title": "Sea view flat"}])
+
+    cached, _ = asyncio.run(_lookup_cached(cache, url))
+    assert cached["cached"] and cached["properties"] == [{"title": "Sea view flat"}]
+    assert handler.requests == [("GET", '"v1"')]
+
+    handler.etag = '"v2"'
+    cached, validators = asyncio.run(_lookup_cached(cache, url))
+    assert cached is None and validators["etag"] == '"v2"'
+
+def test_entry_without_properties_is_not_served(site, tmp_path):
+    _, url = site
+    cache = PageCache(str(tmp_path), ttl_seconds=3600)
+    cache.put(url, "# Sea view flat", PAGE.decode(), {"etag": '"v1"'}, [])
+    cached, _ = asyncio.run(_lookup_cached(cache, url))
+    assert cached is None
+
+@pytest.mark.parametrize("response, complete", [
+    ('[{"title": "Sea view flat", "price": "$1,000"}]', True),
+    ("[]", False),
+    ("no listings here", False),
+])
+def test_only_complete_extractions_are_cacheable(response, complete):
+    properties, is_complete = _extract_properties(FakeListChatModel(responses=[response]), "# Sea view flat\n$1,000")
+    assert is_complete is complete
+    assert bool(properties) is complete
@@ -0,0 +1,15 @@
+# tests/test_preload.py
+from preload import DEFERRED_PACKAGES, cold_import_seconds, eager_imports
+
+def test_main_import_keeps_deferred_packages_off_the_startup_path():
+    entry = cold_import_seconds("main")
+    assert entry["status"] == "ok", entry.get("error")
+    assert "langchain_core" in DEFERRED_PACKAGES
+    assert eager_imports([entry]) == {}
+
+def test_report_flags_app_modules_that_load_deferred_packages():
+    rows = [
+        {"module": "main", "seconds": 1.0, "status": "ok", "eager": ["langchain_core"]},
+        {"module": "langchain_core.prompts", "seconds": 0.5, "status": "ok", "eager": ["langchain_core"]},
+    ]
+    assert eager_imports(rows) == {"main": ["langchain_core"]}
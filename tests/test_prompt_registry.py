@@ -0,0 +1,32 @@
+# tests/test_prompt_registry.py
+import pytest
+from prompt_registry import REQUIRED_VARIABLES, PromptRegistry, PromptTemplateError, registry
+
+FIELD_TEMPLATE = "Answer {input} from the context.\n\nContext:\n{context}\nReply as {{\"answer\": \"...\"}}"
+
+def test_valid_templates_register_with_their_variables():
+    prompts = PromptRegistry({"insight": FIELD_TEMPLATE, "Post": "Write about {brand} in a {tone} tone"},
+                             defaults={"Post": {"tone": "friendly"}}, required={"insight": ["input", "context"]})
+    assert prompts.variables == {"insight": ["input", "context"], "Post": ["brand", "tone"]}
+    assert prompts.inputs("Post", {"brand": "Seaside"}) == {"brand": "Seaside", "tone": "friendly"}
+    assert prompts.format("insight", {"input": "the brand", "context": "ctx"}).endswith('{"answer": "..."}')
+
+@pytest.mark.parametrize("templates, kwargs, message", [
+    ({"insight": "Answer {input} without any context"}, {"required": {"insight": ["input", "context"]}},
+     "required variables context"),
+    ({"Post": "Write about {brand}"}, {"required": {"Post Composer": ["brand"]}}, "No prompt template"),
+    ({"Post": "Write about {brand"}, {}, "'Post'"),
+    ({"Post": "Reply as {\"answer\": 1}"}, {}, "escape literal braces"),
+    ({"Post": "Write about {brand}"}, {"defaults": {"Post": {"tone": "friendly"}}}, "unknown variables"),
+])
+def test_invalid_templates_fail_at_registration(templates, kwargs, message):
+    with pytest.raises(PromptTemplateError, match=message):
+        PromptRegistry(templates, **kwargs)
+
+def test_missing_values_fail_when_formatting():
+    with pytest.raises(PromptTemplateError, match="missing values for context"):
+        registry.inputs("insight", {"input": "the brand"})
+
+def test_shipped_prompts_use_their_required_variables():
+    for name, variables in REQUIRED_VARIABLES.items():
+        assert set(variables) <= set(registry.variables[name])
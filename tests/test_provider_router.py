@@ -0,0 +1,112 @@
+# tests/test_provider_router.py
+import time
+import asyncio
+from typing import Any, Iterator, List, Optional
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+import provider_router
+from benchmark import StubProvider
+from llm_handler import create_llm
+from provider_router import AllProvidersFailed, ProviderRouter, get_endpoint_stats
+
+class _Endpoint(BaseChatModel):
+    """Fake endpoint that answers with its name, optionally failing or failing mid-stream"""
+
+    model_name: str
+    fail: bool = False
+    fail_after_chunks: Optional[int] = None
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-endpoint"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError(f"{self.model_name} is down")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.model_name))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError(f"{self.model_name} is down")
+        for n, word in enumerate([self.model_name, " says", " hi"]):
+            if n == self.fail_after_chunks:
+                raise ConnectionError(f"{self.model_name} dropped the stream")
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(provider_router, "_stats", {})
+
+def stub_router(*stubs: StubProvider, **params: Any) -> ProviderRouter:
+    first, *rest = [stub.config(f"stub{i}") for i, stub in enumerate(stubs)]
+    router = create_llm({**first, "fallbacks": [{**config, "provider": "Ollama"} for config in rest]})
+    router.params = {**router.params, **params}
+    return router
+
+def test_fails_over_to_the_next_endpoint():
+    with StubProvider(status=500) as failing, StubProvider() as healthy:
+        router = stub_router(failing, healthy)
+        assert router.invoke("hi").content == "stub answer"
+    assert get_endpoint_stats(router.names[0]).consecutive_failures == 1
+    assert get_endpoint_stats(router.names[1]).samples() == 1
+
+def test_raises_when_every_endpoint_fails():
+    with StubProvider(status=500) as first, StubProvider(status=503) as second:
+        router = stub_router(first, second)
+        with pytest.raises(AllProvidersFailed) as error:
+            router.invoke("hi")
+    assert all(name in str(error.value) for name in router.names)
+
+def test_consecutive_failures_cool_an_endpoint_down_and_rerank(monkeypatch):
+    flaky, steady = _Endpoint(model_name="flaky", fail=True), _Endpoint(model_name="steady")
+    router = ProviderRouter.from_models([flaky, steady], failure_threshold=3, cooldown_seconds=30.0)
+    for _ in range(3):
+        assert router.invoke("hi").content == "steady"
+    assert flaky.calls == 3 and router.ranked() == [1, 0]
+
+    router.invoke("hi")
+    assert flaky.calls == 3  # still cooling down, so the healthy endpoint goes first
+
+    cooled = time.monotonic() + 31
+    monkeypatch.setattr(provider_router.time, "monotonic", lambda: cooled)
+    flaky.fail = False
+    assert router.ranked()[0] == 0
+    assert router.invoke("hi").content == "flaky"
+
+def test_hedges_when_the_first_endpoint_is_slower_than_the_hedge_delay():
+    with StubProvider(latency=1.0) as slow, StubProvider() as fast:
+        router = stub_router(slow, fast, hedge=True, prior_latency_seconds=0.1)
+        start = time.perf_counter()
+        assert router.invoke("hi").content == "stub answer"
+        assert time.perf_counter() - start < 0.9
+        assert get_endpoint_stats(router.names[1]).samples() == 1
+
+        start = time.perf_counter()
+        assert asyncio.run(router.ainvoke("hi")).content == "stub answer"
+        assert time.perf_counter() - start < 0.9
+        assert get_endpoint_stats(router.names[1]).samples() == 2
+
+def test_stream_fails_over_before_the_first_chunk():
+    down, up = _Endpoint(model_name="down", fail=True), _Endpoint(model_name="up")
+    router = ProviderRouter.from_models([down, up])
+    assert "".join(chunk.content for chunk in router.stream("hi")) == "up says hi"
+
+    async def collect() -> str:
+        return "".join([chunk.content async for chunk in router.astream("hi")])
+    assert asyncio.run(collect()) == "up says hi"
+
+def test_stream_error_after_the_first_chunk_is_raised():
+    dropping, spare = _Endpoint(model_name="dropping", fail_after_chunks=1), _Endpoint(model_name="spare")
+    router = ProviderRouter.from_models([dropping, spare])
+    received = []
+    with pytest.raises(ConnectionError):
+        for chunk in router.stream("hi"):
+            received.append(chunk.content)
+    assert received == ["dropping"] and spare.calls == 0
@@ -0,0 +1,142 @@
+# tests/test_rate_limiter.py
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+from typing import Any, List, Optional
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+import rate_limiter
+from config import RateLimitConfig
+from rate_limiter import (BACKGROUND, INTERACTIVE, RateLimitedModel, RateLimiter, classify_error,
+                          request_priority, wait_for_excluding_queue)
+
+class _ProviderError(Exception):
+    """Shaped like the HTTP errors provider SDKs raise"""
+
+    def __init__(self, status_code: int, headers: Optional[dict] = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+class _FailingModel(BaseChatModel):
+    model_name: str = "always-failing"
+    status_code: int = 429
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "failing"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        raise _ProviderError(self.status_code, {"retry-after": "0"})
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A manual monotonic clock for the limiter module only"""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(
+        monotonic=lambda: now[0], time=time.time, sleep=lambda seconds: None
+    ))
+    return now
+
+def make_limiter(**params: Any) -> RateLimiter:
+    return RateLimiter("test:model", params={**RateLimitConfig.DEFAULT_PARAMS, **params})
+
+def test_limit_halves_once_per_interval_on_429_and_grows_on_success(clock):
+    limiter = make_limiter(initial_concurrency=4, decrease_interval_seconds=1.0)
+    for _ in range(3):
+        limiter.acquire(1)
+    limiter.release(1, rate_limited=True, retry_after=0)
+    limiter.release(1, rate_limited=True, retry_after=0)
+    assert limiter.limit == 2.0  # the burst halves the limit once
+
+    clock[0] += 1.0
+    limiter.release(1, rate_limited=True, retry_after=0)
+    assert limiter.limit == 1.0
+
+    for expected in (2.0, 2.5):
+        limiter.acquire(1)
+        limiter.release(1, used=1)
+        assert limiter.limit == pytest.approx(expected)
+
+@pytest.mark.parametrize("retry_after", ["7", "Thu, 01 Jan 2099 00:00:00 GMT"])
+def test_retry_after_blocks_the_limiter(clock, retry_after):
+    kind, seconds = classify_error(_ProviderError(429, {"retry-after": retry_after}))
+    assert kind == "rate_limited"
+    if retry_after == "7":
+        assert seconds == 7.0
+    else:
+        assert seconds > 3600
+
+    limiter = make_limiter()
+    limiter.acquire(1)
+    limiter.release(1, rate_limited=True, retry_after=seconds)
+    assert limiter.blocked_until == clock[0] + seconds
+    clock[0] += seconds - 1
+    assert limiter.snapshot()["blocked_seconds"] == pytest.approx(1.0)
+
+def test_classify_error_without_retry_after():
+    assert classify_error(_ProviderError(429)) == ("rate_limited", None)
+    assert classify_error(_ProviderError(503)) == ("retryable", None)
+    assert classify_error(_ProviderError(401)) == ("fatal", None)
+
+def test_interactive_call_queued_later_is_admitted_first():
+    limiter = make_limiter(initial_concurrency=1)
+    limiter.acquire(1)
+    admitted = []
+
+    def call(priority: int, label: str) -> None:
+        with request_priority(priority):
+            limiter.acquire(1)
+        admitted.append(label)
+        limiter.release(1, used=1)
+
+    threads = []
+    for priority, label in ((BACKGROUND, "background"), (INTERACTIVE, "interactive")):
+        threads.append(threading.Thread(target=call, args=(priority, label)))
+        threads[-1].start()
+        deadline = time.monotonic() + 5
+        while limiter.snapshot()["queued"] < len(threads) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    assert limiter.snapshot()["queued"] == 2
+
+    limiter.release(1, used=1)
+    for thread in threads:
+        thread.join(5)
+    assert admitted == ["interactive", "background"]
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_rate_limited_model_raises_after_max_attempts(monkeypatch, clock, status_code):
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setitem(RateLimitConfig.DEFAULT_PARAMS, "max_attempts", 3)
+    monkeypatch.setitem(RateLimitConfig.DEFAULT_PARAMS, "backoff_seconds", 0.0)
+    failing = _FailingModel(status_code=status_code)
+    with pytest.raises(_ProviderError):
+        RateLimitedModel.wrap(failing).invoke("hi")
+    assert failing.calls == 3
+
+def test_time_queued_in_the_limiter_does_not_count_towards_the_timeout():
+    limiter = make_limiter(initial_concurrency=1, async_poll_seconds=0.01)
+    limiter.acquire(1)
+
+    async def call(work_seconds: float) -> str:
+        await limiter.aacquire(1)
+        try:
+            await asyncio.sleep(work_seconds)
+        finally:
+            limiter.release(1, used=1)
+        return "done"
+
+    async def scenario() -> None:
+        # Queued for 0.4s behind the held slot, then 0.05s of work, against a 0.2s timeout
+        asyncio.get_running_loop().call_later(0.4, limiter.release, 1, 1)
+        assert await wait_for_excluding_queue(call(0.05), timeout=0.2) == "done"
+        with pytest.raises(asyncio.TimeoutError):
+            await wait_for_excluding_queue(call(0.5), timeout=0.2)
+
+    asyncio.run(scenario())
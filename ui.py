@@ -1,9 +1,12 @@
 # ui.py
 import streamlit as st
 import re
-from config import Config, get_api_key
+from config import Config, RouterConfig, LLM_FALLBACKS, get_api_key
 from utils import fetch_models
-from typing import Dict, Any, Optional, Tuple, Union
+from llm_handler import parse_fallbacks
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+TONES = ["Formal", "Casual", "Professional", "Friendly"]
 
 # Initialize session state
 def initialize_session_state():
@@ -12,6 +15,8 @@ def initialize_session_state():
         st.session_state.update({
             "initialized": True,
             "vector_store": None,
+            "corpus": None,
+            "uploaded_doc_ids": {},
             "llm": None,
             "doc_content": "",
             "brand_description": "",
@@ -22,7 +27,9 @@ def initialize_session_state():
             "keywords": "",
             "suggested_topics": "",
             "error_message": "",
-            "processing_done": False,
+            "insights_key": None,  # job key of the insights currently in the form
+            "insight_job_id": None,
+            "generation_job_id": None,
             "task": "Marketing Strategy"  # Initialize task
         })
 
@@ -39,7 +46,7 @@ def create_sidebar() -> Dict[str, Any]:
 
     # Web scraping section
     with st.sidebar.expander("🌐 Web Scraping", expanded=True):
-        st.text_input("URL to Scrape", key="scrape_url")
+        st.text_area("URLs to Scrape (one per line)", key="scrape_url")
         scrape_options = {
             "include_raw_html": st.checkbox("Include HTML", False),
             "include_links": st.checkbox("Include Links", False),
@@ -51,19 +58,25 @@ def create_sidebar() -> Dict[str, Any]:
             )
         }
         if st.button("Scrape Website", key="scrape_button"):
-            if st.session_state.scrape_url:
+            urls = [url.strip() for url in st.session_state.scrape_url.splitlines() if url.strip()]
+            if urls:
                 try:
-                    with st.spinner("Scraping website..."):
-                        from web_scraper import sync_scrape_website
-                        vector_store = sync_scrape_website(
-                            st.session_state.scrape_url,
+                    with st.spinner(f"Scraping {len(urls)} website(s)..."):
+                        from web_scraper import sync_scrape_websites, merge_scrape_results
+                        results = sync_scrape_websites(
+                            urls,
+                            st.session_state.llm,
                             scrape_options
                         )
-                        if vector_store:
+                        vector_store = merge_scrape_results(results)
+                        failed = [url for url, result in results.items() if not result]
+                        if vector_store["sources"]:
                             st.session_state.vector_store = vector_store
-                            st.success("Successfully scraped and stored content!")
+                            st.success(f"Successfully scraped {len(vector_store['sources'])} of {len(results)} pages!")
                         else:
                             st.error("Failed to scrape website content")
+                        if failed and vector_store["sources"]:
+                            st.warning(f"Failed to scrape: {', '.join(failed)}")
                 except Exception as e:
                     st.error(f"Scraping failed: {str(e)}")
             else:
@@ -176,6 +189,20 @@ def create_sidebar() -> Dict[str, Any]:
                 max_value=8192, 
                 value=4096
             )
+            fallback_spec = st.text_input(
+                "Fallback Models",
+                value=LLM_FALLBACKS,
+                help="Comma-separated provider:model[@endpoint], e.g. Ollama:llama3.1. Requests go to the fastest healthy model and fail over on errors"
+            )
+            hedge = st.checkbox(
+                "Hedge slow requests", RouterConfig.DEFAULT_PARAMS["hedge"],
+                help="Also ask the next model when the first is slower than usual, and use whichever answers first"
+            )
+            try:
+                fallbacks = parse_fallbacks(fallback_spec)
+            except ValueError as e:
+                st.error(str(e))
+                fallbacks = []
                         
         
         
@@ -186,6 +213,8 @@ def create_sidebar() -> Dict[str, Any]:
         "api_endpoint": endpoint,
         "temperature": temperature,
         "max_tokens": max_tokens,
+        "fallbacks": fallbacks,
+        "hedge": hedge,
         "task": task,
     }
 
@@ -272,11 +301,33 @@ def create_marketing_form() -> Dict[str, str]:
         
         tone = st.selectbox(
                 "Tone of Voice",
-                options=["Formal", "Casual", "Professional", "Friendly"],
+                options=TONES,
                 key="tone_input",
                 help="Select the tone for the generated content"
             )
         
+        with st.expander("Batch Generation", expanded=False):
+            st.multiselect(
+                "Tasks",
+                options=Config.MARKETING_TASKS,
+                key="batch_tasks_input",
+                help="Generate several tasks in one submission (defaults to the selected task)"
+            )
+            st.multiselect(
+                "Tone Variants",
+                options=TONES,
+                key="batch_tones_input",
+                help="Generate one variant per tone instead of the single tone above"
+            )
+            properties = st.session_state.vector_store.get("properties", []) if isinstance(
+                st.session_state.get("vector_store"), dict) else []
+            st.checkbox(
+                f"One Post Composer post per scraped property ({len(properties)})",
+                key="batch_properties_input",
+                disabled=not properties,
+                help="Fill Post Composer from each scraped property instead of writing one post"
+            )
+        
         # Add a submit button
         if st.form_submit_button(f"🚀 Generate {st.session_state.task}"):
             return {
@@ -292,11 +343,26 @@ def create_marketing_form() -> Dict[str, str]:
             }
     
     # Display scraped properties carousel
-    if st.session_state.get("vector_store"):
+    if isinstance(st.session_state.get("vector_store"), dict):
         display_property_carousel(st.session_state.vector_store)
     
     return {}
 
+def get_batch_selection(task: str) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+    """Tasks, tone variants and scraped properties chosen under Batch Generation
+
+    Returns empty lists when nothing beyond a single generation of the sidebar
+    task was asked for; picking one other task counts as a batch of one.
+    """
+    tasks = st.session_state.get("batch_tasks_input") or []
+    tones = st.session_state.get("batch_tones_input") or []
+    properties = []
+    if st.session_state.get("batch_properties_input") and isinstance(st.session_state.get("vector_store"), dict):
+        properties = st.session_state.vector_store.get("properties", [])
+    if not ((tasks and tasks != [task]) or tones or (properties and "Post Composer" in (tasks or [task]))):
+        return [], [], []
+    return tasks or [task], tones, properties
+
 def display_property_carousel(vector_store):
     """Display scraped properties in a carousel layout"""
     st.markdown("""
@@ -2,21 +2,246 @@
 import asyncio
 import logging
 import json
-from typing import Optional, Dict, Any
+import re
+import time
+import random
+import itertools
+import contextlib
+from urllib.parse import urlparse
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 from lxml import html
-try:
-    from crawl4ai import AsyncWebCrawler
-except ImportError:
-    logging.error("Missing crawl4ai package. Install with: pip install crawl4ai")
-    raise
-from llm_handler import initialize_llm
-from config import get_api_key
+from llm_handler import create_llm
+from config import get_api_key, CrawlConfig
+from page_cache import PageCache
+from telemetry import span, llm_run_config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-async def scrape_website(url: str, llm: Any, options: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+def _crawler_class() -> Any:
+    """Import crawl4ai on first use so the app starts (and serves cached pages) without it"""
+    try:
+        from crawl4ai import AsyncWebCrawler
+    except ImportError:
+        logger.error("Missing crawl4ai package. Install with: pip install crawl4ai")
+        raise
+    return AsyncWebCrawler
+
+def _proxy_crawler(proxy: str) -> Any:
+    """A crawler whose browser goes through proxy
+
+    crawl4ai applies the proxy when the browser launches, so rotating proxies
+    means rotating crawlers; a per-request proxy option is ignored.
+    """
+    from crawl4ai import BrowserConfig
+
+    parts = urlparse(proxy)
+    server = f"{parts.scheme}://{parts.hostname}" + (f":{parts.port}" if parts.port else "")
+    proxy_config = {"server": server}
+    if parts.username:
+        proxy_config.update({"username": parts.username, "password": parts.password or ""})
+    return _crawler_class()(config=BrowserConfig(proxy_config=proxy_config))
+
+EXTRACTION_PROMPT = """Analyze this part of a real estate listing page and extract the properties in it:
+    {markdown}
+    
+    Return only a JSON array (use [] if there are none) of objects with:
+    - title (string)
+    - price (numeric)
+    - location (string)
+    - type (string: 'Sale' or 'Rental')
+    - description (string)
+    - image_url (string)
+    """
+
+def _hard_split(block: str, max_chars: int) -> List[str]:
+    """Split an oversized block at line boundaries, cutting lines only as a last resort"""
+    pieces, current = [], ""
+    for line in block.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if len(current) + len(line) > max_chars:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_listings(markdown: str, max_chars: int) -> List[str]:
+    """Split page markdown into chunks of at most max_chars along listing boundaries
+
+    Listing pages usually repeat one heading level per card, so the most frequent
+    heading level is used as the boundary; pages without repeated headings are
+    split on horizontal rules or blank lines. Whole listings are then packed
+    greedily into chunks.
+    """
+    lines = markdown.splitlines(keepends=True)
+    levels: Dict[str, int] = {}
+    for line in lines:
+        match = re.match(r"^(#{1,6})\s", line)
+        if match:
+            levels[match.group(1)] = levels.get(match.group(1), 0) + 1
+    boundary = max(levels, key=levels.get) if levels and max(levels.values()) > 1 else None
+
+    blocks: List[str] = []
+    if boundary:
+        current = ""
+        for line in lines:
+            if re.match(rf"^{boundary}\s", line) and current.strip():
+                blocks.append(current)
+                current = ""
+            current += line
+        blocks.append(current)
+    else:
+        blocks = re.split(r"\n(?:\s*(?:-{3,}|\*{3,}|_{3,})\s*\n|\s*\n)", markdown)
+
+    chunks: List[str] = []
+    current = ""
+    for block in blocks:
+        if not block.strip():
+            continue
+        if len(block) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_hard_split(block, max_chars))
+            continue
+        if current and len(current) + len(block) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{block}" if current else block
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+def _parse_properties(text: str) -> List[Dict[str, Any]]:
+    """Parse a JSON array (or object) of properties out of an LLM response"""
+    text = re.sub(r"^```(?:json)?|```$", "", text.strip(), flags=re.MULTILINE).strip()
+    starts = [i for i in (text.find("["), text.find("{")) if i != -1]
+    if not starts:
+        raise json.JSONDecodeError("No JSON value in response", text, 0)
+    start = min(starts)
+    end = text.rfind("]" if text[start] == "[" else "}")
+    data = json.loads(text[start:end + 1])
+    if isinstance(data, dict):
+        data = data.get("properties", [data])
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):  # e.g. {"properties": null}
+        return []
+    return [item for item in data if isinstance(item, dict)]
+
+def _property_key(item: Dict[str, Any]) -> Tuple[str, ...]:
+    """Identity used to deduplicate a property seen in more than one chunk
+
+    The image URL alone is not enough: listings often share a placeholder or
+    stock photo, so it is combined with the title and price.
+    """
+    def normalize(field: str) -> str:
+        return re.sub(r"\W+", " ", str(item.get(field) or "")).strip().lower()
+
+    image_url = str(item.get("image_url") or "").strip().lower()
+    if image_url:
+        return ("image", image_url, normalize("title"), normalize("price"))
+    return tuple(normalize(field) for field in ("title", "location", "price"))
+
+def merge_properties(batches: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Merge per-chunk property lists, combining duplicates field by field"""
+    merged: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+    for batch in batches:
+        for item in batch:
+            key = _property_key(item)
+            if key not in merged:
+                merged[key] = dict(item)
+                continue
+            for field, value in item.items():
+                if value not in (None, "", []) and merged[key].get(field) in (None, "", []):
+                    merged[key][field] = value
+    return list(merged.values())
+
+def _extract_properties(llm: Any, markdown: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """Extract structured property listings from page markdown
+
+    The markdown is split into listing-sized chunks that are extracted in
+    parallel and merged, so prompt size stays bounded on large pages. Returns
+    (properties, complete): complete is False when any chunk failed or nothing
+    was found, and such results are not worth caching.
+    """
+    from langchain_core.output_parsers import StrOutputParser
+
+    if isinstance(llm, dict):  # Handle config dict from legacy code
+        llm = create_llm(llm)
+
+    params = CrawlConfig.DEFAULT_PARAMS
+    chunks = split_listings(markdown, params["extract_chunk_chars"])
+    if not chunks:
+        return [], False
+
+    chain = llm | StrOutputParser()
+    prompts = [EXTRACTION_PROMPT.format(markdown=chunk) for chunk in chunks]
+    with span("scrape.extract", chunks=len(chunks)):
+        responses = chain.batch(
+            prompts,
+            config=llm_run_config(llm, max_concurrency=params["extract_concurrency"]),
+            return_exceptions=True
+        )
+
+    batches = []
+    failures = 0
+    unparsed = 0
+    for i, response in enumerate(responses):
+        if isinstance(response, Exception):
+            failures += 1
+            logger.error(f"LLM processing failed for chunk {i + 1}/{len(chunks)}: {response}")
+            continue
+        try:
+            batches.append(_parse_properties(response))
+        except json.JSONDecodeError as e:
+            unparsed += 1
+            logger.error(f"Failed to parse LLM response for chunk {i + 1}/{len(chunks)}: {e}")
+
+    if failures == len(chunks):
+        raise RuntimeError("LLM processing failed for every chunk")
+
+    properties = merge_properties(batches)
+    if not properties:
+        logger.warning("LLM returned no properties")
+    return properties, bool(properties) and failures == 0 and unparsed == 0
+
+def _cached_result(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a scrape result from a page cache entry"""
+    return {
+        "properties": entry["properties"],
+        "raw_html": entry["html"],
+        "markdown": entry["markdown"],
+        "cached": True
+    }
+
+async def _lookup_cached(cache: PageCache, url: str,
+                         limiter: Optional["HostRateLimiter"] = None) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """Return (cached_result, validators) for url, revalidating stale entries"""
+    entry = await asyncio.to_thread(cache.get, url)
+    # Entries without properties (cached before empty extractions were skipped) are scraped again
+    if entry and entry.get("properties") and cache.is_fresh(entry):
+        return _cached_result(entry), {}
+
+    if limiter is not None:
+        await limiter.acquire(url)
+    unchanged, validators = await asyncio.to_thread(cache.check, url, entry)
+    if entry and unchanged and entry.get("properties"):
+        await asyncio.to_thread(cache.touch, url, validators)
+        logger.info(f"Page unchanged since last scrape: {url}")
+        return _cached_result(entry), validators
+    return None, validators
+
+async def scrape_website(url: str, llm: Any, options: Optional[Dict[str, Any]] = None,
+                         use_cache: bool = True) -> Optional[Any]:
     """Scrape a website using crawl4ai and process the content"""
     try:
         # Default options if none provided
@@ -40,9 +265,19 @@ async def scrape_website(url: str, llm: Any, options: Optional[Dict[str, Any]] =
             if not url.startswith(('http://', 'https://')):
                 raise ValueError(f"Invalid URL format: {url}")
 
+        # Serve unchanged pages from the page cache without rendering
+        cache = PageCache() if use_cache else None
+        validators: Dict[str, Any] = {}
+        if cache is not None:
+            cached, validators = await _lookup_cached(cache, url)
+            if cached is not None:
+                return cached
+
         # Run the crawler
+        AsyncWebCrawler = _crawler_class()
         async with AsyncWebCrawler() as crawler:
-            result = await crawler.arun(url=url, **options)
+            with span("scrape.crawl", url=url):
+                result = await crawler.arun(url=url, **options)
             
             # Process the scraped content into the vector store
             if result.markdown:
@@ -50,40 +285,12 @@ async def scrape_website(url: str, llm: Any, options: Optional[Dict[str, Any]] =
                 if not llm:
                     raise ValueError("No LLM configured - check sidebar settings")
                 
-                # Create extraction prompt
-                prompt = f"""Analyze this real estate listing page and extract properties:
-                {result.markdown}
-                
-                Extract structured JSON data with:
-                - title (string)
-                - price (numeric)
-                - location (string)
-                - type (string: 'Sale' or 'Rental')
-                - description (string)
-                - image_url (string)
-                """
-                
-                # Get LLM response using the proper interface
-                try:
-                    if isinstance(llm, dict):  # Handle config dict from legacy code
-                        llm_instance = initialize_llm(llm)
-                        response = llm_instance.generate(prompt)
-                    else:  # Assume initialized LLM instance
-                        response = llm.generate(prompt)
-                    
-                    # Safely parse LLM response
-                    if response and response.text:
-                        properties = json.loads(response.text)
-                    else:
-                        properties = []
-                        logger.warning("LLM returned empty response")
-                        
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse LLM response: {e}")
-                    properties = []
-                except Exception as e:
-                    logger.error(f"LLM processing failed: {e}")
-                    raise
+                properties, complete = await asyncio.to_thread(_extract_properties, llm, result.markdown)
+                # Empty or partial extractions are not cached, or revalidation would keep serving them
+                if cache is not None and complete:
+                    await asyncio.to_thread(
+                        cache.put, url, result.markdown, result.html, validators, properties
+                    )
 
                 # Convert to vector store format
                 vector_store = {
@@ -99,12 +306,192 @@ async def scrape_website(url: str, llm: Any, options: Optional[Dict[str, Any]] =
         logger.error(f"Web scraping failed: {str(e)}")
         raise e
 
-def sync_scrape_website(url: str, llm: Any, options: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+def sync_scrape_website(url: str, llm: Any, options: Optional[Dict[str, Any]] = None,
+                        use_cache: bool = True) -> Optional[Any]:
     """Synchronous wrapper for scrape_website
     Note: Do not call this from async contexts - use scrape_website directly instead
     """
     try:
-        return asyncio.run(scrape_website(url, llm, options))
+        return asyncio.run(scrape_website(url, llm, options, use_cache))
     except Exception as e:
         logger.error(f"Synchronous scraping failed: {str(e)}")
         return None
+
+class TokenBucket:
+    """Async token bucket allowing `rate` requests per second with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class HostRateLimiter:
+    """One token bucket per host so each site is throttled independently"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    async def acquire(self, url: str) -> None:
+        if self.rate <= 0:
+            return
+        host = urlparse(url).netloc.lower()
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate)
+        await self.buckets[host].acquire()
+
+def _default_options() -> Dict[str, Any]:
+    """Crawl options used when the caller does not supply any"""
+    params = CrawlConfig.DEFAULT_PARAMS
+    return {
+        "include_raw_html": True,
+        "include_screenshot": False,
+        "include_links": False,
+        "include_images": False,
+        "extraction_strategy": "markdown",
+        "browser_options": {
+            "wait_until": "networkidle2",
+            "timeout": params["timeout"],
+            "exec_js": True,
+            "stealth_mode": True,
+            "user_agent": params["user_agents"][0]
+        }
+    }
+
+async def _crawl_with_retries(crawlers: Iterator[Any], url: str, options: Dict[str, Any],
+                              limiter: HostRateLimiter, user_agents: Any, params: Dict[str, Any]) -> Any:
+    """Crawl one URL, moving to the next crawler (proxy) and user agent and backing off between attempts"""
+    last_error: Optional[Exception] = None
+    for attempt in range(params["max_retries"] + 1):
+        crawler = next(crawlers)
+        run_options = dict(options)
+        browser_options = dict(run_options.get("browser_options", {}))
+        if user_agents is not None:
+            browser_options["user_agent"] = next(user_agents)
+            run_options["user_agent"] = browser_options["user_agent"]
+        run_options["browser_options"] = browser_options
+
+        await limiter.acquire(url)
+        try:
+            with span("scrape.crawl", url=url, attempt=attempt + 1):
+                result = await crawler.arun(url=url, **run_options)
+                if not getattr(result, "success", True):
+                    raise RuntimeError(getattr(result, "error_message", None) or "crawl failed")
+            return result
+        except Exception as e:
+            last_error = e
+            if attempt == params["max_retries"]:
+                break
+            delay = min(params["backoff_max"], params["backoff_base"] * (2 ** attempt))
+            delay += random.uniform(0, delay / 2)
+            logger.warning(f"Crawl of {url} failed (attempt {attempt + 1}): {str(e)}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    raise RuntimeError(f"Giving up on {url} after {params['max_retries'] + 1} attempts: {last_error}")
+
+async def scrape_websites(urls: List[str], llm: Any, options: Optional[Dict[str, Any]] = None,
+                          crawl_params: Optional[Dict[str, Any]] = None,
+                          use_cache: bool = True) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Scrape many URLs concurrently over one crawler, or one per configured proxy
+
+    Rate limiting, retries, proxy and user-agent rotation follow
+    CrawlConfig.DEFAULT_PARAMS (overridable via crawl_params). Pages that are
+    unchanged since the last scrape come from the page cache without rendering
+    or extraction. Returns a dict mapping each URL to its scrape result, or
+    None when the URL failed.
+    """
+    params = {**CrawlConfig.DEFAULT_PARAMS, **(crawl_params or {})}
+    options = options if options is not None else _default_options()
+
+    if not llm:
+        raise ValueError("No LLM configured - check sidebar settings")
+    for url in urls:
+        if not url.startswith(('http://', 'https://')):
+            raise ValueError(f"Invalid URL format: {url}")
+
+    user_agents = itertools.cycle(params["user_agents"]) if params["user_agents"] else None
+    proxy_pool = [proxy for proxy in params["proxy_pool"] if proxy]
+    limiter = HostRateLimiter(params["rate_limit"])
+    semaphore = asyncio.Semaphore(max(1, params["max_concurrency"]))
+    cache = PageCache() if use_cache else None
+    validators: Dict[str, Dict[str, Any]] = {}
+
+    async def scrape_one(crawlers: Iterator[Any], url: str) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            try:
+                result = await _crawl_with_retries(crawlers, url, options, limiter, user_agents, params)
+                if not result.markdown:
+                    return None
+                properties, complete = await asyncio.to_thread(_extract_properties, llm, result.markdown)
+                if cache is not None and complete:
+                    await asyncio.to_thread(
+                        cache.put, url, result.markdown, result.html, validators.get(url, {}), properties
+                    )
+                return {
+                    "properties": properties,
+                    "raw_html": result.html,
+                    "markdown": result.markdown
+                }
+            except Exception as e:
+                logger.error(f"Web scraping failed for {url}: {str(e)}")
+                return None
+
+    unique_urls = list(dict.fromkeys(urls))
+    results: Dict[str, Optional[Dict[str, Any]]] = {}
+    if cache is not None:
+        lookups = await asyncio.gather(*(_lookup_cached(cache, url, limiter) for url in unique_urls))
+        for url, (cached, url_validators) in zip(unique_urls, lookups):
+            if cached is not None:
+                results[url] = cached
+            else:
+                validators[url] = url_validators
+
+    misses = [url for url in unique_urls if url not in results]
+    if misses:
+        async with contextlib.AsyncExitStack() as stack:
+            if proxy_pool:
+                crawlers = [await stack.enter_async_context(_proxy_crawler(proxy)) for proxy in proxy_pool]
+            else:
+                crawlers = [await stack.enter_async_context(_crawler_class()())]
+            rotation = itertools.cycle(crawlers)
+            fetched = await asyncio.gather(*(scrape_one(rotation, url) for url in misses))
+        results.update(zip(misses, fetched))
+    return {url: results[url] for url in unique_urls}
+
+def merge_scrape_results(results: Dict[str, Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Combine per-URL scrape results into one properties list"""
+    properties = []
+    sources = []
+    for url, result in results.items():
+        if not result:
+            continue
+        sources.append(url)
+        for item in result.get("properties") or []:
+            if isinstance(item, dict):
+                properties.append({**item, "source_url": url})
+    return {"properties": properties, "sources": sources}
+
+def sync_scrape_websites(urls: List[str], llm: Any, options: Optional[Dict[str, Any]] = None,
+                         crawl_params: Optional[Dict[str, Any]] = None,
+                         use_cache: bool = True) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Synchronous wrapper for scrape_websites
+    Note: Do not call this from async contexts - use scrape_websites directly instead
+    """
+    try:
+        return asyncio.run(scrape_websites(urls, llm, options, crawl_params, use_cache))
+    except Exception as e:
+        logger.error(f"Synchronous batch scraping failed: {str(e)}")
+        return {url: None for url in urls}